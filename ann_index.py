@@ -0,0 +1,161 @@
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+
+from embedding_store import load_embedding_store, store_hash
+
+META_NAME = "meta.json"
+ARRAYS_NAME = "ivf.npz"
+
+
+def ensemble_doc_vectors(emb_legal_data, emb_legal_norms, rows):
+    """
+    Vector của các dòng `rows` trong không gian ghép của ensemble: nối các vector đã chuẩn hóa
+    của từng model. Tích vô hướng với `ensemble_query_vector` bằng tổng cosine có trọng số.
+    """
+    parts = [
+        np.asarray(emb[rows], dtype=np.float32) / np.maximum(np.asarray(norms[rows])[:, None], 1e-12)
+        for emb, norms in zip(emb_legal_data, emb_legal_norms)
+    ]
+    return np.hstack(parts)
+
+
+def ensemble_query_vector(question_embs, weighted):
+    parts = []
+    for weight, emb in zip(weighted, question_embs):
+        emb = np.asarray(emb, dtype=np.float32).reshape(-1)
+        parts.append(weight * emb / max(np.linalg.norm(emb), 1e-12))
+    return np.concatenate(parts)
+
+
+def _spherical_kmeans(sample, nlist, n_iter, rng):
+    centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+    for _ in range(n_iter):
+        assign = np.argmax(sample @ centroids.T, axis=1)
+        for c in range(nlist):
+            members = sample[assign == c]
+            if len(members) == 0:
+                # cụm rỗng: khởi tạo lại bằng một điểm ngẫu nhiên
+                centroids[c] = sample[rng.integers(len(sample))]
+            else:
+                centroids[c] = members.sum(axis=0)
+        centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+    return centroids
+
+
+class IVFIndex:
+    """
+    Chỉ mục ANN kiểu IVF (inverted file) bằng NumPy thuần:
+    - k-means (spherical) chia corpus thành `nlist` cụm theo vector ghép của ensemble,
+    - khi truy vấn chỉ duyệt các dòng thuộc `nprobe` cụm gần nhất, sau đó RetrievalData chấm điểm
+      chính xác trên các dòng này. `nprobe` càng lớn thì recall càng cao và càng chậm.
+    """
+
+    def __init__(self, centroids, list_ptr, list_rows, meta=None):
+        self.centroids = centroids
+        self.list_ptr = list_ptr
+        self.list_rows = list_rows
+        self.meta = meta or {}
+
+    @property
+    def nlist(self):
+        return len(self.centroids)
+
+    @classmethod
+    def build(cls, emb_legal_data, emb_legal_norms, nlist=256, n_iter=20, sample_size=None,
+              chunk_size=65536, seed=0):
+        num_docs = emb_legal_data[0].shape[0]
+        nlist = min(nlist, num_docs)
+        rng = np.random.default_rng(seed)
+        sample_size = min(num_docs, sample_size or nlist * 256)
+        sample_rows = np.sort(rng.choice(num_docs, size=sample_size, replace=False))
+        sample = ensemble_doc_vectors(emb_legal_data, emb_legal_norms, sample_rows)
+        centroids = _spherical_kmeans(sample, nlist, n_iter, rng)
+
+        # gán toàn bộ corpus vào cụm theo từng chunk để không phải nạp cả ma trận ghép vào RAM
+        assign = np.empty(num_docs, dtype=np.int32)
+        for start in range(0, num_docs, chunk_size):
+            rows = np.arange(start, min(start + chunk_size, num_docs))
+            vectors = ensemble_doc_vectors(emb_legal_data, emb_legal_norms, rows)
+            assign[rows] = np.argmax(vectors @ centroids.T, axis=1)
+
+        list_rows = np.argsort(assign, kind="stable").astype(np.int64)
+        list_ptr = np.zeros(nlist + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assign, minlength=nlist), out=list_ptr[1:])
+        return cls(centroids.astype(np.float32), list_ptr, list_rows, meta={"num_docs": int(num_docs)})
+
+    def save(self, index_dir, corpus_hash=None):
+        index_dir = Path(index_dir)
+        index_dir.mkdir(parents=True, exist_ok=True)
+        np.savez(index_dir / ARRAYS_NAME, centroids=self.centroids, list_ptr=self.list_ptr, list_rows=self.list_rows)
+        meta = {**self.meta, "nlist": self.nlist}
+        if corpus_hash is not None:
+            meta["corpus_hash"] = corpus_hash
+        tmp_path = index_dir / (META_NAME + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=2)
+        os.replace(tmp_path, index_dir / META_NAME)
+
+    @classmethod
+    def load(cls, index_dir, corpus_hash=None):
+        index_dir = Path(index_dir)
+        with open(index_dir / META_NAME, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if corpus_hash is not None and meta.get("corpus_hash") != corpus_hash:
+            raise ValueError(f"ANN index at '{index_dir}' was built from a different corpus, rebuild it")
+        arrays = np.load(index_dir / ARRAYS_NAME)
+        return cls(arrays["centroids"], arrays["list_ptr"], arrays["list_rows"], meta=meta)
+
+    def candidates(self, query_vector, nprobe=8):
+        """Các dòng thuộc `nprobe` cụm có centroid gần query nhất."""
+        nprobe = min(nprobe, self.nlist)
+        centroid_scores = self.centroids @ query_vector
+        probes = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+        return np.concatenate([self.list_rows[self.list_ptr[c]:self.list_ptr[c + 1]] for c in probes])
+
+
+def build_ann_index(store_dir, index_dir=None, nlist=256, **kwargs):
+    """
+    Build IVFIndex offline từ embedding store (embedding_store.py) và lưu cạnh store
+    (mặc định `<store_dir>/ivf`). Không cần load model.
+    """
+    emb_legal_data, emb_legal_norms, manifest = load_embedding_store(store_dir)
+    index_dir = index_dir or Path(store_dir) / "ivf"
+    index = IVFIndex.build(emb_legal_data, emb_legal_norms, nlist=nlist, **kwargs)
+    index.save(index_dir, corpus_hash=store_hash(manifest))
+    return index
+
+
+def recall_at_k(retrieval, question_embs_list, index, k=10, nprobe=8):
+    """
+    So sánh top-k của tìm kiếm IVF với tìm kiếm chính xác (brute force) trên các câu hỏi mẫu.
+
+    :param question_embs_list: danh sách question_embs (kết quả encode_question của từng câu hỏi).
+    :return: recall@k trung bình.
+    """
+    recalls = []
+    for question_embs in question_embs_list:
+        exact = retrieval.calculate_cosine_similarity(question_embs)
+        k_eff = min(k, len(exact))
+        exact_top = set(np.argpartition(-exact, k_eff - 1)[:k_eff].tolist())
+        rows = index.candidates(ensemble_query_vector(question_embs, retrieval.weighted), nprobe)
+        approx = retrieval.calculate_cosine_similarity_rows(question_embs, rows)
+        k_approx = min(k_eff, len(rows))
+        approx_top = set(rows[np.argpartition(-approx, k_approx - 1)[:k_approx]].tolist())
+        recalls.append(len(exact_top & approx_top) / k_eff)
+    return float(np.mean(recalls)) if recalls else 0.0
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build an IVF index next to an embedding store")
+    parser.add_argument("store_dir")
+    parser.add_argument("--nlist", type=int, default=256)
+    parser.add_argument("--n-iter", type=int, default=20)
+    args = parser.parse_args()
+    built = build_ann_index(args.store_dir, nlist=args.nlist, n_iter=args.n_iter)
+    sizes = np.diff(built.list_ptr)
+    print(f"IVF index: {built.nlist} lists, list size min/mean/max = {sizes.min()}/{sizes.mean():.1f}/{sizes.max()}")
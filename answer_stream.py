@@ -0,0 +1,104 @@
+"""
+Stream câu trả lời của workflow (app.py) theo từng token thay vì đợi `invoke` chạy xong.
+
+Mỗi event là một dict:
+    {"event": "token", "text": ...}                          token của câu trả lời đang sinh
+    {"event": "retraction", "reason": ...}                   câu trả lời vừa stream bị grader loại,
+                                                             workflow sẽ sinh lại (các token tiếp theo
+                                                             thuộc câu trả lời mới)
+    {"event": "verdict", "verdict": ..., "generation": ..., "documents": [...], "degraded": ...}
+                                                             luôn là event cuối cùng; khi hết budget
+                                                             (budget.RequestBudget) verdict là "degraded"
+                                                             và generation là câu trả lời tốt nhất đã có
+
+Token được phát ngay khi LLM sinh ra, nên time-to-first-token chỉ bằng thời gian sinh câu trả lời;
+việc kiểm tra hallucination / relevance chạy sau và chỉ quyết định event cuối.
+"""
+import asyncio
+
+# node sinh câu trả lời có token được stream, và node chấm điểm câu trả lời
+ANSWER_NODES = ("rag", "fallback")
+GRADE_NODE = "grade_generation"
+DEGRADE_NODE = "degrade"
+# verdict khi câu trả lời không qua grader (ví dụ fallback_node)
+UNCHECKED = "unchecked"
+
+
+def _token_text(chunk):
+    content = getattr(chunk, "content", chunk)
+    if isinstance(content, list):
+        # content dạng list các block (một số chat model)
+        return "".join(block.get("text", "") if isinstance(block, dict) else str(block) for block in content)
+    return content or ""
+
+
+async def astream_answer(app, inputs, config=None, answer_nodes=ANSWER_NODES, grade_node=GRADE_NODE):
+    """
+    Chạy `app` (compiled workflow) và yield các event token / retraction / verdict.
+    Dựa trên `astream_events`: lời gọi `rag_chain.invoke` bên trong node cũng được stream
+    mà không cần sửa node.
+    """
+    state = dict(inputs)
+    verdict = UNCHECKED
+    streamed = False
+    async for event in app.astream_events(inputs, config=config, version="v2"):
+        kind = event["event"]
+        node = event.get("metadata", {}).get("langgraph_node")
+
+        if kind == "on_chat_model_stream" and node in answer_nodes:
+            text = _token_text(event["data"]["chunk"])
+            if text:
+                streamed = True
+                yield {"event": "token", "text": text}
+
+        elif kind == "on_chain_end" and node is not None and event["name"] == node:
+            output = event["data"].get("output")
+            if not isinstance(output, dict):
+                continue
+            state.update(output)
+            if node == grade_node:
+                verdict = output.get("verdict", UNCHECKED)
+                if verdict != "useful":
+                    yield {"event": "retraction", "reason": verdict, "generation": state.get("generation")}
+                    streamed = False
+            elif node == DEGRADE_NODE:
+                verdict = "degraded"
+            elif node in answer_nodes:
+                verdict = UNCHECKED
+                if not streamed and state.get("generation"):
+                    # chat model không hỗ trợ streaming: phát cả câu trả lời một lần
+                    yield {"event": "token", "text": str(state["generation"])}
+
+    yield {
+        "event": "verdict",
+        "verdict": verdict,
+        "generation": state.get("generation"),
+        "documents": state.get("documents") or [],
+        "degraded": state.get("degraded"),
+    }
+
+
+async def print_answer_stream(app, inputs, config=None):
+    """In token ra màn hình ngay khi có, trả về event verdict cuối cùng."""
+    final = None
+    async for event in astream_answer(app, inputs, config=config):
+        if event["event"] == "token":
+            print(event["text"], end="", flush=True)
+        elif event["event"] == "retraction":
+            print(f"\n[câu trả lời trên bị loại ({event['reason']}), đang sinh lại...]")
+        else:
+            print()
+            if event["verdict"] == "degraded":
+                print(f"[hết budget ({event['degraded']['reason']}), câu trả lời tốt nhất đã có:]\n{event['generation']}")
+            final = event
+    return final
+
+
+if __name__ == "__main__":
+    from server import build_stub_app
+
+    async def main():
+        final = await print_answer_stream(build_stub_app(), {"query": "労働基準法", "chat_history": []})
+        print(final["verdict"])
+
+    asyncio.run(main())
@@ -1,216 +1,124 @@
+import asyncio
 from uuid import uuid4
-from langgraph.graph import StateGraph, END
-from langchain_core.documents import Document
-
-llm = ChatGroq(model="llama3-70b-8192", temperature=0)
-prompt = ChatPromptTemplate.from_template(router_prompt_template)
-question_router = prompt | llm.bind_tools(tools=[VectorStore, SearchEngine])
-
-hallucination_grader_chain = (
-    RunnableParallel(
-        {
-            "response": itemgetter("response"),
-            "context": lambda x: "\n\n".join([c.page_content for c in x["context"]]),
-        }
-    )
-    | hallucination_grader_prompt
-    | llm.with_structured_output(HallucinationGrader, method="json_mode")
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_community.document_loaders.web_base import WebBaseLoader
+from langchain_community.embeddings import HuggingFaceEmbeddings
+from langchain_community.tools.tavily_search import TavilySearchResults
+from langchain_community.vectorstores.chroma import Chroma
+from langchain_groq.chat_models import ChatGroq
+from llm_cache import SQLiteLRUCache
+from answer_stream import print_answer_stream
+from speculation import SpeculativeRetrieval
+from instrumentation import WorkflowInstrumentation
+from budget import RequestBudget
+from chat_history import HistoryManager, build_summarizer
+from rag_workflow import build_workflow
+
+# số lời gọi grader_chain tối đa chạy đồng thời trong filter_documents_node
+grader_max_concurrency = 5
+
+# chạy retrieval song song với lời gọi router (đa số câu hỏi route về VectorStore),
+# kết quả bị bỏ nếu route khác; xem speculative_retrieval.report()
+speculative_mode = True
+
+# giới hạn cho mỗi câu hỏi: hết thời gian / số lời gọi LLM / số vòng lặp (rag -> rag khi hallucination,
+# -> SearchEngine khi không có document hoặc câu trả lời không liên quan) thì trả về câu trả lời tốt nhất đã có;
+# chưa có câu trả lời nào thì trả lời bằng fallback_chain của graph (hoặc budget.INSUFFICIENT_INFORMATION)
+budget = RequestBudget(
+    max_seconds=60,
+    max_llm_calls=25,
+    max_iterations={"num_hallucination": 2, "num_searchengine": 2},
 )
 
-answer_grader_chain = answer_grader_prompt | llm.with_structured_output(
-    AnswerGrader, method="json_mode"
-)
+# cache kết quả LLM trên đĩa: router và các grader chạy với temperature=0 nên
+# chạy lại cùng một điều khoản sẽ không phải gọi lại Groq
+llm_cache = SQLiteLRUCache("./cache/llm_cache.db", max_entries=100_000, ttl=7 * 24 * 3600)
 
-# định nghĩa some function
-class AgentSate(TypedDict):
-    """The dictionary keeps track of the data required by the various nodes in the graph"""
-
-    query: str
-    chat_history:list[BaseMessage]
-    generation: str
-    documents: list[Document]
-
-
-def retrieve_node(state: dict) -> dict[str, list[Document] | str]:
-    """
-    Retrieve relevent documents from the vectorstore
-
-    query: str
-
-    return list[Document]
-    """
-    query = state["query"]
-    documents = retriever.invoke(input=query)
-    return {"documents": documents}
-
-
-def fallback_node(state: dict):
-    """
-    Fallback to this node when there is no tool call
-    """
-    query = state["query"]
-    chat_history = state["chat_history"]
-    generation = fallback_chain.invoke({"query": query, "chat_history": chat_history})
-    return {"generation": generation}
-
-
-def filter_documents_node(state: dict):
-    filtered_docs = list()
-
-    query = state["query"]
-    documents = state["documents"]
-    for i, doc in enumerate(documents, start=1):
-        grade = grader_chain.invoke({"query": query, "context": doc})
-        if grade.grade == "relevant":
-            print(f"---CHUCK {i}: RELEVANT---")
-            filtered_docs.append(doc)
-        else:
-            print(f"---CHUCK {i}: NOT RELEVANT---")
-    return {"documents": filtered_docs}
-
-
-def rag_node(state: dict):
-    query = state["query"]
-    documents = state["documents"]
-
-    generation = rag_chain.invoke({"query": query, "context": documents})
-    return {"generation": generation}
-
-
-def web_search_node(state: dict):
-    query = state["query"]
-    results = tavily_search.invoke(query)
-    documents = [
-        Document(page_content=doc["content"], metadata={"source": doc["url"]})
-        for doc in results
-    ]
-    return {"documents": documents}
-
-def question_router_node(state: dict):
-    query = state["query"]
-    try:
-        response = question_router.invoke({"query": query})
-    except Exception:
-        return "llm_fallback"
-
-    if "tool_calls" not in response.additional_kwargs:
-        print("---No tool called---")
-        return "llm_fallback"
-
-    if len(response.additional_kwargs["tool_calls"]) == 0:
-        raise "Router could not decide route!"
-
-    route = response.additional_kwargs["tool_calls"][0]["function"]["name"]
-    if route == "VectorStore":
-        print("---Routing to VectorStore---")
-        return "VectorStore"
-    elif route == "SearchEngine":
-        print("---Routing to SearchEngine---")
-        return "SearchEngine"
-
-def should_generate(state: dict):
-    filtered_docs = state["documents"]
-
-    if not filtered_docs:
-        print("---All retrived documents not relevant---")
-        return "SearchEngine"
-    else:
-        print("---Some retrived documents are relevant---")
-        return "generate"
-
-
-def hallucination_and_answer_relevance_check(state: dict):
-    llm_response = state["generation"]
-    documents = state["documents"]
-    query = state["query"]
-
-    hallucination_grade = hallucination_grader_chain.invoke(
-        {"response": llm_response, "context": documents}
-    )
-    if hallucination_grade.grade == "no":
-        print("---Hallucination check passed---")
-        answer_relevance_grade = answer_grader_chain.invoke(
-            {"response": llm_response, "query": query}
-        )
-        if answer_relevance_grade.grade == "yes":
-            print("---Answer is relevant to question---\n")
-            return "useful"
-        else:
-            print("---Answer is not relevant to question---")
-            return "not useful"
-    print("---Hallucination check failed---")
-    return "generate"
-
-# định nghĩa workflow
-
-workflow = StateGraph(AgentSate)
-workflow.add_node("VectorStore", retrieve_node)
-workflow.add_node("SearchEngine", web_search_node)
-workflow.add_node("filter_docs", filter_documents_node)
-workflow.add_node("fallback", fallback_node)
-workflow.add_node("rag", rag_node)
-
-workflow.set_conditional_entry_point(
-    question_router_node,
-    {
-        "llm_fallback": "fallback",
-        "VectorStore": "VectorStore",
-        "SearchEngine": "SearchEngine",
-    },
-)
+# chỉ router và các grader dùng cache; llm của rag / fallback / summarizer không được cache,
+# nếu không lần chạy lại rag sau khi bị chấm hallucination sẽ chỉ nhận lại đúng câu trả lời cũ
+grader_llm = ChatGroq(model="llama3-70b-8192", temperature=0, cache=llm_cache)
+llm = ChatGroq(model="llama3-70b-8192", temperature=0)
 
-workflow.add_edge("VectorStore", "filter_docs")
-workflow.add_edge("SearchEngine", "filter_docs")
-workflow.add_conditional_edges(
-    "filter_docs", should_generate, {"SearchEngine": "SearchEngine", "generate": "rag"}
-)
-workflow.add_conditional_edges(
-    "rag",
-    hallucination_and_answer_relevance_check,
-    {"useful": END, "not useful": "SearchEngine", "generate": "rag"},
+# vector store của 08_Healthcare_Agentic_RAG: các trang WebMD về sốt rét, tiểu đường và đau nửa đầu
+urls = [
+    "https://www.webmd.com/a-to-z-guides/malaria",
+    "https://www.webmd.com/diabetes/type-1-diabetes",
+    "https://www.webmd.com/diabetes/type-2-diabetes",
+    "https://www.webmd.com/migraines-headaches/migraines-headaches-migraines",
+]
+docs = WebBaseLoader(urls, bs_get_text_kwargs={"strip": True}).load()
+chunks = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=30).split_documents(docs)
+vector_store = Chroma.from_documents(documents=chunks, embedding=HuggingFaceEmbeddings())
+retriever = vector_store.as_retriever(search_kwargs={"k": 3})
+tavily_search = TavilySearchResults()
+
+speculative_retrieval = SpeculativeRetrieval(retriever) if speculative_mode else None
+
+# chat_history gửi cho fallback_chain: các lượt gần nhất trong 2000 token + bản tóm tắt các lượt cũ hơn
+# (tóm tắt tăng dần, mỗi lượt chỉ được tóm tắt một lần)
+history_manager = HistoryManager(build_summarizer(llm), max_tokens=2000)
+
+# định nghĩa app (graph dùng chung với benchmark.py: xem rag_workflow.py)
+app = build_workflow(
+    llm,
+    retriever,
+    tavily_search,
+    budget,
+    grader_llm=grader_llm,
+    speculative_retrieval=speculative_retrieval,
+    grader_max_concurrency=grader_max_concurrency,
 )
 
-workflow.add_edge("fallback", END)
+# giao diện (chạy nhiều session qua mạng: xem server.py)
+if __name__ == "__main__":
+    history = {}
+    session_id = str(uuid4())
 
-# định nghĩa app
-app = workflow.compile(debug=False)
+    if session_id not in history:
+        history[session_id] = history_manager.new_session()
 
-# giao diện
-history = {}
-session_id = str(uuid4())
+    chat_history = history[session_id]
 
-if session_id not in history:
-    history[session_id] = []
+    # trace JSONL của từng câu hỏi và GET http://localhost:9100/metrics
+    instrumentation = WorkflowInstrumentation(trace_path="./logs/workflow_trace.jsonl")
+    instrumentation.start_metrics_server(9100)
+    instrumented_app = instrumentation.instrument(app)
 
-chat_history = history[session_id]
-
-while True:
-    query = input("Bạn: ")
+    while True:
+        query = input("Bạn: ")
     
-    if query.lower() == "exit":
-        print("Thoát chương trình.")
-        break
-
-    # Gọi mô hình với câu hỏi và lịch sử hội thoại
-    try:
-        result = app.invoke({"query": query, "chat_history": chat_history})
-        
-        # Tách câu trả lời và tài liệu truy xuất
-        response = result["generation"]
-        documents = result["documents"]
-    except Exception:
-        print("Câu hỏi này không thuộc trong chủ đề về y tế. Hãy đặt câu hỏi khác.")
-        continue
-
-    # Lưu vào lịch sử hội thoại
-    chat_history.append({"human": query, "ai": response})
-
-    print(f"AI: {response}")
-
-    if documents:
-        print("\nTài liệu liên quan:")
-        for doc in documents:
-            print(f"- {doc.page_content} (Nguồn: {doc.metadata['source']})")
+        if query.lower() == "exit":
+            print("Thoát chương trình.")
+            break
+
+        # Gọi mô hình với câu hỏi và lịch sử hội thoại, câu trả lời được in ra theo từng token
+        try:
+            print("AI: ", end="")
+            result = asyncio.run(print_answer_stream(instrumented_app, {"query": query, "chat_history": history_manager.messages(chat_history)}))
+
+            # Tách câu trả lời và tài liệu truy xuất
+            response = result["generation"]
+            documents = result["documents"]
+        except Exception:
+            print("Câu hỏi này không thuộc trong chủ đề về y tế. Hãy đặt câu hỏi khác.")
+            continue
+
+        # Lưu vào lịch sử hội thoại (bỏ qua lượt không có câu trả lời)
+        if response is not None:
+            history_manager.append(chat_history, {"human": query, "ai": response}, compact=False)
+            try:
+                history_manager.compact(chat_history)
+            except Exception as e:
+                # summarizer lỗi: lịch sử giữ nguyên, lượt sau sẽ tóm tắt lại
+                print(f"[không tóm tắt được lịch sử hội thoại: {e!r}]")
+
+        if documents:
+            print("\nTài liệu liên quan:")
+            for doc in documents:
+                print(f"- {doc.page_content} (Nguồn: {doc.metadata['source']})")
 
     
-    print("-" * 50)  # Dòng ngăn cách giữa các lần hỏi
+        print("-" * 50)  # Dòng ngăn cách giữa các lần hỏi
+
+    if speculative_mode:
+        print(f"Speculative retrieval: {speculative_retrieval.report()}")
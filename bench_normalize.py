@@ -0,0 +1,147 @@
+"""
+Micro-benchmark của text_normalization so với bản normalize_text cũ của my_utils, kèm điểm hòa vốn của
+normalize_batch với process pool. Kiểm tra tương đương nằm trong test_text_normalization.py; với --corpus,
+corpus thật cũng được kiểm tra trước khi benchmark.
+
+    python bench_normalize.py [--corpus generated_data/full_corpus_110225_with_metadata_new.json] [--processes 4]
+"""
+import argparse
+import json
+import pickle
+import random
+import re
+import time
+from multiprocessing import Pool
+
+from text_normalization import HALFWIDTH_MAP, available_cpus, normalize_batch, normalize_dict, normalize_text
+
+
+# ---- bản cũ (my_utils trước khi tối ưu), giữ nguyên để so sánh kết quả ----
+def legacy_convert_to_halfwidth(text):
+    translation_table = str.maketrans(HALFWIDTH_MAP)
+    return text.translate(translation_table)
+
+
+def legacy_normalize_text(text):
+    text = legacy_convert_to_halfwidth(text)
+    while '\n\n' in text:
+        text = text.replace("\n\n", '\n')
+    while '  ' in text:
+        text = text.replace("  ", ' ')
+    while '　　' in text:
+        text = text.replace("　　", '　')
+
+    text = re.sub(r'[^\S\n]+', ' ', text)
+    text = re.sub(r'(\d),(\d)', r'\1\2', text)
+    text = re.sub(r'(\d{4})年(\d{1,2})月(\d{1,2})日', r'\1-\2-\3', text)
+    return text
+
+
+def legacy_normalize_dict(data):
+    if isinstance(data, dict):
+        return {key: legacy_normalize_dict(value) for key, value in data.items()}
+    elif isinstance(data, list):
+        return [legacy_normalize_dict(item) for item in data]
+    else:
+        return legacy_normalize_text(data)
+
+
+# ---- dữ liệu kiểm tra ----
+ALPHABET = (
+    list("労働基準法第一条使用者年月日") + list("0123456789０１２３４５６７８９,，") +
+    list(HALFWIDTH_MAP) + [" ", "　", "\n", "\t", "\r", " ", " ", "\x0b", "\x1c"] + list("abcXYZ")
+)
+SPECIAL_CASES = [
+    "", "\n", "\n\n\n\n", "  ", "　　　", " \n \n ", "\r\n\r\n", "1,2,3,4", "１，０００円",
+    "2023年1月1日", "２０２３年１２月３１日", "1,2023年1月1日", "令和5年4月1日", "\n" * 10000, " " * 10000,
+    "第1条\n\n\n  使用者は、　労働者に対して、\t\t賃金1,000,000円を2024年3月15日までに支払う。\n\n",
+]
+
+
+LAW_PARTS = [
+    "第１条", "使用者は、", "労働者に対して、", "賃金を支払わなければならない。", "２０２３年４月１日", "１，０００円",
+    "　", "\n", "\n\n", " ", "（定義）", "前項の規定により", "厚生労働大臣", "ＡＢＣ",
+]
+
+
+def random_texts(n, seed=0, max_len=300):
+    rng = random.Random(seed)
+    return ["".join(rng.choice(ALPHABET) for _ in range(rng.randint(0, max_len))) for _ in range(n)]
+
+
+def law_like_texts(n, seed=0, max_parts=200):
+    # văn bản giống điều luật (ít khoảng trắng, nhiều ký tự full-width) để benchmark khi không có corpus
+    rng = random.Random(seed)
+    return ["".join(rng.choice(LAW_PARTS) for _ in range(rng.randint(20, max_parts))) for _ in range(n)]
+
+
+def check_equivalence(texts):
+    mismatches = [text for text in texts if normalize_text(text) != legacy_normalize_text(text)]
+    if mismatches:
+        raise AssertionError(f"{len(mismatches)} mismatches, e.g. {mismatches[0]!r}")
+    records = [{"content": text, "metadata": {"keywords": [text, text[::-1]]}} for text in texts[:200]]
+    assert normalize_dict(records) == legacy_normalize_dict(records)
+    print(f"equivalence: OK on {len(texts)} texts")
+
+
+def bench(name, func, texts, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(texts)
+        best = min(best, time.perf_counter() - start)
+    chars = sum(len(text) for text in texts)
+    print(f"{name:<28} {best * 1000:9.1f} ms  {chars / best / 1e6:8.2f} Mchar/s")
+    return best
+
+
+def pool_break_even(texts, processes=(2, 4, 8)):
+    """
+    Số item tối thiểu để normalize_batch với process pool nhanh hơn chạy tuần tự:
+    n * (t_item * (1 - 1/p) - t_pickle) > t_pool, với t_pool là thời gian khởi tạo + đóng pool,
+    t_pickle là thời gian pickle hai chiều một item (tuần tự trong process chính).
+    """
+    start = time.perf_counter()
+    [normalize_text(text) for text in texts]
+    t_item = (time.perf_counter() - start) / len(texts)
+    start = time.perf_counter()
+    pickle.loads(pickle.dumps(texts))
+    t_pickle = 2 * (time.perf_counter() - start) / len(texts)
+    start = time.perf_counter()
+    with Pool(2) as pool:
+        pool.map(abs, [1])
+    t_pool = time.perf_counter() - start
+    print(f"pool start+stop {t_pool * 1000:.1f} ms, pickle {t_pickle * 1e6:.1f} us/item, "
+          f"normalize {t_item * 1e6:.1f} us/item")
+    for p in processes:
+        gain = t_item * (1 - 1 / p) - t_pickle
+        print(f"  break-even with {p} processes: " + (f"{t_pool / gain:.0f} items" if gain > 0 else "never"))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--corpus", default=None, help="corpus json (mảng record có 'content') để benchmark")
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--num-random", type=int, default=20000)
+    args = parser.parse_args()
+
+    if args.corpus:
+        with open(args.corpus, "r", encoding="utf-8") as f:
+            texts = [doc["content"] for doc in json.load(f)]
+        check_equivalence(texts)
+    else:
+        texts = law_like_texts(args.num_random, seed=1)
+
+    legacy = bench("legacy normalize_text", lambda items: [legacy_normalize_text(t) for t in items], texts)
+    new = bench("normalize_text", lambda items: [normalize_text(t) for t in items], texts)
+    processes = min(args.processes, available_cpus())
+    pool = bench(f"normalize_batch(processes={processes})",
+                 lambda items: normalize_batch(items, processes=args.processes), texts, repeat=1)
+    print(f"speedup: {legacy / new:.1f}x single core, {legacy / pool:.1f}x normalize_batch "
+          f"({available_cpus()} CPU available)")
+    pool_break_even(texts)
+
+    # chuỗi bệnh lý: bản cũ bậc hai với các chuỗi dài toàn '\n' hoặc khoảng trắng
+    pathological = ["\n" * 200000, " " * 200000]
+    bench("legacy (pathological)", lambda items: [legacy_normalize_text(t) for t in items], pathological, repeat=1)
+    bench("normalize_text (pathological)", lambda items: [normalize_text(t) for t in items], pathological, repeat=1)
@@ -0,0 +1,539 @@
+"""
+Benchmark end-to-end offline cho workflow và RetrievalData: không cần Groq, Tavily hay SentenceTransformer.
+
+    python benchmark.py --clauses test.json new_docs.json            # replay các câu hợp đồng qua workflow
+    python benchmark.py --sizes 1000 10000 50000 --queries 200       # retrieval QPS theo kích thước corpus
+    python benchmark.py --llm-latency 0.3 --output logs/bench_new.json --baseline logs/bench_old.json
+
+Các thành phần giả, tất cả đều tất định (cùng input cho cùng kết quả) và có độ trễ giả cấu hình được:
+- OfflineChatModel: chat model trả lời router (tool call), grader (JSON) và câu trả lời RAG;
+  tỉ lệ document không liên quan / hallucination / câu trả lời không đạt cấu hình được để đi qua các vòng lặp.
+- HashEmbeddings: vector từ hash của các bigram ký tự, interface `encode` như SentenceTransformer.
+- OfflineSearch: thay cho TavilySearchResults.
+
+Kết quả (p50/p95/p99 của từng node, số lời gọi LLM / token mỗi câu, QPS và latency của retrieval theo
+kích thước corpus, peak memory) được ghi ra file JSON; `--baseline` so sánh với một lần chạy trước và
+báo các chỉ số chậm đi quá `--tolerance`.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import tempfile
+import threading
+import time
+import tracemalloc
+import zlib
+from pathlib import Path
+
+import numpy as np
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.runnables import RunnableLambda
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from pydantic import PrivateAttr
+
+from bench_normalize import LAW_PARTS
+from budget import RequestBudget
+from chat_history import estimate_tokens
+from document_store import load_document_store
+from instrumentation import WorkflowInstrumentation
+from quantization import QUANTIZATION_MODES, build_quantized_index, recall_report
+from rag_workflow import build_workflow
+from retrieval import RetrievalData
+from speculation import SpeculativeRetrieval
+
+
+# ======================= thành phần giả ======================= #
+def _draw(key, rate, seed=0):
+    """True với xác suất `rate`, tất định theo `key` (không dùng hash() vì bị salt theo process)."""
+    return zlib.crc32(f"{seed}:{key}".encode("utf-8")) % 10_000 < rate * 10_000
+
+
+class OfflineChatModel(BaseChatModel):
+    """
+    Chat model giả cho benchmark. Câu trả lời phụ thuộc vào loại lời gọi:
+    - có tools (router): tool call `VectorStore`, hoặc `SearchEngine` với tỉ lệ `web_route_rate`,
+    - structured output (grader): giá trị "tốt" của schema, hoặc giá trị "xấu" theo tỉ lệ của schema đó,
+    - còn lại: một câu trả lời dạng 結論 / 説明 dài khoảng `answer_chars` ký tự.
+    Mỗi lời gọi ngủ `latency` giây và trả về usage_metadata ước lượng từ độ dài prompt.
+    """
+
+    latency: float = 0.0
+    answer_chars: int = 200
+    web_route_rate: float = 0.1
+    irrelevant_rate: float = 0.3
+    hallucination_rate: float = 0.15
+    not_useful_rate: float = 0.1
+    seed: int = 0
+    _seen: dict = PrivateAttr(default_factory=dict)
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
+    @property
+    def _llm_type(self):
+        return "offline-benchmark"
+
+    def bind_tools(self, tools, **kwargs):
+        return self.bind(tools=[convert_to_openai_tool(tool) for tool in tools], **kwargs)
+
+    def with_structured_output(self, schema, method="json_mode", **kwargs):
+        return self.bind(structured_schema=schema.__name__) | RunnableLambda(
+            lambda message: schema(**json.loads(message.content))
+        )
+
+    def _attempt(self, prompt):
+        # số lần đã gặp cùng một prompt: sinh lại câu trả lời cho cùng câu hỏi không luôn cho cùng kết quả
+        with self._lock:
+            attempt = self._seen.get(prompt, 0)
+            self._seen[prompt] = attempt + 1
+        return attempt
+
+    def _respond(self, prompt, tools=None, structured_schema=None):
+        if tools:
+            names = [tool["function"]["name"] for tool in tools]
+            name = names[0]
+            if "SearchEngine" in names and _draw(prompt, self.web_route_rate, self.seed):
+                name = "SearchEngine"
+            tool_call = {"id": f"call_{zlib.crc32(prompt.encode('utf-8')):08x}", "type": "function",
+                         "function": {"name": name, "arguments": "{}"}}
+            return AIMessage(content="", additional_kwargs={"tool_calls": [tool_call]})
+        if structured_schema is not None:
+            key = f"{prompt}:{self._attempt(prompt)}"
+            good, bad, rate = {
+                "Grader": ("relevant", "irrelevant", self.irrelevant_rate),
+                "HallucinationGrader": ("no", "yes", self.hallucination_rate),
+                "AnswerGrader": ("yes", "no", self.not_useful_rate),
+            }[structured_schema]
+            return AIMessage(content=json.dumps({"grade": bad if _draw(key, rate, self.seed) else good}))
+        attempt = self._attempt(prompt)
+        filler = "労働基準法第二十条に基づき判断する。" * (self.answer_chars // 18 + 1)
+        conclusion = "正しい" if _draw(prompt, 0.5, self.seed) else "誤り"
+        return AIMessage(content=f"- 結論: 「{conclusion}」\n- 説明 ({attempt}): {filler[:self.answer_chars]}")
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        prompt = "\n".join(str(message.content) for message in messages)
+        message = self._respond(prompt, kwargs.get("tools"), kwargs.get("structured_schema"))
+        input_tokens = estimate_tokens(prompt)
+        output_tokens = estimate_tokens(message.content) + (8 if message.additional_kwargs else 0)
+        message.usage_metadata = {"input_tokens": input_tokens, "output_tokens": output_tokens,
+                                  "total_tokens": input_tokens + output_tokens}
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+class HashEmbeddings:
+    """
+    Embeddings tất định thay cho SentenceTransformer: mỗi bigram ký tự được hash vào một chiều (có dấu),
+    vector được chuẩn hóa L2. Văn bản có nhiều bigram chung có cosine cao, đủ để retrieval có ý nghĩa.
+    """
+
+    def __init__(self, dim=384, seed=0, latency=0.0):
+        self.dim = dim
+        self.seed = seed
+        self.latency = latency
+        self._buckets = {}
+
+    def _bucket(self, gram):
+        bucket = self._buckets.get(gram)
+        if bucket is None:
+            h = zlib.crc32(f"{self.seed}:{gram}".encode("utf-8"))
+            bucket = self._buckets[gram] = (h % self.dim, 1.0 if (h >> 16) & 1 else -1.0)
+        return bucket
+
+    def _encode_one(self, text, out):
+        buckets = [self._bucket(text[i:i + 2]) for i in range(max(len(text) - 1, 1))]
+        indices, signs = zip(*buckets)
+        np.add.at(out, list(indices), signs)
+        norm = np.linalg.norm(out)
+        if norm > 0:
+            out /= norm
+
+    def encode(self, sentences, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for text, out in zip(texts, vectors):
+            self._encode_one(text, out)
+        return vectors[0] if single else vectors
+
+    # interface Embeddings của LangChain (Chroma, CachedEmbeddings, ...)
+    def embed_documents(self, texts):
+        return self.encode(texts).tolist()
+
+    def embed_query(self, text):
+        return self.encode(text).tolist()
+
+
+class OfflineSearch:
+    """Thay cho TavilySearchResults: `invoke(query)` trả về `max_results` kết quả {"url", "content"} giả."""
+
+    def __init__(self, latency=0.0, max_results=3):
+        self.latency = latency
+        self.max_results = max_results
+
+    def invoke(self, query):
+        if self.latency:
+            time.sleep(self.latency)
+        return [{"url": f"https://example.com/search/{zlib.crc32(query.encode('utf-8')):08x}/{i}",
+                 "content": f"{query} に関する検索結果 {i}"} for i in range(self.max_results)]
+
+
+class OfflineRetrievalData(RetrievalData):
+    """RetrievalData với HashEmbeddings thay cho các SentenceTransformer (mỗi model path một seed)."""
+
+    def __init__(self, *args, dim=384, embed_latency=0.0, **kwargs):
+        self.dim = dim
+        self.embed_latency = embed_latency
+        super().__init__(*args, **kwargs)
+
+    def load_models(self, model_paths):
+        return [HashEmbeddings(self.dim, seed=i, latency=self.embed_latency) for i, _ in enumerate(model_paths)]
+
+
+# ======================= dữ liệu ======================= #
+def _record_text(record):
+    if isinstance(record, str):
+        return record
+    for key in ("query", "contract_clause", "content", "page_content"):
+        if isinstance(record.get(key), str):
+            return record[key]
+    return None
+
+
+def load_clauses(paths):
+    """
+    Các câu hợp đồng / câu hỏi để replay từ file JSON (một object, một mảng, hoặc nhiều giá trị JSON
+    liên tiếp như new_docs.json) hoặc JSONL. Mỗi record là chuỗi, hoặc dict có query / contract_clause /
+    content / page_content. Phần cuối file không phải JSON bị bỏ qua.
+    """
+    decoder = json.JSONDecoder()
+    clauses = []
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            text = f.read()
+        pos, values = 0, []
+        while True:
+            while pos < len(text) and text[pos].isspace():
+                pos += 1
+            if pos >= len(text):
+                break
+            try:
+                value, pos = decoder.raw_decode(text, pos)
+            except json.JSONDecodeError:
+                print(f"{path}: ignoring non-JSON content from char {pos}")
+                break
+            values.append(value)
+        for value in values:
+            for record in value if isinstance(value, list) else [value]:
+                clause = _record_text(record)
+                if clause:
+                    clauses.append(clause)
+    return clauses
+
+
+def synthetic_corpus(num_docs, seed=0, base_records=None):
+    """
+    Corpus giả theo định dạng của full_corpus (id, content, metadata). Các câu được lấy từ `base_records`
+    (ví dụ new_docs.json) nếu có, không thì từ các cụm từ điều luật của bench_normalize.
+    """
+    rng = np.random.default_rng(seed)
+    sentences = [part for part in LAW_PARTS if part.strip()]
+    if base_records:
+        sentences = [s + "。" for record in base_records for s in _record_text(record).split("。") if s.strip()]
+    law_names = [f"法律{i}" for i in range(max(1, num_docs // 200))]
+    records = []
+    for row in range(num_docs):
+        law_name = law_names[row % len(law_names)]
+        article = f"第{row // len(law_names) + 1}条"
+        picks = rng.integers(0, len(sentences), size=int(rng.integers(2, 6)))
+        content = f"{law_name}/{article}/" + "".join(sentences[i] for i in picks)
+        records.append({
+            "id": f"{law_name}_{article}",
+            "content": content,
+            "metadata": {"law_name": law_name, "article_number": article},
+        })
+    return records
+
+
+# ======================= workflow ======================= #
+def build_offline_workflow(retrieval, llm, search, budget, speculative=True, grader_max_concurrency=5):
+    """
+    Graph của app.py (rag_workflow.build_workflow) với `retrieval` (RetrievalData) làm retriever và
+    `llm` / `search` được truyền vào, nên benchmark đo đúng graph đang chạy thật.
+    """
+    retriever = RunnableLambda(lambda query: retrieval.return_documents(*retrieval.inference(query)))
+    return build_workflow(
+        llm, retriever, search, budget,
+        speculative_retrieval=SpeculativeRetrieval(retriever) if speculative else None,
+        grader_max_concurrency=grader_max_concurrency,
+    )
+
+
+# ======================= đo ======================= #
+def percentiles(values, ps=(0.5, 0.95, 0.99)):
+    """p50 / p95 / p99 (nearest rank như server.GraphServer.snapshot)."""
+    values = sorted(values)
+    if not values:
+        return {f"p{int(p * 100)}": None for p in ps}
+    return {f"p{int(p * 100)}": round(values[min(len(values) - 1, int(p * len(values)))], 5) for p in ps}
+
+
+def _summary(values):
+    return {"count": len(values), "mean": round(float(np.mean(values)), 5) if values else None, **percentiles(values)}
+
+
+def peak_rss_mb():
+    # ru_maxrss: KB trên Linux, byte trên macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1 << 20) if platform.system() == "Darwin" else rss / 1024, 1)
+
+
+def _write_corpus(directory, records):
+    path = Path(directory) / "corpus.json"
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(records, f, ensure_ascii=False)
+    return str(path)
+
+
+def build_retrieval(directory, records, num_models=1, dim=384, embed_latency=0.0):
+    corpus_path = _write_corpus(directory, records)
+    model_paths = [f"hash-embeddings-{i}" for i in range(num_models)]
+    return OfflineRetrievalData(
+        corpus_path, model_paths, str(Path(directory) / "vector_store"), [1.0 / num_models] * num_models,
+        encode_legal_data_flag=True, dim=dim, embed_latency=embed_latency,
+    )
+
+
+def bench_workflow(clauses, retrieval, llm, search, budget, repeat=1):
+    """Replay các câu qua workflow (tuần tự), trả về số liệu theo node và theo câu từ WorkflowInstrumentation."""
+    instrumentation = WorkflowInstrumentation(keep_last=len(clauses) * repeat)
+    app = instrumentation.instrument(build_offline_workflow(retrieval, llm, search, budget))
+    start = time.perf_counter()
+    for round_ in range(repeat):
+        for i, clause in enumerate(clauses):
+            app.invoke({"query": clause, "chat_history": []},
+                       config={"metadata": {"request_id": f"{round_}-{i}"}})
+    elapsed = time.perf_counter() - start
+
+    traces = instrumentation.last_traces
+    node_seconds, node_llm_calls = {}, {}
+    for trace in traces:
+        for entry in trace["nodes"]:
+            if entry["node"].startswith("__"):
+                # node nội bộ của LangGraph (__start__)
+                continue
+            if entry["seconds"] is not None:
+                node_seconds.setdefault(entry["node"], []).append(entry["seconds"])
+            node_llm_calls.setdefault(entry["node"], []).append(entry["llm_calls"])
+    return {
+        "clauses": len(traces),
+        "seconds": round(elapsed, 3),
+        "clause_seconds": _summary([trace["seconds"] for trace in traces]),
+        "llm_calls_per_clause": _summary([trace["llm_calls"] for trace in traces]),
+        "tokens_per_clause": _summary([trace["prompt_tokens"] + trace["completion_tokens"] for trace in traces]),
+        "errors": sum(trace["status"] != "ok" for trace in traces),
+        "nodes": {
+            node: {**_summary(seconds), "llm_calls_mean": round(float(np.mean(node_llm_calls[node])), 3)}
+            for node, seconds in sorted(node_seconds.items())
+        },
+    }
+
+
+def _time_queries(retrieval, queries):
+    latencies = []
+    start = time.perf_counter()
+    for query in queries:
+        t = time.perf_counter()
+        retrieval.inference(query)
+        latencies.append(time.perf_counter() - t)
+    return {"qps": round(len(queries) / (time.perf_counter() - start), 1), **percentiles(latencies)}
+
+
+def bench_retrieval(sizes, queries, num_models=1, dim=384, base_records=None, seed=0, quantization=(),
+                    rescore_k=200):
+    """
+    QPS và latency của `RetrievalData.inference` theo kích thước corpus, kèm peak memory khi load + truy vấn.
+    Với mỗi mode trong `quantization` ("int8", "binary"): QPS khi dùng QuantizedIndex và recall so với float.
+    """
+    results = []
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            records = synthetic_corpus(size, seed=seed, base_records=base_records)
+            start = time.perf_counter()
+            retrieval = build_retrieval(directory, records, num_models=num_models, dim=dim)
+            encode_seconds = time.perf_counter() - start
+            retrieval.inference(queries[0])  # warm-up: document store, page cache của mmap
+            result = {"corpus_size": size, "encode_seconds": round(encode_seconds, 3),
+                      **_time_queries(retrieval, queries)}
+
+            if quantization:
+                question_embs_list = [retrieval.encode_question(query) for query in queries[:50]]
+                result["quantized"] = {}
+                for mode in quantization:
+                    retrieval.quantized_index = build_quantized_index(retrieval.legal_data_path, mode)
+                    retrieval.rescore_k = rescore_k
+                    report = recall_report(retrieval, question_embs_list, retrieval.quantized_index,
+                                           k=retrieval.top_n, rescore_k=rescore_k)
+                    result["quantized"][mode] = {
+                        **_time_queries(retrieval, queries),
+                        **{key: report[key] for key in ("first_pass_recall", "first_pass_qps", "exact_qps", "recall",
+                                                        "recall_loss", "quantized_mb")},
+                    }
+                retrieval.quantized_index = None
+
+            # tracemalloc làm chậm code Python nên đo memory trong một lượt riêng, không tính vào latency;
+            # document store được load lại để tính cả bộ nhớ của nó
+            load_document_store.cache_clear()
+            tracemalloc.start()
+            retrieval = OfflineRetrievalData(retrieval.legal_dict_json, retrieval.model_paths,
+                                             retrieval.legal_data_path, retrieval.weighted, dim=dim)
+            for query in queries[:20]:
+                retrieval.inference(query)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            load_document_store.cache_clear()
+        result["peak_traced_mb"] = round(peak / (1 << 20), 2)
+        results.append(result)
+        print(json.dumps(results[-1]))
+    return results
+
+
+# ======================= so sánh với baseline ======================= #
+# chỉ số càng cao càng tốt; các chỉ số khác (thời gian, số lời gọi, memory) càng thấp càng tốt
+HIGHER_IS_BETTER = ("qps", "recall", "first_pass_recall", "first_pass_qps", "exact_qps")
+# chỉ số không dùng để so sánh
+IGNORED_METRICS = ("count", "clauses", "corpus_size", "errors")
+
+
+def flatten_metrics(results):
+    """{"workflow.nodes.rag.p95": 0.12, "retrieval.10000.qps": 850.0, ...} từ file kết quả."""
+    metrics = {}
+
+    def visit(prefix, value):
+        if isinstance(value, dict):
+            for key, item in value.items():
+                visit(f"{prefix}.{key}" if prefix else key, item)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            metrics[prefix] = value
+
+    visit("workflow", results.get("workflow") or {})
+    for entry in results.get("retrieval") or []:
+        visit(f"retrieval.{entry['corpus_size']}", entry)
+    if "peak_rss_mb" in results:
+        metrics["peak_rss_mb"] = results["peak_rss_mb"]
+    return metrics
+
+
+def compare(results, baseline, tolerance=0.1, min_delta=0.005):
+    """
+    So sánh các chỉ số có mặt ở cả hai lần chạy.
+    :param min_delta: chênh lệch tuyệt đối nhỏ hơn mức này (ví dụ vài ms của node chạy rất nhanh) không bị
+        coi là regression dù tỉ lệ thay đổi lớn.
+    :return: danh sách (metric, baseline, current, change) của các chỉ số tệ đi quá `tolerance`.
+    """
+    current, previous = flatten_metrics(results), flatten_metrics(baseline)
+    regressions = []
+    print(f"{'metric':<48} {'baseline':>12} {'current':>12} {'change':>9}")
+    for metric in sorted(current.keys() & previous.keys()):
+        if metric.rsplit(".", 1)[-1] in IGNORED_METRICS:
+            continue
+        old, new = previous[metric], current[metric]
+        if not old:
+            continue
+        change = (new - old) / abs(old)
+        worse = -change if metric.rsplit(".", 1)[-1] in HIGHER_IS_BETTER else change
+        flag = "  REGRESSION" if worse > tolerance and abs(new - old) >= min_delta else ""
+        print(f"{metric:<48} {old:>12.5g} {new:>12.5g} {change:>+8.1%}{flag}")
+        if flag:
+            regressions.append((metric, old, new, change))
+    return regressions
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline end-to-end benchmark (fake LLM / embeddings / search)")
+    parser.add_argument("--clauses", nargs="*", default=["test.json", "new_docs.json"],
+                        help="file JSON / JSONL chứa các câu cần replay qua workflow")
+    parser.add_argument("--corpus", default=None, help="corpus JSON cho workflow (mặc định: corpus giả --workflow-corpus)")
+    parser.add_argument("--workflow-corpus", type=int, default=2000, help="kích thước corpus giả cho workflow")
+    parser.add_argument("--repeat", type=int, default=1, help="số lần replay toàn bộ các câu")
+    parser.add_argument("--sizes", type=int, nargs="*", default=[1000, 10000, 50000],
+                        help="các kích thước corpus giả để đo retrieval QPS")
+    parser.add_argument("--queries", type=int, default=100, help="số truy vấn retrieval cho mỗi kích thước corpus")
+    parser.add_argument("--num-models", type=int, default=1, help="số model trong ensemble của RetrievalData")
+    parser.add_argument("--quantization", choices=QUANTIZATION_MODES, nargs="*", default=[],
+                        help="đo thêm retrieval với QuantizedIndex (int8 / binary) và recall so với float")
+    parser.add_argument("--rescore-k", type=int, default=200)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="độ trễ giả (giây) mỗi lời gọi LLM")
+    parser.add_argument("--embed-latency", type=float, default=0.0, help="độ trễ giả (giây) mỗi lần encode")
+    parser.add_argument("--search-latency", type=float, default=0.0, help="độ trễ giả (giây) mỗi lần search")
+    parser.add_argument("--irrelevant-rate", type=float, default=0.3)
+    parser.add_argument("--hallucination-rate", type=float, default=0.15)
+    parser.add_argument("--not-useful-rate", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--skip-workflow", action="store_true")
+    parser.add_argument("--skip-retrieval", action="store_true")
+    parser.add_argument("--output", default="./logs/benchmark.json")
+    parser.add_argument("--baseline", default=None, help="file kết quả của lần chạy trước để so sánh")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="mức tệ đi tối đa (0.1 = 10%%) trước khi báo regression")
+    parser.add_argument("--min-delta", type=float, default=0.005, help="chênh lệch tuyệt đối tối thiểu để báo regression")
+    args = parser.parse_args()
+
+    clauses = load_clauses([path for path in args.clauses if os.path.exists(path)])
+    if not clauses:
+        clauses = [record["content"] for record in synthetic_corpus(20, seed=args.seed + 1)]
+    print(f"{len(clauses)} clauses")
+    results = {
+        "meta": {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "git_commit": _git_commit(),
+                 "python": platform.python_version(), "args": vars(args)},
+    }
+
+    if not args.skip_workflow:
+        llm = OfflineChatModel(latency=args.llm_latency, irrelevant_rate=args.irrelevant_rate,
+                               hallucination_rate=args.hallucination_rate, not_useful_rate=args.not_useful_rate,
+                               seed=args.seed)
+        budget = RequestBudget(max_seconds=120, max_llm_calls=40,
+                               max_iterations={"num_hallucination": 2, "num_searchengine": 1})
+        with tempfile.TemporaryDirectory() as directory:
+            if args.corpus:
+                with open(args.corpus, "r", encoding="utf-8") as f:
+                    records = json.load(f)
+            else:
+                records = synthetic_corpus(args.workflow_corpus, seed=args.seed, base_records=clauses)
+            retrieval = build_retrieval(directory, records, num_models=args.num_models, dim=args.dim,
+                                        embed_latency=args.embed_latency)
+            results["workflow"] = bench_workflow(clauses, retrieval, llm, OfflineSearch(args.search_latency),
+                                                 budget, repeat=args.repeat)
+        print(json.dumps(results["workflow"], ensure_ascii=False, indent=1))
+
+    if not args.skip_retrieval:
+        queries = (clauses * (args.queries // len(clauses) + 1))[:args.queries]
+        results["retrieval"] = bench_retrieval(args.sizes, queries, num_models=args.num_models, dim=args.dim,
+                                               base_records=clauses, seed=args.seed,
+                                               quantization=args.quantization, rescore_k=args.rescore_k)
+
+    results["peak_rss_mb"] = peak_rss_mb()
+    Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=1)
+    print(f"results saved to {args.output} (peak RSS {results['peak_rss_mb']} MB)")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), tolerance=args.tolerance, min_delta=args.min_delta)
+        if regressions:
+            raise SystemExit(f"{len(regressions)} metrics regressed more than {args.tolerance:.0%}")
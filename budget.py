@@ -0,0 +1,192 @@
+import threading
+import time
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.runnables.base import RunnableBinding
+
+_TRACKER_KEY = "request_budget_tracker"
+
+# thứ tự ưu tiên khi chọn câu trả lời tốt nhất để trả về lúc hết budget:
+# đã qua hallucination check nhưng chưa trả lời đúng câu hỏi ("not useful") > bị đánh giá là hallucination
+# ("generate"); đây là các verdict mà grading.grade_generation trả về
+VERDICT_RANK = {"useful": 2, "not useful": 1, "generate": 0}
+
+# câu trả lời của degrade_node khi chưa có câu trả lời nào và không gọi được fallback
+INSUFFICIENT_INFORMATION = "Không tìm thấy đủ thông tin để trả lời câu hỏi này. Hãy thử đặt câu hỏi cụ thể hơn."
+
+
+class BudgetTracker(BaseCallbackHandler):
+    """
+    Trạng thái budget của một request: thời điểm bắt đầu, số lời gọi LLM (đếm bằng callback, gồm cả
+    lời gọi trong conditional edge / batch) và câu trả lời tốt nhất đã sinh ra.
+    """
+
+    run_inline = True
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.llm_calls = 0
+        self.best = None
+        self.reason = None
+        self._lock = threading.Lock()
+
+    def on_llm_start(self, serialized, prompts, **kwargs):
+        with self._lock:
+            self.llm_calls += 1
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        with self._lock:
+            self.llm_calls += 1
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def offer(self, generation, verdict):
+        """Ghi nhận một câu trả lời đã được chấm, giữ lại câu có verdict tốt nhất (câu mới hơn nếu bằng nhau)."""
+        rank = VERDICT_RANK.get(verdict, 0)
+        with self._lock:
+            if self.best is None or rank >= self.best[0]:
+                self.best = (rank, generation, verdict)
+
+
+class RequestBudget:
+    """
+    Giới hạn cho mỗi request của workflow: thời gian tối đa, số lời gọi LLM tối đa và số vòng tối đa
+    của từng vòng lặp. Số vòng lặp là các bộ đếm num_* trong state (tăng ở node nằm trên vòng lặp,
+    `increment`), được kiểm tra ở các hàm routing trước khi đi vào vòng lặp (`exhausted`).
+    Khi hết budget, hàm routing chuyển sang node `degrade_node`: trả về câu trả lời tốt nhất đã có,
+    đánh dấu trong state["degraded"]. Nếu chưa có câu trả lời nào (ví dụ hết vòng SearchEngine trước khi
+    đến node rag), `fallback(state)` (một node trả về {"generation": ...}) được gọi khi budget thời gian /
+    số lời gọi LLM còn, không thì trả về `no_answer`; generation không bao giờ là None.
+
+    Thời gian và số lời gọi LLM cần app được bọc bằng `bind` (mỗi lần invoke có một BudgetTracker riêng);
+    không bọc thì chỉ giới hạn số vòng lặp.
+    """
+
+    def __init__(self, max_seconds=None, max_llm_calls=None, max_iterations=None, fallback=None,
+                 no_answer=INSUFFICIENT_INFORMATION):
+        self.max_seconds = max_seconds
+        self.max_llm_calls = max_llm_calls
+        self.max_iterations = dict(max_iterations or {})
+        self.fallback = fallback
+        self.no_answer = no_answer
+
+    def bind(self, app):
+        """Bọc compiled graph: mỗi invoke / ainvoke / stream tạo một BudgetTracker mới trong config."""
+        def attach_tracker(config):
+            tracker = BudgetTracker()
+            return {"callbacks": [tracker], "configurable": {_TRACKER_KEY: tracker}}
+
+        return RunnableBinding(bound=app, config_factories=[attach_tracker])
+
+    @staticmethod
+    def tracker(config):
+        return ((config or {}).get("configurable") or {}).get(_TRACKER_KEY)
+
+    @staticmethod
+    def increment(state, counter):
+        """Update cho state khi đi qua một vòng lặp, ví dụ `return {..., **budget.increment(state, "num_rewrite")}`."""
+        return {counter: state.get(counter, 0) + 1}
+
+    def exhausted(self, state, config=None, loop=None):
+        """
+        Lý do hết budget ("time", "llm_calls" hoặc tên bộ đếm của `loop`), None nếu còn budget.
+        `loop`: bộ đếm num_* của vòng lặp sắp đi vào; None thì chỉ kiểm tra thời gian và số lời gọi LLM.
+        """
+        reason = None
+        if loop is not None and loop in self.max_iterations and state.get(loop, 0) >= self.max_iterations[loop]:
+            reason = loop
+        tracker = self.tracker(config)
+        if tracker is not None and reason is None:
+            if self.max_seconds is not None and tracker.elapsed >= self.max_seconds:
+                reason = "time"
+            elif self.max_llm_calls is not None and tracker.llm_calls >= self.max_llm_calls:
+                reason = "llm_calls"
+        if reason is not None:
+            print(f"---Budget exhausted: {reason}---")
+            if tracker is not None:
+                tracker.reason = reason
+        return reason
+
+    def offer(self, config, generation, verdict):
+        tracker = self.tracker(config)
+        if tracker is not None:
+            tracker.offer(generation, verdict)
+
+    def degrade_node(self, state, config=None):
+        """Node của degrade path: câu trả lời tốt nhất đến giờ, kèm cờ `degraded` (lý do, verdict, số liệu)."""
+        tracker = self.tracker(config)
+        generation, verdict = state.get("generation"), state.get("verdict")
+        degraded = {"reason": None, "verdict": verdict}
+        if tracker is not None:
+            if tracker.best is not None:
+                _, generation, verdict = tracker.best
+            degraded = {
+                "reason": tracker.reason,
+                "verdict": verdict,
+                "elapsed_seconds": round(tracker.elapsed, 3),
+                "llm_calls": tracker.llm_calls,
+            }
+        degraded["iterations"] = {key: state.get(key, 0) for key in self.max_iterations}
+        degraded["answer"] = "best"
+        if generation is None:
+            generation, degraded["answer"] = self._fallback_answer(state, degraded["reason"])
+        print(f"---Returning best generation so far (degraded: {degraded['reason']}, answer: {degraded['answer']})---")
+        return {"generation": generation, "degraded": degraded}
+
+    def _fallback_answer(self, state, reason):
+        # hết thời gian / số lời gọi LLM thì không gọi thêm LLM
+        if self.fallback is not None and reason not in ("time", "llm_calls"):
+            try:
+                generation = self.fallback(state).get("generation")
+            except Exception as e:
+                print(f"---Fallback failed: {e!r}---")
+            else:
+                if generation is not None:
+                    return generation, "fallback"
+        return self.no_answer, "no_answer"
+
+
+if __name__ == "__main__":
+    from typing import TypedDict
+
+    from langchain_core.language_models.fake_chat_models import FakeListChatModel
+    from langgraph.graph import END, StateGraph
+
+    class State(TypedDict):
+        query: str
+        generation: str
+        verdict: str
+        degraded: dict
+        num_hallucination: int
+
+    llm = FakeListChatModel(responses=["answer 1", "answer 2", "answer 3"])
+    budget = RequestBudget(max_seconds=30, max_llm_calls=10, max_iterations={"num_hallucination": 2})
+
+    def rag_node(state):
+        return {"generation": llm.invoke(state["query"]).content}
+
+    def grade_node(state, config):
+        verdict = "not useful" if state.get("num_hallucination", 0) == 0 else "generate"
+        budget.offer(config, state["generation"], verdict)
+        return {"verdict": verdict}
+
+    def route(state, config):
+        if state["verdict"] == "useful":
+            return "useful"
+        return "degrade" if budget.exhausted(state, config, "num_hallucination") else "retry"
+
+    workflow = StateGraph(State)
+    workflow.add_node("rag", rag_node)
+    workflow.add_node("grade", grade_node)
+    workflow.add_node("hallucination", lambda state: budget.increment(state, "num_hallucination"))
+    workflow.add_node("degrade", budget.degrade_node)
+    workflow.set_entry_point("rag")
+    workflow.add_edge("rag", "grade")
+    workflow.add_conditional_edges("grade", route, {"useful": END, "retry": "hallucination", "degrade": "degrade"})
+    workflow.add_edge("hallucination", "rag")
+    workflow.add_edge("degrade", END)
+    app = budget.bind(workflow.compile())
+    result = app.invoke({"query": "q"})
+    print(result["generation"], result["degraded"])
@@ -0,0 +1,144 @@
+import json
+import re
+
+import numpy as np
+
+from document_store import load_document_store
+from embedding_store import reorder_embedding_store
+
+# tên tool của router (Phuc_pipeline_v3) -> category trong laws_grouping_110225.json
+ROUTE_CATEGORIES = {
+    "LaborLawsVectorStore": "Labor Laws",
+    "SocialSecurityVectorStore": "Social Security and Insurance Laws",
+    "PublicServiceVectorStore": "Public Service and Government Laws",
+    "EducationResearchVectorStore": "Education and Research Laws",
+    "HealthWelfareVectorStore": "Health and Welfare Laws",
+    "JudicialLegalSystemVectorStore": "Judicial and Legal System Laws",
+    "MiscellaneousLawsVectorStore": "Miscellaneous Laws",
+}
+
+
+def _normalize_name(name):
+    return re.sub(r"[^0-9a-z]", "", name.lower())
+
+
+def law_key(metadata):
+    """Khóa của một luật giống trong laws_grouping: "<law_number>　<law_name>"."""
+    return metadata.get("law_number", "") + "　" + metadata.get("law_name", "")
+
+
+class CategoryIndex:
+    """
+    Nhãn category của từng dòng corpus dưới dạng bitmask (một luật có thể thuộc nhiều category),
+    xây dựng từ laws_grouping_110225.json. Dùng để giới hạn việc chấm điểm vào các dòng thuộc
+    category được router chọn trên cùng một ma trận embeddings dùng chung.
+    """
+
+    def __init__(self, categories, row_masks):
+        if len(categories) > 63:
+            raise ValueError("CategoryIndex supports at most 63 categories")
+        self.categories = list(categories)
+        self.row_masks = row_masks
+        self._bits = {}
+        for bit, category in enumerate(self.categories):
+            for alias in (category, category.replace(" ", "_")):
+                self._bits[_normalize_name(alias)] = 1 << bit
+        for route, category in ROUTE_CATEGORIES.items():
+            if _normalize_name(category) in self._bits:
+                self._bits[_normalize_name(route)] = self._bits[_normalize_name(category)]
+        self._rows_cache = {}
+        self._slices_cache = {}
+
+    @classmethod
+    def from_grouping(cls, grouping_path, document_store):
+        with open(grouping_path, "r", encoding="utf-8") as f:
+            grouping = json.load(f)
+        categories = [group["category"] for group in grouping]
+        # tra cứu bằng dict thay vì duyệt list `in route_lawids_dict[route]` cho từng document
+        law_masks = {}
+        for bit, group in enumerate(grouping):
+            for law in group["laws"]:
+                law_masks[law] = law_masks.get(law, 0) | (1 << bit)
+        dtype = np.uint8 if len(categories) <= 8 else np.uint16 if len(categories) <= 16 else np.uint64
+        row_masks = np.zeros(len(document_store), dtype=dtype)
+        for row in range(len(document_store)):
+            row_masks[row] = law_masks.get(law_key(document_store.metadata(row)), 0)
+        return cls(categories, row_masks)
+
+    def bit(self, route):
+        """Bit của một route/category (chấp nhận tên tool router, tên category hoặc id_route)."""
+        return self._bits.get(_normalize_name(route), 0)
+
+    def reordered(self, row_ids):
+        """CategoryIndex theo thứ tự dòng của một store đã sắp xếp lại (dòng p của store = dòng corpus row_ids[p])."""
+        return CategoryIndex(self.categories, self.row_masks[row_ids])
+
+    def mask_for(self, routes):
+        mask = 0
+        for route in routes or []:
+            mask |= self.bit(route)
+        return mask
+
+    def rows_for(self, routes):
+        """
+        Các dòng thuộc ít nhất một trong các `routes`. Trả về None nếu không route nào hợp lệ
+        hoặc category không có dòng nào (khi đó tìm trên toàn corpus).
+        """
+        mask = self.mask_for(routes)
+        if mask == 0:
+            return None
+        if mask not in self._rows_cache:
+            rows = np.flatnonzero(self.row_masks & self.row_masks.dtype.type(mask))
+            self._rows_cache[mask] = rows if len(rows) else None
+        return self._rows_cache[mask]
+
+    def slices_for(self, routes, max_slices=64):
+        """
+        Các dòng của rows_for dưới dạng các đoạn liên tiếp [start, end), để chấm điểm bằng view
+        emb[start:end] thay vì copy emb[rows]. Trả về None nếu không có dòng nào hoặc các dòng bị chia
+        thành hơn `max_slices` đoạn (store chưa được sắp xếp theo category, xem reorder_store_by_category).
+        """
+        mask = self.mask_for(routes)
+        if mask not in self._slices_cache:
+            rows = self.rows_for(routes)
+            slices = None
+            if rows is not None:
+                breaks = np.flatnonzero(np.diff(rows) != 1) + 1
+                starts = np.concatenate(([0], breaks))
+                ends = np.concatenate((breaks, [len(rows)]))
+                if len(starts) <= max_slices:
+                    slices = [(int(rows[start]), int(rows[end - 1]) + 1) for start, end in zip(starts, ends)]
+            self._slices_cache[mask] = slices
+        return self._slices_cache[mask]
+
+    def counts(self):
+        return {
+            category: int(np.count_nonzero(self.row_masks & self.row_masks.dtype.type(1 << bit)))
+            for bit, category in enumerate(self.categories)
+        }
+
+
+def category_order(row_masks):
+    """
+    Thứ tự dòng theo bitmask category (ổn định theo thứ tự corpus): các dòng của mỗi category nằm
+    trong một vài đoạn liên tiếp (luật thuộc nhiều category nằm trong đoạn của bitmask kết hợp).
+    """
+    return np.argsort(row_masks, kind="stable").astype(np.int64)
+
+
+def reorder_store_by_category(store_dir, corpus_path, grouping_path):
+    """Sắp xếp lại embedding store theo category để mỗi category là các slice của ma trận dùng chung."""
+    index = CategoryIndex.from_grouping(grouping_path, load_document_store(corpus_path))
+    return reorder_embedding_store(store_dir, category_order(index.row_masks))
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Reorder an embedding store so that each category is contiguous")
+    parser.add_argument("store_dir")
+    parser.add_argument("corpus_path")
+    parser.add_argument("grouping_path")
+    args = parser.parse_args()
+    manifest = reorder_store_by_category(args.store_dir, args.corpus_path, args.grouping_path)
+    print(json.dumps(manifest.get("row_order"), indent=2))
@@ -0,0 +1,204 @@
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+
+# chữ Hán / kana / hangul: khoảng 1 token mỗi ký tự; các ký tự khác khoảng 4 ký tự một token
+_CJK_RE = re.compile(r"[぀-ヿ㐀-䶿一-鿿가-힯ｦ-ﾟ]")
+
+summary_prompt = ChatPromptTemplate.from_template(
+    "You maintain a running summary of a conversation so that it can replace the older turns.\n"
+    "Update the current summary with the new turns below. Keep every conclusion, cited law / article, "
+    "number and decision; drop pleasantries and repetition. Use at most {max_words} words and "
+    "write in the same language as the conversation.\n\n"
+    "【Current summary】\n{summary}\n\n"
+    "【New turns】\n{turns}\n\n"
+    "Return only the updated summary."
+)
+
+
+def estimate_tokens(text):
+    text = str(text)
+    cjk = len(_CJK_RE.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def render_turn(turn):
+    """Một lượt hội thoại dạng text (để đếm token và đưa vào prompt tóm tắt)."""
+    return "\n".join(f"{key}: {value}" for key, value in turn.items())
+
+
+def summary_turn(summary):
+    """Lượt giả chứa bản tóm tắt, cùng dạng {"human", "ai"} với chat_history của app.py."""
+    return {"human": "(tóm tắt các lượt trước)", "ai": summary}
+
+
+def build_summarizer(llm, max_words=200):
+    return summary_prompt.partial(max_words=str(max_words)) | llm | StrOutputParser()
+
+
+class ChatHistory:
+    """
+    Lịch sử của một session, lưu gọn: các lượt gần nhất dạng tuple giá trị (tên khóa dùng chung một schema),
+    số token của từng lượt và bản tóm tắt của tất cả các lượt cũ hơn. Lượt đã được tóm tắt bị bỏ khỏi
+    bộ nhớ nên kích thước một session bị chặn bởi budget token, không tăng theo độ dài hội thoại.
+    """
+
+    __slots__ = ("_keys", "_values", "_tokens", "window_tokens", "summary", "summary_tokens", "summarized_turns")
+
+    def __init__(self):
+        self._keys = None
+        self._values = []
+        self._tokens = []
+        self.window_tokens = 0
+        self.summary = ""
+        self.summary_tokens = 0
+        self.summarized_turns = 0
+
+    def _add(self, turn, tokens):
+        keys = tuple(turn.keys())
+        if self._keys is None:
+            self._keys = keys
+        if keys == self._keys:
+            self._values.append(tuple(turn.values()))
+        else:
+            # lượt có khóa khác schema: giữ nguyên dict
+            self._values.append(dict(turn))
+        self._tokens.append(tokens)
+        self.window_tokens += tokens
+
+    def _turn(self, values):
+        return dict(values) if isinstance(values, dict) else dict(zip(self._keys, values))
+
+    def _oldest(self, count):
+        return [self._turn(values) for values in self._values[:count]]
+
+    def _drop_oldest(self, count):
+        self.window_tokens -= sum(self._tokens[:count])
+        del self._values[:count], self._tokens[:count]
+        self.summarized_turns += count
+
+    @property
+    def turns(self):
+        """Các lượt gần nhất (chưa được tóm tắt), cũ trước."""
+        return [self._turn(values) for values in self._values]
+
+    def __len__(self):
+        return self.summarized_turns + len(self._values)
+
+
+class HistoryManager:
+    """
+    Cửa sổ lịch sử theo budget token cho prompt (rag_full_chain / fallback_chain / rag_history_chain):
+    bản tóm tắt các lượt cũ + các lượt gần nhất, tổng cộng không quá `max_tokens`.
+
+    - Khi cửa sổ vượt `max_tokens`, các lượt cũ nhất được gộp vào bản tóm tắt (đến khi còn `target_tokens`,
+      để không phải tóm tắt lại ở mỗi lượt). Bản tóm tắt được cập nhật tăng dần: chỉ các lượt vừa bị đẩy ra
+      được gửi cho summarizer cùng bản tóm tắt hiện tại, mỗi lượt chỉ được tóm tắt đúng một lần.
+    - Kết quả tóm tắt được cache theo nội dung (tóm tắt cũ + các lượt mới), nên dựng lại cùng một lịch sử
+      (ví dụ lịch sử các câu hợp đồng liên quan trong notebook) không gọi lại LLM.
+    - Không có summarizer thì các lượt cũ chỉ bị bỏ đi (cửa sổ trượt thuần).
+    """
+
+    def __init__(self, summarizer=None, max_tokens=2000, target_tokens=None, count_tokens=estimate_tokens,
+                 render_turn=render_turn, summary_turn=summary_turn, cache_size=4096):
+        self.summarizer = summarizer
+        self.max_tokens = max_tokens
+        self.target_tokens = target_tokens if target_tokens is not None else max_tokens * 3 // 4
+        self.count_tokens = count_tokens
+        self.render_turn = render_turn
+        self.summary_turn = summary_turn
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"summaries": 0, "cache_hits": 0, "turns_summarized": 0, "turns_dropped": 0}
+
+    def new_session(self):
+        return ChatHistory()
+
+    def append(self, history, turn, compact=True):
+        """Thêm một lượt ({"human", "ai"} hoặc dạng dict bất kỳ); tóm tắt ngay nếu vượt budget."""
+        history._add(turn, self.count_tokens(self.render_turn(turn)))
+        if compact:
+            self.compact(history)
+        return history
+
+    def needs_compaction(self, history):
+        return history.summary_tokens + history.window_tokens > self.max_tokens
+
+    def compact(self, history):
+        """
+        Gộp các lượt cũ nhất vào bản tóm tắt. Các lượt chỉ bị bỏ khỏi history sau khi summarizer trả về:
+        summarizer lỗi thì exception được ném ra và history giữ nguyên (lần compact sau sẽ thử lại).
+        """
+        if not self.needs_compaction(history):
+            return False
+        count, tokens = 0, history.summary_tokens + history.window_tokens
+        # luôn giữ lại lượt mới nhất
+        while count < len(history._values) - 1 and tokens > self.target_tokens:
+            tokens -= history._tokens[count]
+            count += 1
+        if count == 0:
+            return False
+        if self.summarizer is None:
+            history._drop_oldest(count)
+            self.stats["turns_dropped"] += count
+            return True
+        turns_text = "\n\n".join(self.render_turn(turn) for turn in history._oldest(count))
+        summary = self._summarize(history.summary, turns_text)
+        history.summary = summary
+        history.summary_tokens = self.count_tokens(summary)
+        history._drop_oldest(count)
+        self.stats["turns_summarized"] += count
+        return True
+
+    def _summarize(self, summary, turns_text):
+        key = hashlib.sha1(f"{summary}\x00{turns_text}".encode("utf-8")).hexdigest()
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                self.stats["cache_hits"] += 1
+                return cached
+        new_summary = self.summarizer.invoke({"summary": summary or "(none)", "turns": turns_text}).strip()
+        with self._lock:
+            self.stats["summaries"] += 1
+            self._cache[key] = new_summary
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return new_summary
+
+    def messages(self, history):
+        """chat_history cho prompt: lượt tóm tắt (nếu có) rồi các lượt gần nhất."""
+        turns = history.turns
+        if history.summary:
+            return [self.summary_turn(history.summary)] + turns
+        return turns
+
+    def fit(self, turns):
+        """Áp dụng budget cho một danh sách lượt dựng sẵn (không lưu session)."""
+        history = self.new_session()
+        for turn in turns:
+            self.append(history, turn, compact=False)
+        self.compact(history)
+        return self.messages(history)
+
+
+if __name__ == "__main__":
+    import sys
+
+    from langchain_core.runnables import RunnableLambda
+
+    # summarizer giả: bản tóm tắt có độ dài cố định
+    fake_summarizer = RunnableLambda(lambda x: "tóm tắt: " + (x["summary"] + x["turns"])[-300:])
+    manager = HistoryManager(fake_summarizer, max_tokens=300)
+    history = manager.new_session()
+    for i in range(50):
+        manager.append(history, {"human": f"câu hỏi {i} " + "労働基準法" * 10, "ai": f"trả lời {i} " + "x" * 200})
+    messages = manager.messages(history)
+    print(len(history), "turns,", len(messages), "messages in prompt:", messages[0]["ai"])
+    print(manager.stats, "window tokens:", history.window_tokens, "summary tokens:", history.summary_tokens)
+    print("session size (shallow):", sys.getsizeof(history._values), "bytes for", len(history._values), "turns")
@@ -1,12 +1,15 @@
 from pathlib import Path
 import shutil
+from indexing import sync_documents
+from semantic_neighbors import SemanticNeighbourEngine, get_embedding_model
 
 def create_or_update_index(collection_name: str, embedding_model, persist_directory: str, 
                            all_docs: List[Document], clear_persist_folder: bool = False):
     """
     Tạo hoặc cập nhật index vector.
     - Nếu `clear_persist_folder=True`, sẽ xóa thư mục lưu trữ trước khi tạo lại từ đầu.
-    - Nếu `clear_persist_folder=False`, sẽ giữ dữ liệu cũ và chỉ cập nhật tài liệu mới.
+    - Nếu `clear_persist_folder=False`, sẽ giữ dữ liệu cũ và chỉ embed các tài liệu mới hoặc đã thay đổi,
+      tài liệu không còn trong `all_docs` sẽ bị xóa khỏi index.
     """
     pf = Path(persist_directory)
     if clear_persist_folder:
@@ -19,71 +22,46 @@ def create_or_update_index(collection_name: str, embedding_model, persist_direct
     print("\nGenerating and persisting the embeddings..")
     print("Persist Directory:", persist_directory)
     
-    vectordb = Chroma.from_documents(
+    vectordb = Chroma(
         collection_name=collection_name,
-        documents=all_docs, 
-        embedding=embedding_model, 
+        embedding_function=embedding_model,
         persist_directory=persist_directory
     )
-    vectordb.persist()
+    stats = sync_documents(vectordb, all_docs)
+    print(f"Index stats: {stats}")
     
     # Đóng connection để tránh lỗi "readonly database"
     # del vectordb
     # gc.collect()
     return vectordb
 
+# model embedding cho sematic_reference; chỉ được load ở lần gọi đầu tiên
+# (get_embedding_model có lru_cache nên mỗi process chỉ load một lần)
+semantic_model_name = "intfloat/multilingual-e5-large"
+
 def sematic_reference(state):
     """
     Thực hiện embedding giữa các câu trong cùng một điều rồi lấy ra các câu có embedding gần nhau nhất, 
     sau đó đưa cho LLM để đánh giá có phải là câu liên quan trực tiếp không.
-    Sử dụng ChromaDB để lấy ra các câu có embedding gần nhau nhất.
+    Tất cả các câu được encode một lần, láng giềng gần nhất trong từng điều được tính bằng
+    phép nhân ma trận (SemanticNeighbourEngine) thay vì tạo Chroma collection cho mỗi điều.
     """
     print("---SEMANTIC REFERENCE---")
     for key, value in state.items():
         print(key, value)
 
     questions = state["questions"]
-    # tạo ra một list chứa các câu trong cùng một điều
-    question_same_dieu_dict = {}
-    for question in questions:
-        # print("question", question)
-        # print('question["question_content"]', question["question_content"])
-        # print('question["question_content"].metadata', question["question_content"].metadata)
-        dieu_id = question["question_content"].metadata["article_title"] + "_" + question["question_content"].metadata["article_number"]
-        if dieu_id in question_same_dieu_dict:
-            question_same_dieu_dict[dieu_id].append(question)
-        else:
-            question_same_dieu_dict[dieu_id] = [question]
-
-    embed_model = HuggingFaceEmbeddings(model_name="intfloat/multilingual-e5-large")
-    sematic_reference_dict = {}
-    # duyệt qua từng điều trong question_same_dieu_dict
-    for dieu, value in question_same_dieu_dict.items(): 
-        print("dieu", dieu)
-        print("value", value)
-        new_value = [val["question_content"] for val in value]
-        vectordb = create_or_update_index(
-            collection_name="same_dieu",
-            embedding_model=embed_model,
-            persist_directory="./same_dieu_db",
-            all_docs=new_value,
-            clear_persist_folder=True  # Xóa dữ liệu cũ nếu có, tạo lại từ đầu
-        )
-        retriever_dieu = vectordb.as_retriever(search_kwargs={"k": 6})
-        # Duyệt qua từng câu trong value để tìm các câu có embedding gần nhau nhất
-        for question in value:
-            # print("question", question)
-            docs = retriever_dieu.get_relevant_documents(question["question_content"].page_content)
-            # print("docs", docs)
-            # print('question["question_content"]', question["question_content"])
-            # loại chính question ra khỏi docs
-            docs = [doc for doc in docs if doc.page_content != question["question_content"].page_content]
-            id_question = question["question_content"].page_content
-            sematic_reference_dict[id_question] = docs
+    # khóa điều của từng câu: các câu trong cùng một điều được so sánh với nhau
+    dieu_ids = [
+        question["question_content"].metadata["article_title"] + "_" + question["question_content"].metadata["article_number"]
+        for question in questions
+    ]
+    texts = [question["question_content"].page_content for question in questions]
 
-    for question in questions:
-        id_question = question["question_content"].page_content
-        question["sematic_reference"] = sematic_reference_dict[id_question]
+    semantic_neighbour_engine = SemanticNeighbourEngine(get_embedding_model(semantic_model_name), k=5)
+    neighbours = semantic_neighbour_engine.neighbours(texts, dieu_ids)
+    for question, question_neighbours in zip(questions, neighbours):
+        question["sematic_reference"] = [questions[idx]["question_content"] for idx, _ in question_neighbours]
 
     state["questions"] = questions
     return state
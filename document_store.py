@@ -0,0 +1,104 @@
+import json
+import sys
+from functools import lru_cache
+
+from langchain_core.documents import Document
+
+# điểm similarity của retrieval được gắn vào metadata của Document trả về (xem grading.ScoreGate)
+RETRIEVAL_SCORE_KEY = "retrieval_score"
+
+
+def _intern(value):
+    # Các giá trị metadata (tên luật, số chương, ...) lặp lại rất nhiều giữa các điều,
+    # intern để các bản ghi dùng chung một object chuỗi
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class DocumentStore:
+    """
+    Kho documents của corpus luật, được load một lần và giữ trong bộ nhớ.
+
+    - Tra cứu O(1) theo số thứ tự dòng (row id, chính là index trong ma trận embeddings)
+      và theo `id` của luật/điều.
+    - Metadata được lưu gọn: mỗi dòng chỉ giữ một tuple giá trị, các tên khóa dùng chung
+      một schema, các chuỗi lặp lại được intern.
+    """
+
+    def __init__(self, records):
+        self._ids = []
+        self._contents = []
+        self._schema_ids = []
+        self._values = []
+        self._schemas = []
+        schema_index = {}
+        self._rows_by_id = {}
+
+        for row, record in enumerate(records):
+            law_id = _intern(record.get("id"))
+            metadata = record.get("metadata") or {}
+            keys = tuple(_intern(key) for key in metadata.keys())
+            if keys not in schema_index:
+                schema_index[keys] = len(self._schemas)
+                self._schemas.append(keys)
+            self._ids.append(law_id)
+            self._contents.append(record["content"])
+            self._schema_ids.append(schema_index[keys])
+            self._values.append(tuple(_intern(value) for value in metadata.values()))
+            self._rows_by_id.setdefault(law_id, []).append(row)
+
+    @classmethod
+    def from_json(cls, path):
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def __len__(self):
+        return len(self._contents)
+
+    def law_id(self, row):
+        return self._ids[row]
+
+    def content(self, row):
+        return self._contents[row]
+
+    def metadata(self, row):
+        return dict(zip(self._schemas[self._schema_ids[row]], self._values[row]))
+
+    def rows_for_id(self, law_id):
+        return self._rows_by_id.get(law_id, [])
+
+    def get(self, row):
+        """Trả về Document tại dòng `row`."""
+        row = int(row)
+        return Document(page_content=self._contents[row], metadata=self.metadata(row))
+
+    def get_by_id(self, law_id):
+        """Trả về các Document có `id` luật/điều bằng `law_id`."""
+        return [self.get(row) for row in self.rows_for_id(law_id)]
+
+    def get_documents(self, rows, dedupe_by_id=True, scores=None):
+        """
+        Tra cứu theo lô các dòng `rows`, giữ đúng thứ tự.
+        Nếu `dedupe_by_id=True` thì mỗi `id` luật/điều chỉ xuất hiện một lần (giống return_documents cũ).
+        Nếu có `scores` (cùng độ dài với `rows`) thì điểm của mỗi dòng được ghi vào
+        metadata[RETRIEVAL_SCORE_KEY].
+        """
+        documents = []
+        seen = set()
+        for i, row in enumerate(rows):
+            row = int(row)
+            if dedupe_by_id:
+                law_id = self._ids[row]
+                if law_id in seen:
+                    continue
+                seen.add(law_id)
+            doc = self.get(row)
+            if scores is not None:
+                doc.metadata[RETRIEVAL_SCORE_KEY] = float(scores[i])
+            documents.append(doc)
+        return documents
+
+
+@lru_cache(maxsize=None)
+def load_document_store(path):
+    """Load DocumentStore từ file corpus JSON, mỗi process chỉ parse file một lần."""
+    return DocumentStore.from_json(path)
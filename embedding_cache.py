@@ -0,0 +1,114 @@
+import hashlib
+import sqlite3
+import threading
+from pathlib import Path
+from typing import List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Bọc một model embedding (LangChain `Embeddings` như HuggingFaceEmbeddings, hoặc
+    SentenceTransformer) và cache vector trên đĩa theo (tên model, hash của văn bản).
+
+    - Vector được lưu dạng bytes của mảng numpy (`dtype` mặc định float32, có thể dùng float16
+      để giảm một nửa dung lượng) trong SQLite.
+    - Chỉ các văn bản chưa có trong cache mới được gửi cho model, theo batch `batch_size`.
+    - `hits`, `misses` và `hit_rate` để theo dõi hiệu quả cache.
+
+    Dùng được trực tiếp làm `embedding` cho `Chroma.from_documents` và thay cho
+    `RetrievalData.encode_legal_data` (qua `encode`).
+    """
+
+    def __init__(self, model, model_name: str, cache_path: str = "./cache/embeddings.db",
+                 batch_size: int = 64, dtype: str = "float32"):
+        self.model = model
+        self.model_name = model_name
+        self.cache_path = str(cache_path)
+        self.batch_size = batch_size
+        self.dtype = np.dtype(dtype)
+        self.hits = 0
+        self.misses = 0
+        if self.cache_path != ":memory:":
+            Path(self.cache_path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.cache_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, dtype TEXT NOT NULL, vector BLOB NOT NULL)"
+        )
+        self._conn.commit()
+
+    def _key(self, text: str, kind: str) -> str:
+        # phân biệt document/query vì một số model thêm instruction khác nhau cho query
+        return hashlib.sha256(f"{self.model_name}\x00{kind}\x00{text}".encode("utf-8")).hexdigest()
+
+    def _lookup(self, keys):
+        found = {}
+        with self._lock:
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT key, dtype, vector FROM embeddings WHERE key IN ({placeholders})", chunk
+                ).fetchall()
+                for key, dtype, vector in rows:
+                    found[key] = np.frombuffer(vector, dtype=dtype).astype(np.float32)
+        return found
+
+    def _store(self, keys, vectors):
+        rows = [(key, self.dtype.str, np.asarray(vec, dtype=self.dtype).tobytes()) for key, vec in zip(keys, vectors)]
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO embeddings (key, dtype, vector) VALUES (?, ?, ?)", rows)
+            self._conn.commit()
+
+    def _compute(self, texts, kind):
+        if hasattr(self.model, "embed_documents"):
+            if kind == "query":
+                return [self.model.embed_query(text) for text in texts]
+            return self.model.embed_documents(texts)
+        # SentenceTransformer
+        return list(self.model.encode(texts, batch_size=self.batch_size))
+
+    def _embed(self, texts, kind):
+        keys = [self._key(text, kind) for text in texts]
+        found = self._lookup(list(dict.fromkeys(keys)))
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in missing:
+                missing[key] = text
+        self.hits += len(texts) - sum(1 for key in keys if key in missing)
+        self.misses += sum(1 for key in keys if key in missing)
+
+        missing_keys = list(missing)
+        for start in range(0, len(missing_keys), self.batch_size):
+            batch_keys = missing_keys[start:start + self.batch_size]
+            vectors = self._compute([missing[key] for key in batch_keys], kind)
+            self._store(batch_keys, vectors)
+            for key, vec in zip(batch_keys, vectors):
+                # đọc lại theo dtype lưu trữ để kết quả giống hệt lần gọi sau (trúng cache)
+                found[key] = np.asarray(vec, dtype=self.dtype).astype(np.float32)
+        return [found[key] for key in keys]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [vec.tolist() for vec in self._embed(list(texts), "document")]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed([text], "query")[0].tolist()
+
+    def encode(self, texts, **kwargs):
+        """Giống SentenceTransformer.encode: trả về ma trận numpy (num_texts, dim), hoặc một vector nếu truyền một chuỗi."""
+        if isinstance(texts, str):
+            return self._embed([texts], "document")[0]
+        vectors = self._embed(list(texts), "document")
+        return np.vstack(vectors) if vectors else np.zeros((0, 0), dtype=np.float32)
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hit_rate}
@@ -0,0 +1,243 @@
+import hashlib
+import json
+import os
+import pickle
+from pathlib import Path
+
+import numpy as np
+
+MANIFEST_NAME = "manifest.json"
+FORMAT_VERSION = 1
+
+
+def corpus_hash(corpus_path, chunk_size=1 << 20):
+    """
+    Tính sha256 của file corpus JSON (đọc theo từng chunk để không phải load cả file vào RAM).
+    """
+    h = hashlib.sha256()
+    with open(corpus_path, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _corpus_fingerprint(corpus_path):
+    stat = os.stat(corpus_path)
+    return {"corpus_size": stat.st_size, "corpus_mtime": stat.st_mtime}
+
+
+def save_embedding_store(store_dir, model_names, embeddings, corpus_path, dtype="float32"):
+    """
+    Lưu embeddings của corpus thành các file .npy (mỗi model một ma trận) kèm manifest.json.
+
+    :param store_dir: thư mục lưu trữ.
+    :param model_names: tên/đường dẫn của các model (theo đúng thứ tự của embeddings).
+    :param embeddings: danh sách ma trận (num_docs, dim), mỗi model một ma trận.
+    :param corpus_path: file corpus JSON dùng để tạo embeddings (dùng để tính corpus hash).
+    """
+    if len(model_names) != len(embeddings):
+        raise ValueError("model_names and embeddings must have the same length")
+    store = Path(store_dir)
+    store.mkdir(parents=True, exist_ok=True)
+    old_files = _store_files(read_manifest(store)) if (store / MANIFEST_NAME).exists() else set()
+
+    models = []
+    num_docs = None
+    for idx, (model_name, emb) in enumerate(zip(model_names, embeddings)):
+        emb = np.ascontiguousarray(emb, dtype=dtype)
+        if emb.ndim != 2:
+            raise ValueError(f"Embeddings of '{model_name}' must be 2-d, got shape {emb.shape}")
+        if num_docs is None:
+            num_docs = emb.shape[0]
+        elif emb.shape[0] != num_docs:
+            raise ValueError(f"Embeddings of '{model_name}' have {emb.shape[0]} rows, expected {num_docs}")
+        matrix_file = f"model_{idx}.npy"
+        norms_file = f"model_{idx}.norms.npy"
+        np.save(store / matrix_file, emb)
+        # lưu sẵn norm của từng vector để tính cosine mà không phải duyệt lại cả ma trận khi load
+        np.save(store / norms_file, np.linalg.norm(emb, axis=1).astype(dtype))
+        models.append({
+            "model_name": str(model_name),
+            "file": matrix_file,
+            "norms_file": norms_file,
+            "dim": int(emb.shape[1]),
+            "dtype": str(emb.dtype),
+        })
+
+    manifest = {
+        "format_version": FORMAT_VERSION,
+        "num_docs": int(num_docs or 0),
+        "corpus_hash": corpus_hash(corpus_path),
+        **_corpus_fingerprint(corpus_path),
+        "models": models,
+    }
+    # ghi manifest sau cùng (và ghi atomic) để một store ghi dở không bao giờ được coi là hợp lệ
+    _write_manifest(store, manifest)
+    # encode lại một store đã sắp xếp (reorder_embedding_store): xóa các ma trận và row_ids của thứ tự cũ
+    for name in old_files - _store_files(manifest):
+        (store / name).unlink(missing_ok=True)
+    return manifest
+
+
+def _store_files(manifest):
+    """Các file của store mà manifest tham chiếu tới."""
+    files = {name for model in manifest.get("models", []) for name in (model["file"], model["norms_file"])}
+    if manifest.get("row_order"):
+        files.add(manifest["row_order"]["file"])
+    return files
+
+
+def _write_manifest(store, manifest):
+    tmp_path = store / (MANIFEST_NAME + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, store / MANIFEST_NAME)
+
+
+def read_manifest(store_dir):
+    with open(Path(store_dir) / MANIFEST_NAME, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def verify_corpus(manifest, corpus_path):
+    """
+    Kiểm tra embeddings có được tạo từ đúng file corpus hay không.
+    Nếu kích thước và mtime của file không đổi thì bỏ qua việc hash lại cả file.
+    """
+    fingerprint = _corpus_fingerprint(corpus_path)
+    if (fingerprint["corpus_size"] == manifest.get("corpus_size")
+            and fingerprint["corpus_mtime"] == manifest.get("corpus_mtime")):
+        return
+    actual = corpus_hash(corpus_path)
+    if actual != manifest["corpus_hash"]:
+        raise ValueError(
+            f"Embedding store was built from a different corpus: expected hash "
+            f"{manifest['corpus_hash']}, got {actual} for '{corpus_path}'. "
+            f"Re-encode the corpus (encode_legal_data_flag=True)."
+        )
+
+
+def load_embedding_store(store_dir, corpus_path=None, model_names=None):
+    """
+    Mở các ma trận embeddings bằng memory mapping (np.load(mmap_mode="r")).
+    Việc mở gần như tức thì, các worker process cùng dùng chung page cache của hệ điều hành.
+
+    :param corpus_path: nếu truyền vào, kiểm tra corpus hash và báo lỗi ngay nếu không khớp.
+    :param model_names: nếu truyền vào, kiểm tra thứ tự model trong store có khớp không.
+    :return: (danh sách ma trận embeddings, danh sách norms, manifest)
+    """
+    store = Path(store_dir)
+    manifest = read_manifest(store)
+    if manifest.get("format_version") != FORMAT_VERSION:
+        raise ValueError(f"Unsupported embedding store format: {manifest.get('format_version')}")
+    if corpus_path is not None:
+        verify_corpus(manifest, corpus_path)
+    if model_names is not None:
+        stored_names = [m["model_name"] for m in manifest["models"]]
+        if [str(name) for name in model_names] != stored_names:
+            raise ValueError(f"Embedding store models {stored_names} do not match {list(model_names)}")
+
+    matrices, norms = [], []
+    for model in manifest["models"]:
+        emb = np.load(store / model["file"], mmap_mode="r")
+        if emb.shape != (manifest["num_docs"], model["dim"]) or str(emb.dtype) != model["dtype"]:
+            raise ValueError(f"Embedding file '{model['file']}' does not match the manifest")
+        matrices.append(emb)
+        norms.append(np.load(store / model["norms_file"], mmap_mode="r"))
+    return matrices, norms, manifest
+
+
+def store_hash(manifest):
+    """
+    Khóa nội dung của store cho các chỉ mục build từ store (ann_index, quantization): corpus hash,
+    kèm hash thứ tự dòng nếu store đã được sắp xếp lại bằng reorder_embedding_store.
+    """
+    row_order = manifest.get("row_order")
+    return manifest["corpus_hash"] if not row_order else f"{manifest['corpus_hash']}:{row_order['hash']}"
+
+
+def load_row_ids(store_dir, manifest):
+    """Dòng corpus của từng dòng store, None nếu store giữ nguyên thứ tự corpus."""
+    row_order = manifest.get("row_order")
+    if not row_order:
+        return None
+    return np.load(Path(store_dir) / row_order["file"])
+
+
+def reorder_embedding_store(store_dir, row_ids, chunk_size=65536):
+    """
+    Sắp xếp lại các dòng của store: dòng thứ p của store mới là dòng corpus `row_ids[p]`
+    (ví dụ theo category, xem category_index.reorder_store_by_category).
+
+    Các ma trận mới được ghi ra file mới (theo từng chunk, không load cả ma trận vào RAM), manifest được
+    ghi sau cùng rồi mới xóa file cũ, nên một lần sắp xếp dở không làm hỏng store.
+    """
+    store = Path(store_dir)
+    matrices, norms, manifest = load_embedding_store(store)
+    num_docs = manifest["num_docs"]
+    row_ids = np.asarray(row_ids, dtype=np.int64)
+    if len(row_ids) != num_docs or not np.array_equal(np.sort(row_ids), np.arange(num_docs)):
+        raise ValueError(f"row_ids must be a permutation of the {num_docs} corpus rows")
+    old_ids = load_row_ids(store, manifest)
+    if old_ids is None:
+        if np.array_equal(row_ids, np.arange(num_docs)):
+            return manifest
+        source = row_ids
+    else:
+        # vị trí hiện tại trong store của từng dòng corpus
+        positions = np.empty(num_docs, dtype=np.int64)
+        positions[old_ids] = np.arange(num_docs)
+        source = positions[row_ids]
+    order_hash = hashlib.sha256(row_ids.tobytes()).hexdigest()
+    if old_ids is not None and manifest["row_order"]["hash"] == order_hash:
+        return manifest
+
+    suffix = order_hash[:12]
+    models, old_files = [], []
+    for idx, (model, emb, emb_norms) in enumerate(zip(manifest["models"], matrices, norms)):
+        matrix_file = f"model_{idx}.{suffix}.npy"
+        norms_file = f"model_{idx}.{suffix}.norms.npy"
+        out = np.lib.format.open_memmap(store / matrix_file, mode="w+", dtype=emb.dtype, shape=emb.shape)
+        for start in range(0, num_docs, chunk_size):
+            out[start:start + chunk_size] = emb[source[start:start + chunk_size]]
+        out.flush()
+        del out
+        np.save(store / norms_file, np.asarray(emb_norms)[source])
+        models.append({**model, "file": matrix_file, "norms_file": norms_file})
+        old_files += [model["file"], model["norms_file"]]
+    row_ids_file = f"row_ids.{suffix}.npy"
+    np.save(store / row_ids_file, row_ids)
+    if old_ids is not None:
+        old_files.append(manifest["row_order"]["file"])
+
+    manifest = {**manifest, "models": models, "row_order": {"file": row_ids_file, "hash": order_hash}}
+    _write_manifest(store, manifest)
+    del matrices, norms
+    for name in old_files:
+        (store / name).unlink(missing_ok=True)
+    return manifest
+
+
+def convert_pickle_store(pickle_path, store_dir, model_names, corpus_path):
+    """
+    Chuyển file pickle cũ (vectorDB_full_corpus_110225.pkl) sang định dạng store mới.
+    """
+    with open(pickle_path, "rb") as f:
+        embeddings = pickle.load(f)
+    return save_embedding_store(store_dir, model_names, embeddings, corpus_path)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Convert a pickled embedding list to a memory-mapped store")
+    parser.add_argument("pickle_path")
+    parser.add_argument("store_dir")
+    parser.add_argument("corpus_path")
+    parser.add_argument("--model", action="append", required=True, help="model path, once per model in order")
+    args = parser.parse_args()
+    print(json.dumps(convert_pickle_store(args.pickle_path, args.store_dir, args.model, args.corpus_path),
+                     ensure_ascii=False, indent=2))
@@ -73,33 +73,17 @@ metadata_extractor_chain = metadata_extraction_prompt | llm.with_structured_outp
 )
 
 
-# Load full document from json file
-import json
+# Làm giàu metadata song song, có giới hạn tốc độ, retry và checkpoint (xem metadata_enrichment.py).
+# Chạy lại script sẽ bỏ qua các document đã xong trong checkpoint; file json chỉ được ghi đè bằng atomic write.
+from metadata_enrichment import enrich_corpus, print_report
 
-with open("./full_corpus_110225_metadata_final.json", "r", encoding="utf-8") as f:
-    docs = json.load(f)
-
-print(len(docs))
-
-from tqdm import tqdm
-
-try:
-    for doc in tqdm(docs):
-        print(len(doc["metadata"]))
-        if len(doc["metadata"]) > 10:
-            print("Skip")
-            continue
-        result = metadata_extractor_chain.invoke({"document": doc["content"]})
-        if result.category:
-            doc["metadata"]["category"] = result.category
-        if result.keywords:
-            doc["metadata"]["keywords"] = result.keywords
-        if result.applicable_entities:
-            doc["metadata"]["applicable_entities"] = result.applicable_entities
-        if result.reference_articles:
-            doc["metadata"]["reference_articles"] = result.reference_articles
-except:
-    pass
-
-with open("./full_corpus_110225_metadata_final.json", "w", encoding="utf-8") as f:
-    json.dump(docs, f, ensure_ascii=False, indent=2)
\ No newline at end of file
+if __name__ == "__main__":
+    report = enrich_corpus(
+        metadata_extractor_chain,
+        "./full_corpus_110225_metadata_final.json",
+        checkpoint_path="./full_corpus_110225_metadata_final.checkpoint.jsonl",
+        max_workers=4,
+        requests_per_minute=30,
+        tokens_per_minute=6000,
+    )
+    print_report(report)
@@ -0,0 +1,214 @@
+import hashlib
+import json
+import math
+
+from langchain_core.documents import Document
+from langchain_core.runnables import RunnableParallel
+
+from document_store import RETRIEVAL_SCORE_KEY
+
+
+def document_hash(doc):
+    """
+    Tính hash nội dung của một Document (page_content + metadata).
+    Dùng thay cho str(doc) để loại bỏ các documents trùng lặp. Điểm retrieval không thuộc nội dung
+    nên không được tính vào hash (cùng một điều luật từ hai query khác nhau vẫn là trùng lặp).
+    """
+    metadata = {key: value for key, value in doc.metadata.items() if key != RETRIEVAL_SCORE_KEY}
+    metadata = json.dumps(metadata, ensure_ascii=False, sort_keys=True, default=str)
+    h = hashlib.sha1()
+    h.update(doc.page_content.encode("utf-8"))
+    h.update(b"\x00")
+    h.update(metadata.encode("utf-8"))
+    return h.hexdigest()
+
+
+def dedupe_documents(documents):
+    """
+    Loại bỏ các documents giống nhau theo content hash, giữ nguyên thứ tự xuất hiện đầu tiên.
+    """
+    unique_docs = []
+    seen = set()
+    for doc in documents:
+        key = document_hash(doc)
+        if key not in seen:
+            seen.add(key)
+            unique_docs.append(doc)
+    return unique_docs
+
+
+def retrieval_score(doc):
+    return doc.metadata.get(RETRIEVAL_SCORE_KEY)
+
+
+def without_score(doc):
+    """Bản sao của doc không có điểm retrieval, để prompt của grader (và cache LLM) không phụ thuộc vào điểm."""
+    if RETRIEVAL_SCORE_KEY not in doc.metadata:
+        return doc
+    metadata = {key: value for key, value in doc.metadata.items() if key != RETRIEVAL_SCORE_KEY}
+    return Document(page_content=doc.page_content, metadata=metadata)
+
+
+class ScoreGate:
+    """
+    Quyết định trước khi gọi LLM grader dựa vào điểm similarity của retrieval:
+    - score >= `accept_above`: chắc chắn liên quan, nhận luôn,
+    - score < `reject_below`: chắc chắn không liên quan, bỏ luôn,
+    - còn lại (vùng không chắc chắn, hoặc document không có điểm): gửi cho grader_chain.
+    Ngưỡng bằng None thì tắt phía đó; ScoreGate() mặc định gửi tất cả cho grader như trước.
+    """
+
+    def __init__(self, accept_above=None, reject_below=None):
+        if accept_above is not None and reject_below is not None and reject_below > accept_above:
+            raise ValueError("reject_below must not be greater than accept_above")
+        self.accept_above = accept_above
+        self.reject_below = reject_below
+        self.counters = {"documents": 0, "auto_accepted": 0, "auto_rejected": 0, "graded": 0}
+
+    def decide(self, doc):
+        """:return: "relevant", "irrelevant" hoặc None (cần grader)."""
+        score = retrieval_score(doc)
+        if score is None:
+            return None
+        if self.accept_above is not None and score >= self.accept_above:
+            return "relevant"
+        if self.reject_below is not None and score < self.reject_below:
+            return "irrelevant"
+        return None
+
+    def record(self, decisions):
+        self.counters["documents"] += len(decisions)
+        self.counters["auto_accepted"] += sum(1 for d in decisions if d == "relevant")
+        self.counters["auto_rejected"] += sum(1 for d in decisions if d == "irrelevant")
+        self.counters["graded"] += sum(1 for d in decisions if d is None)
+
+    def report(self):
+        counters = dict(self.counters)
+        counters["saved_calls"] = counters["auto_accepted"] + counters["auto_rejected"]
+        counters["saved_ratio"] = round(counters["saved_calls"] / counters["documents"], 4) if counters["documents"] else 0.0
+        return counters
+
+    @classmethod
+    def calibrate(cls, scores, labels, precision=0.95, miss_rate=0.05, min_support=20):
+        """
+        Chọn ngưỡng từ một tập đã gán nhãn (điểm retrieval, có liên quan hay không):
+        - accept_above: ngưỡng thấp nhất mà trong các document có score >= ngưỡng, tỉ lệ liên quan >= `precision`,
+        - reject_below: ngưỡng cao nhất mà trong các document có score < ngưỡng, tỉ lệ liên quan <= `miss_rate`.
+        Mỗi phía cần ít nhất `min_support` mẫu, không đủ thì tắt phía đó.
+        """
+        pairs = sorted(zip((float(s) for s in scores), (bool(l) for l in labels)), reverse=True)
+        n = len(pairs)
+
+        # quét từ điểm cao xuống: pairs[:i] là các document có score >= pairs[i - 1][0]
+        accept_above = None
+        relevant = 0
+        for i, (score, label) in enumerate(pairs, start=1):
+            relevant += label
+            if i < n and pairs[i][0] == score:
+                continue
+            if i >= min_support and relevant / i >= precision:
+                accept_above = score
+
+        # quét từ điểm thấp lên: ascending[:i] là các document có score < ngưỡng
+        ascending = pairs[::-1]
+        reject_below = None
+        relevant = 0
+        for i, (score, label) in enumerate(ascending, start=1):
+            relevant += label
+            if i < n and ascending[i][0] == score:
+                continue
+            if i >= min_support and relevant / i <= miss_rate:
+                reject_below = ascending[i][0] if i < n else math.nextafter(score, math.inf)
+
+        if accept_above is not None and reject_below is not None and reject_below > accept_above:
+            reject_below = accept_above
+        return cls(accept_above=accept_above, reject_below=reject_below)
+
+    @classmethod
+    def from_labelled_file(cls, path, **kwargs):
+        """Calibrate từ file JSONL, mỗi dòng {"score": float, "relevant": bool} (ví dụ nhãn của grader / người)."""
+        scores, labels = [], []
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    scores.append(record["score"])
+                    labels.append(record["relevant"])
+        return cls.calibrate(scores, labels, **kwargs)
+
+    def __repr__(self):
+        return f"ScoreGate(accept_above={self.accept_above}, reject_below={self.reject_below})"
+
+
+def grade_documents(grader_chain, query, documents, max_concurrency=5,
+                    query_key="query", doc_key="context"):
+    """
+    Chấm điểm mức độ liên quan của các documents với query bằng grader_chain.
+    Các lời gọi LLM được chạy song song (tối đa `max_concurrency` lời gọi cùng lúc)
+    thông qua `Runnable.batch`, kết quả trả về giữ đúng thứ tự của `documents`.
+
+    :param grader_chain: chain trả về đối tượng có thuộc tính `grade`.
+    :param query: câu query / điều khoản hợp đồng.
+    :param documents: danh sách Document cần chấm điểm.
+    :param max_concurrency: số lời gọi LLM tối đa chạy đồng thời.
+    :param query_key: tên biến query trong prompt của grader.
+    :param doc_key: tên biến document trong prompt của grader.
+    :return: danh sách grade theo đúng thứ tự của documents.
+    """
+    if not documents:
+        return []
+    inputs = [{query_key: query, doc_key: without_score(doc)} for doc in documents]
+    return grader_chain.batch(inputs, config={"max_concurrency": max_concurrency})
+
+
+def filter_relevant_documents(grader_chain, query, documents, max_concurrency=5,
+                              query_key="query", doc_key="context", score_gate=None):
+    """
+    Loại bỏ documents trùng lặp, chấm điểm song song và chỉ giữ lại các documents "relevant".
+    Nếu có `score_gate` thì chỉ các documents trong vùng điểm không chắc chắn mới được gửi cho grader.
+    """
+    unique_docs = dedupe_documents(documents)
+    decisions = [score_gate.decide(doc) if score_gate is not None else None for doc in unique_docs]
+    if score_gate is not None:
+        score_gate.record(decisions)
+    to_grade = [doc for doc, decision in zip(unique_docs, decisions) if decision is None]
+    grades = iter(grade_documents(
+        grader_chain, query, to_grade,
+        max_concurrency=max_concurrency, query_key=query_key, doc_key=doc_key,
+    ))
+    filtered_docs = []
+    for i, (doc, decision) in enumerate(zip(unique_docs, decisions), start=1):
+        auto = decision is not None
+        grade = decision if auto else next(grades).grade
+        suffix = f" (score {retrieval_score(doc):.3f})" if auto else ""
+        if grade == "relevant":
+            print(f"---DOCUMENT {i}: RELEVANT{suffix}---")
+            filtered_docs.append(doc)
+        else:
+            print(f"---DOCUMENT {i}: NOT RELEVANT{suffix}---")
+    return filtered_docs
+
+
+def grade_generation(hallucination_grader_chain, answer_grader_chain, query, generation, documents):
+    """
+    Kiểm tra câu trả lời: hallucination và answer relevance được chấm song song (RunnableParallel)
+    thay vì tuần tự, nên thời gian chờ chỉ bằng lời gọi grader chậm hơn. Kết quả relevance chỉ
+    được dùng khi hallucination check pass, giống logic tuần tự cũ (lời gọi relevance bị bỏ phí
+    khi câu trả lời hallucinate).
+
+    :return: "useful", "not useful" (không trả lời đúng câu hỏi) hoặc "generate" (hallucination).
+    """
+    grades = RunnableParallel(
+        hallucination=hallucination_grader_chain,
+        relevance=answer_grader_chain,
+    ).invoke({"response": generation, "context": documents, "query": query})
+
+    if grades["hallucination"].grade != "no":
+        print("---Hallucination check failed---")
+        return "generate"
+    print("---Hallucination check passed---")
+    if grades["relevance"].grade == "yes":
+        print("---Answer is relevant to question---\n")
+        return "useful"
+    print("---Answer is not relevant to question---")
+    return "not useful"
@@ -0,0 +1,95 @@
+import hashlib
+import json
+
+CONTENT_HASH_KEY = "content_hash"
+
+
+def _sha1(text):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def metadata_key(doc):
+    """Khóa định danh mặc định của một Document: hash của metadata (bỏ qua content_hash)."""
+    metadata = {k: v for k, v in doc.metadata.items() if k != CONTENT_HASH_KEY}
+    return _sha1(json.dumps(metadata, ensure_ascii=False, sort_keys=True, default=str))
+
+
+def content_hash(doc):
+    """Hash của nội dung + metadata, dùng để phát hiện document đã thay đổi."""
+    metadata = {k: v for k, v in doc.metadata.items() if k != CONTENT_HASH_KEY}
+    return _sha1(doc.page_content + "\x00" + json.dumps(metadata, ensure_ascii=False, sort_keys=True, default=str))
+
+
+def stable_id(key, occurrences):
+    """
+    id của document có khóa `key`: lần xuất hiện đầu tiên dùng nguyên khóa, chỉ các bản trùng khóa
+    sau đó mới có thêm hậu tố `-1`, `-2`, ... (`occurrences` đếm số lần đã gặp mỗi khóa).
+    """
+    n = occurrences.get(key, 0)
+    occurrences[key] = n + 1
+    return key if n == 0 else f"{key}-{n}"
+
+
+def assign_stable_ids(documents, key_fn=content_hash):
+    """
+    Gán id ổn định cho từng document từ `key_fn` (mặc định là hash nội dung + metadata), nên id không
+    phụ thuộc vị trí của document: chèn hay xóa một chunk không làm đổi id của các chunk còn lại.
+    Chỉ các document trùng hệt nhau mới được đánh thêm số thứ tự để phân biệt.
+
+    :return: danh sách (id, content_hash, document)
+    """
+    occurrences = {}
+    return [(stable_id(key_fn(doc), occurrences), content_hash(doc), doc) for doc in documents]
+
+
+def with_content_hash(doc, doc_hash):
+    # tạo Document mới để không sửa metadata của document đầu vào
+    return type(doc)(page_content=doc.page_content, metadata={**doc.metadata, CONTENT_HASH_KEY: doc_hash})
+
+
+def sync_documents(vectordb, documents, key_fn=content_hash, delete_missing=True, batch_size=1000):
+    """
+    Cập nhật tăng dần một Chroma collection cho khớp với `documents`:
+    - chỉ embed và upsert các document mới hoặc đã thay đổi nội dung,
+    - bỏ qua các document không đổi, dù vị trí của chúng trong `documents` đã thay đổi,
+    - xóa các document không còn trong `documents` (nếu `delete_missing=True`).
+
+    Với `key_fn` mặc định, id chính là hash nội dung nên document bị sửa được tính là một document mới
+    (added) và id cũ bị xóa (removed); "updated" chỉ xuất hiện khi `key_fn` là khóa khác, ví dụ metadata_key.
+
+    :return: dict đếm số document added / updated / removed / skipped.
+    """
+    existing = vectordb.get(include=["metadatas"])
+    existing_hashes = {
+        doc_id: (metadata or {}).get(CONTENT_HASH_KEY)
+        for doc_id, metadata in zip(existing["ids"], existing["metadatas"])
+    }
+
+    stats = {"added": 0, "updated": 0, "removed": 0, "skipped": 0}
+    upsert_ids, upsert_docs = [], []
+    seen_ids = set()
+    for doc_id, doc_hash, doc in assign_stable_ids(documents, key_fn=key_fn):
+        seen_ids.add(doc_id)
+        if doc_id not in existing_hashes:
+            stats["added"] += 1
+        elif existing_hashes[doc_id] != doc_hash:
+            stats["updated"] += 1
+        else:
+            stats["skipped"] += 1
+            continue
+        upsert_ids.append(doc_id)
+        upsert_docs.append(with_content_hash(doc, doc_hash))
+
+    # Chroma.add_documents dùng upsert nên cùng một lời gọi xử lý cả document mới và document thay đổi
+    for start in range(0, len(upsert_docs), batch_size):
+        vectordb.add_documents(
+            documents=upsert_docs[start:start + batch_size],
+            ids=upsert_ids[start:start + batch_size],
+        )
+
+    if delete_missing:
+        removed_ids = [doc_id for doc_id in existing_hashes if doc_id not in seen_ids]
+        for start in range(0, len(removed_ids), batch_size):
+            vectordb.delete(ids=removed_ids[start:start + batch_size])
+        stats["removed"] = len(removed_ids)
+    return stats
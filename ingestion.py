@@ -0,0 +1,273 @@
+import json
+import queue
+import threading
+import time
+
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_core.documents import Document
+
+from indexing import content_hash, stable_id, with_content_hash
+from text_normalization import normalize_text
+
+_END = object()
+
+
+def iter_json_records(path, read_size=1 << 20):
+    """
+    Đọc tăng dần các phần tử của một file JSON dạng mảng `[{...}, {...}]` mà không load cả file:
+    chỉ giữ trong bộ nhớ phần buffer chưa parse (cỡ `read_size` + một record).
+    """
+    decoder = json.JSONDecoder()
+    with open(path, "r", encoding="utf-8") as f:
+        buffer = ""
+        pos = 0
+        started = False
+        eof = False
+        while True:
+            # bỏ qua khoảng trắng, dấu '[' mở đầu và dấu ',' giữa các record
+            while True:
+                while pos < len(buffer) and (buffer[pos].isspace() or buffer[pos] == ","):
+                    pos += 1
+                if pos < len(buffer) or eof:
+                    break
+                chunk = f.read(read_size)
+                eof = not chunk
+                buffer, pos = buffer[pos:] + chunk, 0
+            if pos >= len(buffer):
+                return
+            if not started:
+                if buffer[pos] != "[":
+                    raise ValueError(f"{path}: expected a JSON array")
+                started = True
+                pos += 1
+                continue
+            if buffer[pos] == "]":
+                return
+            try:
+                record, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                # record bị cắt ở cuối buffer: đọc thêm rồi parse lại
+                chunk = f.read(read_size)
+                eof = not chunk
+                buffer, pos = buffer[pos:] + chunk, 0
+                continue
+            yield record
+            pos = end
+
+
+def iter_jsonl_records(path):
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def iter_records(path):
+    """Đọc corpus .jsonl (mỗi dòng một record) hoặc .json (mảng record) theo kiểu streaming."""
+    if str(path).endswith(".jsonl"):
+        return iter_jsonl_records(path)
+    return iter_json_records(path)
+
+
+def iter_documents(records, normalize=True):
+    for record in records:
+        content = record["content"]
+        yield Document(
+            page_content=normalize_text(content) if normalize else content,
+            metadata=record.get("metadata") or {},
+        )
+
+
+def iter_chunks(documents, text_splitter):
+    # split từng document một, không giữ toàn bộ danh sách chunks trong bộ nhớ
+    for doc in documents:
+        yield from text_splitter.split_documents([doc])
+
+
+def iter_batches(items, batch_size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class ChromaSink:
+    """
+    Ghi các batch (ids, chunks) vào một Chroma collection qua `add_documents(ids=...)` (upsert theo id ổn định).
+    Chroma tự embed bằng embedding function của nó, nên pipeline dùng với sink này không cần embed trước
+    (`IngestionPipeline(embedding_model=None, ...)`). Metadata kèm content_hash giống indexing.sync_documents.
+    """
+
+    def __init__(self, vectordb):
+        self.vectordb = vectordb
+
+    def __call__(self, ids, chunks, embeddings, hashes):
+        self.vectordb.add_documents(
+            documents=[with_content_hash(chunk, h) for chunk, h in zip(chunks, hashes)],
+            ids=ids,
+        )
+
+
+class IngestionPipeline:
+    """
+    Pipeline ingest corpus theo từng giai đoạn chạy song song, nối với nhau bằng các queue có giới hạn:
+
+        đọc JSON/JSONL -> normalize_text -> chunking -> batch embedding -> ghi index
+
+    - Mỗi queue chứa tối đa `queue_size` batch: giai đoạn nhanh sẽ bị chặn (backpressure) khi giai đoạn
+      sau chậm, nên bộ nhớ chỉ phụ thuộc vào `batch_size * queue_size`, không phụ thuộc kích thước corpus.
+    - Batch được ghi ngay khi embed xong, không đợi đọc hết corpus.
+    - `embedding_model=None`: không có giai đoạn embed, sink tự embed (ví dụ ChromaSink), `embeddings` là None.
+    - id của chunk là hash nội dung + metadata, ổn định giữa các lần chạy (cùng cách với indexing.assign_stable_ids).
+    """
+
+    def __init__(self, embedding_model, sink, batch_size=64, chunk_size=500, chunk_overlap=30,
+                 queue_size=4, normalize=True, progress_every=50):
+        self.embedding_model = embedding_model
+        self.sink = sink
+        self.batch_size = batch_size
+        self.text_splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+        self.queue_size = queue_size
+        self.normalize = normalize
+        self.progress_every = progress_every
+        self.metrics = {}
+
+    def _producer(self, path, out_queue, stop):
+        occurrences = {}
+        for batch in iter_batches(iter_chunks(iter_documents(iter_records(path), self.normalize), self.text_splitter),
+                                  self.batch_size):
+            hashes = [content_hash(chunk) for chunk in batch]
+            ids = [stable_id(h, occurrences) for h in hashes]
+            self._put(out_queue, (ids, batch, hashes), stop)
+            if stop.is_set():
+                return
+
+    def _embedder(self, in_queue, out_queue, stop):
+        while not stop.is_set():
+            try:
+                item = in_queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            if item is _END:
+                return
+            ids, chunks, hashes = item
+            embeddings = None
+            if self.embedding_model is not None:
+                embeddings = self.embedding_model.embed_documents([chunk.page_content for chunk in chunks])
+            self._put(out_queue, (ids, chunks, embeddings, hashes), stop)
+
+    @staticmethod
+    def _put(target_queue, item, stop):
+        # put có timeout để thread không bị treo mãi khi giai đoạn sau đã dừng vì lỗi
+        while not stop.is_set():
+            try:
+                target_queue.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    def _run_stage(self, target, args, errors, next_queue, stop):
+        def stage():
+            try:
+                target(*args)
+            except BaseException as e:
+                errors.append(e)
+                stop.set()
+            finally:
+                self._put(next_queue, _END, stop)
+        thread = threading.Thread(target=stage, daemon=True)
+        thread.start()
+        return thread
+
+    def run(self, path):
+        """
+        Ingest corpus ở `path`.
+
+        :return: metrics dict (số chunk, số batch, thời gian, chunks/s, độ sâu queue lớn nhất).
+        """
+        chunk_queue = queue.Queue(maxsize=self.queue_size)
+        embedded_queue = queue.Queue(maxsize=self.queue_size)
+        stop = threading.Event()
+        errors = []
+        threads = [
+            self._run_stage(self._producer, (path, chunk_queue, stop), errors, chunk_queue, stop),
+            self._run_stage(self._embedder, (chunk_queue, embedded_queue, stop), errors, embedded_queue, stop),
+        ]
+
+        start = time.perf_counter()
+        num_chunks = num_batches = max_depth = 0
+        try:
+            while True:
+                max_depth = max(max_depth, chunk_queue.qsize(), embedded_queue.qsize())
+                try:
+                    item = embedded_queue.get(timeout=0.5)
+                except queue.Empty:
+                    # một giai đoạn trước đã dừng vì lỗi
+                    if stop.is_set():
+                        break
+                    continue
+                if item is _END:
+                    break
+                self.sink(*item)
+                num_batches += 1
+                num_chunks += len(item[0])
+                if self.progress_every and num_batches % self.progress_every == 0:
+                    elapsed = time.perf_counter() - start
+                    print(f"[ingest] {num_chunks} chunks / {num_batches} batches, "
+                          f"{num_chunks / elapsed:.1f} chunks/s, queue depth {chunk_queue.qsize()}/{embedded_queue.qsize()}")
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join(timeout=5)
+        if errors:
+            raise errors[0]
+
+        elapsed = time.perf_counter() - start
+        self.metrics = {
+            "chunks": num_chunks,
+            "batches": num_batches,
+            "elapsed_seconds": round(elapsed, 3),
+            "chunks_per_second": round(num_chunks / elapsed, 1) if elapsed > 0 else 0.0,
+            "max_queue_depth": max_depth,
+        }
+        return self.metrics
+
+
+def ingest_to_chroma(corpus_path, collection_name, embedding_model, persist_directory, **pipeline_kwargs):
+    """Ingest corpus vào Chroma collection theo kiểu streaming (upsert theo id ổn định)."""
+    from langchain_community.vectorstores import Chroma
+
+    vectordb = Chroma(
+        collection_name=collection_name,
+        embedding_function=embedding_model,
+        persist_directory=persist_directory,
+    )
+    # Chroma embed bằng embedding_function của collection: pipeline không embed thêm một lần nữa
+    metrics = IngestionPipeline(None, ChromaSink(vectordb), **pipeline_kwargs).run(corpus_path)
+    print(f"Ingestion metrics: {metrics}")
+    return vectordb, metrics
+
+
+if __name__ == "__main__":
+    from langchain_community.embeddings import HuggingFaceEmbeddings
+
+    from embedding_cache import CachedEmbeddings
+
+    embed_model = CachedEmbeddings(
+        HuggingFaceEmbeddings(model_name="intfloat/multilingual-e5-large"),
+        model_name="intfloat/multilingual-e5-large",
+        cache_path="./cache/embeddings.db",
+    )
+    ingest_to_chroma(
+        "./full_corpus_110225_with_metadata.json",
+        collection_name="full_corpus",
+        embedding_model=embed_model,
+        persist_directory="./chroma_db",
+        batch_size=64,
+    )
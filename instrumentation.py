@@ -0,0 +1,323 @@
+"""
+Đo thời gian từng node, số lời gọi LLM và số token cho mỗi request của workflow LangGraph.
+
+    instrumentation = WorkflowInstrumentation(trace_path="./logs/workflow_trace.jsonl")
+    app = instrumentation.instrument(workflow.compile())
+    instrumentation.start_metrics_server(9100)     # GET /metrics (Prometheus text format)
+
+Mỗi request (một lần invoke / ainvoke / stream của graph) được ghi thành một dòng JSON trong trace:
+thời gian và số lời gọi LLM / token của từng lần chạy node theo thứ tự, số lần mỗi node được chạy
+và các bộ đếm vòng lặp trong state (num_hallucination, num_searchengine, ...).
+
+Chỉ dùng callback của LangChain (không sửa node), mỗi callback chỉ cập nhật vài dict dưới một lock
+nên chi phí không đáng kể so với một lời gọi LLM.
+"""
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+# các bộ đếm vòng lặp trong state của Phuc_pipeline_v3
+LOOP_COUNTERS = ("num_transformer", "num_searchengine", "num_rewrite", "num_hallucination")
+
+# bucket (giây) của histogram thời gian node / request
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+def _token_usage(response):
+    """(prompt_tokens, completion_tokens) của một LLMResult, 0 nếu provider không trả về."""
+    usage = (response.llm_output or {}).get("token_usage") or (response.llm_output or {}).get("usage")
+    if usage:
+        return usage.get("prompt_tokens", 0) or 0, usage.get("completion_tokens", 0) or 0
+    prompt_tokens = completion_tokens = 0
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if usage:
+                prompt_tokens += usage.get("input_tokens", 0)
+                completion_tokens += usage.get("output_tokens", 0)
+    return prompt_tokens, completion_tokens
+
+
+class _Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+    def render(self, name, labels=""):
+        prefix = labels + "," if labels else ""
+        lines = [f'{name}_bucket{{{prefix}le="{bound}"}} {count}' for bound, count in zip(self.buckets, self.counts)]
+        lines.append(f'{name}_bucket{{{prefix}le="+Inf"}} {self.count}')
+        suffix = f"{{{labels}}}" if labels else ""
+        lines.append(f"{name}_sum{suffix} {self.sum:.6f}")
+        lines.append(f"{name}_count{suffix} {self.count}")
+        return lines
+
+
+class WorkflowInstrumentation(BaseCallbackHandler):
+    """
+    Callback handler gắn vào compiled graph (`instrument`): nhận biết lần chạy của từng node qua
+    metadata `langgraph_node`, gán mỗi lời gọi LLM cho lần chạy node chứa nó (kể cả các lời gọi trong
+    conditional edge, chạy trong thread con hoặc qua batch).
+    """
+
+    # chạy trực tiếp trong thread / event loop hiện tại thay vì qua executor: callback rất nhẹ
+    run_inline = True
+
+    def __init__(self, trace_path=None, loop_counters=LOOP_COUNTERS, keep_last=100):
+        self.trace_path = trace_path
+        self.loop_counters = loop_counters
+        self.keep_last = keep_last
+        self.last_traces = []
+        self._lock = threading.Lock()
+        # run_id -> (request_id, node_entry hoặc None, perf_counter lúc bắt đầu, có phải run của node không)
+        self._runs = {}
+        self._requests = {}
+        self._trace_file = None
+        if trace_path:
+            os.makedirs(os.path.dirname(os.path.abspath(trace_path)), exist_ok=True)
+            self._trace_file = open(trace_path, "a", encoding="utf-8", buffering=1)
+
+        # số liệu tích lũy cho /metrics
+        self._requests_total = {}
+        self._request_seconds = _Histogram()
+        self._node_seconds = {}
+        self._node_runs = {}
+        self._llm_calls = {}
+        self._tokens = {}
+        self._loops = {}
+
+    def instrument(self, app):
+        """Gắn handler vào compiled graph, áp dụng cho mọi invoke / ainvoke / stream / astream_events."""
+        return app.with_config(callbacks=[self])
+
+    # ------------------------------------------------------------------ chain / node
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, metadata=None, **kwargs):
+        now = time.perf_counter()
+        with self._lock:
+            if parent_run_id is None:
+                self._requests[run_id] = {
+                    "request_id": str((metadata or {}).get("request_id") or run_id),
+                    "timestamp": time.time(),
+                    "start": now,
+                    "nodes": [],
+                }
+                self._runs[run_id] = (run_id, None, now, False)
+                return
+            parent = self._runs.get(parent_run_id)
+            if parent is None:
+                return
+            request_id, node_entry = parent[0], parent[1]
+            node = (metadata or {}).get("langgraph_node")
+            is_node = parent_run_id == request_id and node is not None and kwargs.get("name") == node
+            if is_node:
+                request = self._requests[request_id]
+                node_entry = {"node": node, "start": round(now - request["start"], 4), "seconds": None,
+                              "llm_calls": 0, "prompt_tokens": 0, "completion_tokens": 0}
+                request["nodes"].append(node_entry)
+            self._runs[run_id] = (request_id, node_entry, now, is_node)
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._end_run(run_id, outputs, None)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._end_run(run_id, None, error)
+
+    def _end_run(self, run_id, outputs, error):
+        now = time.perf_counter()
+        with self._lock:
+            run = self._runs.pop(run_id, None)
+            if run is None:
+                return
+            request_id, node_entry, start, is_node = run
+            if run_id != request_id:
+                if is_node:
+                    node_entry["seconds"] = round(now - start, 4)
+                    if error is not None:
+                        node_entry["error"] = repr(error)
+                return
+            trace = self._finish_request(self._requests.pop(request_id), outputs, error, now)
+        self._write(trace)
+
+    # ------------------------------------------------------------------ llm
+    def on_llm_start(self, serialized, prompts, *, run_id, parent_run_id=None, **kwargs):
+        self._start_llm(run_id, parent_run_id)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, **kwargs):
+        self._start_llm(run_id, parent_run_id)
+
+    def _start_llm(self, run_id, parent_run_id):
+        with self._lock:
+            parent = self._runs.get(parent_run_id)
+            if parent is None:
+                return
+            request_id, node_entry = parent[0], parent[1]
+            self._runs[run_id] = (request_id, node_entry, time.perf_counter(), False)
+            if node_entry is not None:
+                node_entry["llm_calls"] += 1
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        prompt_tokens, completion_tokens = _token_usage(response)
+        with self._lock:
+            run = self._runs.pop(run_id, None)
+            if run is None or run[1] is None:
+                return
+            run[1]["prompt_tokens"] += prompt_tokens
+            run[1]["completion_tokens"] += completion_tokens
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        with self._lock:
+            self._runs.pop(run_id, None)
+
+    # ------------------------------------------------------------------ retriever / tool: chỉ để nối run con
+    def on_retriever_start(self, serialized, query, *, run_id, parent_run_id=None, **kwargs):
+        self._start_child(run_id, parent_run_id)
+
+    def on_tool_start(self, serialized, input_str, *, run_id, parent_run_id=None, **kwargs):
+        self._start_child(run_id, parent_run_id)
+
+    def _start_child(self, run_id, parent_run_id):
+        with self._lock:
+            parent = self._runs.get(parent_run_id)
+            if parent is not None:
+                self._runs[run_id] = (parent[0], parent[1], time.perf_counter(), False)
+
+    def on_retriever_end(self, documents, *, run_id, **kwargs):
+        with self._lock:
+            self._runs.pop(run_id, None)
+
+    on_retriever_error = on_retriever_end
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        with self._lock:
+            self._runs.pop(run_id, None)
+
+    on_tool_error = on_tool_end
+
+    # ------------------------------------------------------------------ request
+    def _finish_request(self, request, outputs, error, now):
+        seconds = now - request["start"]
+        nodes = request["nodes"]
+        visits = {}
+        for entry in nodes:
+            visits[entry["node"]] = visits.get(entry["node"], 0) + 1
+        loops = {}
+        if isinstance(outputs, dict):
+            loops = {key: outputs[key] for key in self.loop_counters if isinstance(outputs.get(key), int)}
+        status = "error" if error is not None else "ok"
+        trace = {
+            "request_id": request["request_id"],
+            "timestamp": round(request["timestamp"], 3),
+            "status": status,
+            "seconds": round(seconds, 4),
+            "llm_calls": sum(entry["llm_calls"] for entry in nodes),
+            "prompt_tokens": sum(entry["prompt_tokens"] for entry in nodes),
+            "completion_tokens": sum(entry["completion_tokens"] for entry in nodes),
+            "node_visits": visits,
+            "loops": loops,
+            "nodes": nodes,
+        }
+        if error is not None:
+            trace["error"] = repr(error)
+
+        self._requests_total[status] = self._requests_total.get(status, 0) + 1
+        self._request_seconds.observe(seconds)
+        for entry in nodes:
+            node = entry["node"]
+            if entry["seconds"] is not None:
+                self._node_seconds.setdefault(node, _Histogram()).observe(entry["seconds"])
+            self._node_runs[node] = self._node_runs.get(node, 0) + 1
+            self._llm_calls[node] = self._llm_calls.get(node, 0) + entry["llm_calls"]
+            tokens = self._tokens.setdefault(node, [0, 0])
+            tokens[0] += entry["prompt_tokens"]
+            tokens[1] += entry["completion_tokens"]
+        for key, value in loops.items():
+            self._loops[key] = self._loops.get(key, 0) + value
+        self.last_traces.append(trace)
+        del self.last_traces[:-self.keep_last]
+        return trace
+
+    def _write(self, trace):
+        if self._trace_file is not None:
+            line = json.dumps(trace, ensure_ascii=False) + "\n"
+            with self._lock:
+                self._trace_file.write(line)
+
+    # ------------------------------------------------------------------ prometheus
+    def render_metrics(self):
+        """Số liệu tích lũy theo định dạng text của Prometheus."""
+        with self._lock:
+            lines = ["# TYPE workflow_requests_total counter"]
+            lines += [f'workflow_requests_total{{status="{status}"}} {count}'
+                      for status, count in sorted(self._requests_total.items())]
+            lines.append("# TYPE workflow_request_seconds histogram")
+            lines += self._request_seconds.render("workflow_request_seconds")
+            lines.append("# TYPE workflow_node_seconds histogram")
+            for node, histogram in sorted(self._node_seconds.items()):
+                lines += histogram.render("workflow_node_seconds", f'node="{node}"')
+            lines.append("# TYPE workflow_node_runs_total counter")
+            lines += [f'workflow_node_runs_total{{node="{node}"}} {count}' for node, count in sorted(self._node_runs.items())]
+            lines.append("# TYPE workflow_llm_calls_total counter")
+            lines += [f'workflow_llm_calls_total{{node="{node}"}} {count}' for node, count in sorted(self._llm_calls.items())]
+            lines.append("# TYPE workflow_llm_tokens_total counter")
+            for node, (prompt_tokens, completion_tokens) in sorted(self._tokens.items()):
+                lines.append(f'workflow_llm_tokens_total{{node="{node}",type="prompt"}} {prompt_tokens}')
+                lines.append(f'workflow_llm_tokens_total{{node="{node}",type="completion"}} {completion_tokens}')
+            lines.append("# TYPE workflow_loop_iterations_total counter")
+            lines += [f'workflow_loop_iterations_total{{counter="{key}"}} {value}' for key, value in sorted(self._loops.items())]
+            lines.append("# TYPE workflow_requests_in_flight gauge")
+            lines.append(f"workflow_requests_in_flight {len(self._requests)}")
+        return "\n".join(lines) + "\n"
+
+    def start_metrics_server(self, port=9100, host="0.0.0.0"):
+        """Chạy endpoint GET /metrics trong một daemon thread (dùng cho notebook / CLI)."""
+        instrumentation = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != "/metrics":
+                    self.send_error(404)
+                    return
+                body = instrumentation.render_metrics().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+    def close(self):
+        if self._trace_file is not None:
+            self._trace_file.close()
+            self._trace_file = None
+
+
+if __name__ == "__main__":
+    import asyncio
+
+    from server import build_stub_app
+
+    instrumentation = WorkflowInstrumentation(trace_path="./logs/workflow_trace.jsonl")
+    app = instrumentation.instrument(build_stub_app(retract_first=True))
+    asyncio.run(app.ainvoke({"query": "労働基準法", "chat_history": []}))
+    asyncio.run(app.ainvoke({"query": "解雇の予告", "chat_history": []}, config={"metadata": {"request_id": "clause-2"}}))
+    print(json.dumps(instrumentation.last_traces[-1], ensure_ascii=False, indent=1))
+    print(instrumentation.render_metrics())
@@ -0,0 +1,262 @@
+import json
+import re
+
+from langchain_core.runnables.utils import AddableDict
+
+# ký tự cấu trúc cần xét khi ở ngoài chuỗi / bên trong chuỗi JSON
+_STRUCTURAL_RE = re.compile(r'["{}\[\],]')
+_STRING_RE = re.compile(r'["\\]')
+
+
+class StreamingJSONExtractor:
+    """
+    Parser tăng dần cho object JSON nằm trong output của LLM (có thể lẫn văn bản xung quanh).
+
+    - `feed(chunk)` nhận từng phần của generation và trả về các field cấp cao nhất vừa hoàn chỉnh,
+      dạng list (key, value), ngay khi gặp dấu ',' hoặc '}' kết thúc field đó.
+    - Chấp nhận dấu phẩy thừa trước '}' / ']' (chỉ ở ngoài chuỗi). Dấu đóng phải khớp loại với dấu mở
+      tương ứng (giữ một stack các dấu mở), không khớp thì object bị coi là lỗi.
+    - Dừng ở object đầu tiên parse được (`done`, `result`); object lỗi (ví dụ "{...}" trong lời dẫn)
+      bị bỏ qua và tiếp tục tìm object kế tiếp.
+    - Mỗi ký tự chỉ được quét một lần: chi phí tuyến tính theo độ dài output.
+    """
+
+    def __init__(self, validator=None):
+        self.validator = validator
+        self.result = None
+        self.done = False
+        self.errors = []
+        self._buf = ""
+        self._pos = 0
+        self._reset_object()
+
+    def _reset_object(self):
+        self.fields = {}
+        # các dấu mở '{' / '[' chưa đóng (ngoài chuỗi)
+        self._stack = []
+        self._in_string = False
+        self._field_start = 0
+        self._pending_comma = None
+        self._dropped_commas = []
+        self._invalid = False
+
+    def _field_text(self, end):
+        parts, start = [], self._field_start
+        for idx in self._dropped_commas:
+            if start <= idx < end:
+                parts.append(self._buf[start:idx])
+                start = idx + 1
+        parts.append(self._buf[start:end])
+        return "".join(parts)
+
+    def _end_field(self, end, events):
+        text = self._field_text(end)
+        if not text.strip():
+            return
+        try:
+            parsed = json.loads("{" + text + "}")
+        except json.JSONDecodeError:
+            self._invalid = True
+            return
+        for key, value in parsed.items():
+            self.fields[key] = value
+            events.append((key, value))
+            if self.validator is not None:
+                self.errors.extend(self.validator.validate_field(key, value))
+
+    def _end_object(self, end):
+        if not self._invalid:
+            self.result = self.fields
+            self.done = True
+            return
+        # object không hợp lệ: bỏ qua, tìm object tiếp theo
+        self._buf = self._buf[end:]
+        self._pos = 0
+        self._reset_object()
+        self.errors = []
+
+    def feed(self, chunk):
+        if self.done:
+            return []
+        self._buf += chunk
+        events = []
+        while self._pos < len(self._buf):
+            buf = self._buf
+            if not self._stack:
+                start = buf.find("{", self._pos)
+                if start < 0:
+                    # bỏ phần văn bản trước object
+                    self._buf, self._pos = "", 0
+                    break
+                self._buf = buf[start:]
+                self._pos = self._field_start = 1
+                self._stack.append("{")
+                continue
+
+            if self._in_string:
+                match = _STRING_RE.search(buf, self._pos)
+                if match is None:
+                    self._pos = len(buf)
+                    break
+                if match.group() == "\\":
+                    if match.end() >= len(buf):
+                        # ký tự sau dấu escape chưa tới
+                        self._pos = match.start()
+                        break
+                    self._pos = match.end() + 1
+                    continue
+                self._in_string = False
+                self._pos = match.end()
+                continue
+
+            match = _STRUCTURAL_RE.search(buf, self._pos)
+            end = match.start() if match else len(buf)
+            if self._pending_comma is not None and buf[self._pos:end].strip():
+                self._pending_comma = None
+            if match is None:
+                self._pos = len(buf)
+                break
+            char, self._pos = match.group(), match.end()
+            if char == '"':
+                self._in_string = True
+                self._pending_comma = None
+            elif char in "{[":
+                self._stack.append(char)
+                self._pending_comma = None
+            elif char in "}]":
+                if self._pending_comma is not None:
+                    self._dropped_commas.append(self._pending_comma)
+                    self._pending_comma = None
+                if self._stack.pop() != ("{" if char == "}" else "["):
+                    self._invalid = True
+                if not self._stack:
+                    if not self._invalid:
+                        self._end_field(match.start(), events)
+                    self._end_object(match.end())
+                    if self.done:
+                        break
+            else:
+                if len(self._stack) == 1:
+                    self._end_field(match.start(), events)
+                    self._field_start = match.end()
+                self._pending_comma = match.start()
+        return events
+
+
+def extract_json(text):
+    """Object JSON đầu tiên trong `text` (chấp nhận dấu phẩy thừa), None nếu không có."""
+    extractor = StreamingJSONExtractor()
+    extractor.feed(text)
+    return extractor.result
+
+
+def _chunk_text(chunk):
+    # chunk từ LLM có thể là str hoặc AIMessageChunk
+    return chunk if isinstance(chunk, str) else getattr(chunk, "content", str(chunk))
+
+
+def stream_json_fields(chunks, validator=None):
+    """
+    Chuyển một luồng chunk của LLM thành luồng field JSON: mỗi field cấp cao nhất được yield
+    (dạng AddableDict {key: value}) ngay khi hoàn chỉnh, trước khi generation kết thúc.
+
+    Dùng được trong chain: `prompt | llm | RunnableGenerator(stream_json_fields)`;
+    `.invoke` trả về object đầy đủ, `.stream` trả về từng field.
+    """
+    extractor = StreamingJSONExtractor(validator=validator)
+    for chunk in chunks:
+        for key, value in extractor.feed(_chunk_text(chunk)):
+            yield AddableDict({key: value})
+        if extractor.done:
+            break
+
+
+def first_field(chunks, key):
+    """Giá trị của field `key` ngay khi nó xuất hiện trong luồng (ví dụ verdict), None nếu không có."""
+    for field in stream_json_fields(chunks):
+        if key in field:
+            return field[key]
+    return None
+
+
+def _compile(expected_structure):
+    if isinstance(expected_structure, dict):
+        items = [(key, _compile(value)) for key, value in expected_structure.items()]
+
+        def check(data, path, errors):
+            if not isinstance(data, dict):
+                errors.append(f"Expected a dict at '{path}', got {type(data).__name__}")
+                return
+            for key, check_value in items:
+                if key not in data:
+                    errors.append(f"Missing key '{key}' at '{path}'")
+                else:
+                    check_value(data[key], f"{path}.{key}" if path else key, errors)
+        return check
+
+    if isinstance(expected_structure, list):
+        check_item = _compile(expected_structure[0]) if expected_structure else None
+
+        def check(data, path, errors):
+            if not isinstance(data, list):
+                errors.append(f"Expected a list at '{path}', got {type(data).__name__}")
+                return
+            if check_item is not None:
+                for index, item in enumerate(data):
+                    check_item(item, f"{path}[{index}]", errors)
+        return check
+
+    if isinstance(expected_structure, type):
+        def check(data, path, errors):
+            if not isinstance(data, expected_structure):
+                errors.append(f"Expected {expected_structure.__name__} at '{path}', got {type(data).__name__}")
+        return check
+
+    return lambda data, path, errors: None
+
+
+class CompiledValidator:
+    """
+    Validator được biên dịch một lần từ expected structure (cùng cú pháp với validate_json_structure):
+    mỗi lần gọi chỉ chạy các closure đã tạo sẵn. `validate_field` kiểm tra từng field cấp cao nhất
+    ngay khi StreamingJSONExtractor parse xong field đó.
+    """
+
+    def __init__(self, expected_structure):
+        self.expected_structure = expected_structure
+        self._check = _compile(expected_structure)
+        self._field_checks = {}
+        if isinstance(expected_structure, dict):
+            self._field_checks = {key: _compile(value) for key, value in expected_structure.items()}
+
+    def errors(self, data):
+        errors = []
+        self._check(data, "", errors)
+        return errors
+
+    def __call__(self, data):
+        return not self.errors(data)
+
+    def validate_field(self, key, value):
+        check = self._field_checks.get(key)
+        errors = []
+        if check is not None:
+            check(value, key, errors)
+        return errors
+
+    def missing_fields(self, seen_keys):
+        return [key for key in self._field_checks if key not in seen_keys]
+
+
+def compile_validator(expected_structure):
+    return CompiledValidator(expected_structure)
+
+
+if __name__ == "__main__":
+    generation = 'Kết quả:\n{"Conclusion": "TRUE", "sub_laws": [{"sub_law_name": "労働基準法",},], "Response": "..."}'
+    validator = compile_validator({"Conclusion": str, "sub_laws": [{"sub_law_name": str}], "Response": str})
+    extractor = StreamingJSONExtractor(validator=validator)
+    for i in range(0, len(generation), 7):
+        for key, value in extractor.feed(generation[i:i + 7]):
+            print(f"field ready after {i + 7} chars: {key} = {value!r}")
+    print(extractor.result, validator(extractor.result), extractor.errors)
@@ -0,0 +1,175 @@
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Optional, Sequence
+
+from langchain_core.caches import BaseCache
+from langchain_core.load import dumps, loads
+from langchain_core.outputs import Generation
+
+
+def _hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _model_name(llm_string: str) -> str:
+    """Lấy tên model từ llm_string mà LangChain truyền vào cache (nếu có)."""
+    match = re.search(r"""['"]model(?:_name)?['"]\s*[:,]\s*['"]([^'"]+)['"]""", llm_string)
+    return match.group(1) if match else ""
+
+
+class SQLiteLRUCache(BaseCache):
+    """
+    Cache kết quả LLM lưu trên đĩa bằng SQLite.
+
+    - Key = hash(llm_string) + hash(prompt). `llm_string` chứa tên model, tham số
+      (temperature, tools, response_format, ...), `prompt` là prompt đã render từ
+      template và input, nên hai lần gọi cùng template + cùng input sẽ trúng cache.
+    - `max_entries`: giới hạn số bản ghi, khi vượt sẽ xóa các bản ghi lâu không dùng nhất (LRU).
+    - `ttl`: thời gian sống (giây) của một bản ghi, None là không hết hạn.
+    - `hits`, `misses`, `evictions`: bộ đếm để theo dõi hiệu quả cache.
+
+    Sử dụng: `ChatGroq(model=..., temperature=0, cache=SQLiteLRUCache("llm_cache.db"))`
+    hoặc `langchain_core.globals.set_llm_cache(SQLiteLRUCache(...))`.
+    """
+
+    def __init__(self, database_path: str = ".llm_cache.db", max_entries: int = 100_000,
+                 ttl: Optional[float] = None):
+        self.database_path = str(database_path)
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if self.database_path != ":memory:":
+            Path(self.database_path).parent.mkdir(parents=True, exist_ok=True)
+        # Các grader được gọi song song (Runnable.batch) nên cần khóa khi truy cập connection
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.database_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                value TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS llm_cache_last_access ON llm_cache (last_access)"
+        )
+        self._conn.commit()
+        # số bản ghi hiện có, cập nhật khi ghi / xóa để _evict không phải COUNT(*) ở mỗi lần update
+        # (giả định chỉ một process ghi vào file cache)
+        (self._count,) = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()
+
+    @staticmethod
+    def make_key(prompt: str, llm_string: str) -> str:
+        return _hash(llm_string) + _hash(prompt)
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[Sequence[Generation]]:
+        key = self.make_key(prompt, llm_string)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            value, created_at = row
+            if self.ttl is not None and now - created_at > self.ttl:
+                self._count -= self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,)).rowcount
+                self._conn.commit()
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE llm_cache SET last_access = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+        return loads(value)
+
+    def update(self, prompt: str, llm_string: str, return_val: Sequence[Generation]) -> None:
+        key = self.make_key(prompt, llm_string)
+        now = time.time()
+        value = dumps(list(return_val))
+        with self._lock:
+            # ON CONFLICT thay vì INSERT OR REPLACE: biết được bản ghi là mới hay ghi đè để cập nhật _count
+            exists = self._conn.execute("SELECT 1 FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT INTO llm_cache (key, model, value, created_at, last_access) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET model = excluded.model, value = excluded.value, "
+                "created_at = excluded.created_at, last_access = excluded.last_access",
+                (key, _model_name(llm_string), value, now, now),
+            )
+            if exists is None:
+                self._count += 1
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        overflow = self._count - self.max_entries
+        if overflow > 0:
+            deleted = self._conn.execute(
+                "DELETE FROM llm_cache WHERE key IN "
+                "(SELECT key FROM llm_cache ORDER BY last_access ASC LIMIT ?)",
+                (overflow,),
+            ).rowcount
+            self._count -= deleted
+            self.evictions += deleted
+
+    def clear(self, **kwargs: Any) -> None:
+        """Xóa toàn bộ cache, hoặc chỉ các bản ghi của một model nếu truyền `model=...`."""
+        with self._lock:
+            if "model" in kwargs:
+                self._count -= self._conn.execute("DELETE FROM llm_cache WHERE model = ?", (kwargs["model"],)).rowcount
+            else:
+                self._conn.execute("DELETE FROM llm_cache")
+                self._count = 0
+            self._conn.commit()
+
+    def count(self) -> int:
+        # Không định nghĩa __len__: LangChain kiểm tra `if llm_cache:` nên cache rỗng sẽ bị bỏ qua
+        with self._lock:
+            return self._count
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hit_rate,
+            "entries": self.count(),
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+if __name__ == "__main__":
+    # Kiểm tra nhanh với chat model giả lập, không cần gọi Groq
+    import tempfile
+    from langchain_core.language_models.fake_chat_models import FakeListChatModel
+    from langchain_core.prompts import ChatPromptTemplate
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = SQLiteLRUCache(f"{tmp}/llm_cache.db", max_entries=2, ttl=3600)
+        fake_llm = FakeListChatModel(responses=["relevant", "irrelevant", "relevant"], cache=cache)
+        chain = ChatPromptTemplate.from_template("Clause: {query}") | fake_llm
+
+        print(chain.invoke({"query": "a"}).content)   # miss
+        print(chain.invoke({"query": "a"}).content)   # hit
+        print(chain.invoke({"query": "b"}).content)   # miss
+        print(chain.invoke({"query": "c"}).content)   # miss, đẩy "a" ra khỏi cache
+        print(cache.stats())
@@ -0,0 +1,263 @@
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+# các trường metadata do LLM sinh ra (MetadataExtractor trong genereate_metadata.py)
+ENRICHMENT_FIELDS = ("category", "keywords", "applicable_entities", "reference_articles")
+
+
+class TokenBucket:
+    """
+    Token bucket an toàn giữa các thread: nạp `rate` token mỗi giây, tối đa `capacity` token.
+    `acquire(n)` chặn cho đến khi đủ n token.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(rate, 1.0))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens=1.0):
+        # một yêu cầu lớn hơn capacity vẫn được phục vụ khi bucket đầy
+        tokens = min(float(tokens), self.capacity)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def document_key(doc):
+    """Khóa checkpoint của một document: id của record corpus + hash nội dung (id có thể bị trùng)."""
+    digest = hashlib.sha1(doc["content"].encode("utf-8")).hexdigest()[:16]
+    return f'{doc.get("id", "")}:{digest}'
+
+
+def estimate_tokens(text):
+    # ước lượng thô cho tiếng Nhật: khoảng 1 token / ký tự, cộng phần prompt hệ thống
+    return len(text) + 200
+
+
+def already_enriched(doc):
+    return len(doc["metadata"]) > 10
+
+
+def load_checkpoint(checkpoint_path):
+    """Đọc checkpoint JSONL -> {key: metadata}. Bỏ qua dòng cuối bị ghi dở khi process bị dừng giữa chừng."""
+    done = {}
+    if not os.path.exists(checkpoint_path):
+        return done
+    with open(checkpoint_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            done[record["key"]] = record["metadata"]
+    return done
+
+
+def atomic_write_json(path, data):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _result_to_metadata(result):
+    if hasattr(result, "model_dump"):
+        result = result.model_dump()
+    elif hasattr(result, "dict"):
+        result = result.dict()
+    # giống script cũ: chỉ giữ các trường có giá trị
+    return {field: result[field] for field in ENRICHMENT_FIELDS if result.get(field)}
+
+
+def apply_metadata(doc, metadata):
+    doc["metadata"].update(metadata)
+
+
+class MetadataEnrichmentRunner:
+    """
+    Chạy metadata_extractor_chain trên toàn bộ corpus:
+    - tối đa `max_workers` lời gọi đồng thời,
+    - giới hạn tốc độ bằng token bucket theo số request/phút và (tùy chọn) số token/phút,
+    - retry với exponential backoff + jitter,
+    - mỗi document xong được ghi ngay vào checkpoint JSONL (append-only), chạy lại sẽ bỏ qua các document đã xong,
+    - chỉ tối đa `max_in_flight` (mặc định 2 * max_workers) document được submit cùng lúc: khi bị dừng (Ctrl+C
+      hoặc lỗi) các document chưa chạy bị hủy, các lời gọi đang chạy xong vẫn được ghi vào checkpoint.
+    """
+
+    def __init__(self, chain, checkpoint_path, max_workers=4, requests_per_minute=30, tokens_per_minute=None,
+                 max_retries=5, backoff_base=2.0, backoff_max=60.0, is_done=already_enriched,
+                 token_estimator=estimate_tokens, max_in_flight=None):
+        self.chain = chain
+        self.checkpoint_path = checkpoint_path
+        self.max_workers = max_workers
+        self.max_in_flight = max_in_flight or 2 * max_workers
+        self.request_bucket = TokenBucket(requests_per_minute / 60.0, capacity=max_workers)
+        self.token_bucket = None
+        if tokens_per_minute:
+            self.token_bucket = TokenBucket(tokens_per_minute / 60.0, capacity=tokens_per_minute)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.is_done = is_done
+        self.token_estimator = token_estimator
+        self._write_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        # được set khi run bị dừng: các lời gọi đang chờ retry dừng ngay thay vì tiếp tục backoff
+        self._stop = threading.Event()
+        self.retries = 0
+
+    def _invoke_with_retry(self, content):
+        for attempt in range(self.max_retries + 1):
+            self.request_bucket.acquire()
+            if self.token_bucket is not None:
+                self.token_bucket.acquire(self.token_estimator(content))
+            try:
+                return self.chain.invoke({"document": content})
+            except Exception:
+                if attempt == self.max_retries or self._stop.is_set():
+                    raise
+                with self._stats_lock:
+                    self.retries += 1
+                delay = min(self.backoff_max, self.backoff_base ** attempt)
+                if self._stop.wait(delay * random.uniform(0.5, 1.0)):
+                    raise
+
+    def _append_checkpoint(self, f, key, metadata):
+        line = json.dumps({"key": key, "metadata": metadata}, ensure_ascii=False)
+        with self._write_lock:
+            f.write(line + "\n")
+            f.flush()
+
+    def run(self, docs):
+        """
+        Làm giàu metadata cho `docs` (sửa trực tiếp trên từng doc).
+
+        :return: báo cáo dict (số document đã xử lý, bỏ qua, lỗi, throughput, ...).
+        """
+        start = time.perf_counter()
+        done = load_checkpoint(self.checkpoint_path)
+        pending = []
+        resumed = skipped = 0
+        for doc in docs:
+            key = document_key(doc)
+            if key in done:
+                apply_metadata(doc, done[key])
+                resumed += 1
+            elif self.is_done(doc):
+                skipped += 1
+            else:
+                pending.append((key, doc))
+
+        enriched, failures = 0, []
+        self._stop.clear()
+        pending = iter(pending)
+        in_flight = {}
+
+        def finish(checkpoint, future):
+            nonlocal enriched
+            key, doc = in_flight.pop(future)
+            try:
+                metadata = _result_to_metadata(future.result())
+            except Exception as e:
+                failures.append({"key": key, "error": repr(e)})
+                return
+            self._append_checkpoint(checkpoint, key, metadata)
+            apply_metadata(doc, metadata)
+            enriched += 1
+
+        with open(self.checkpoint_path, "a", encoding="utf-8") as checkpoint:
+            executor = ThreadPoolExecutor(max_workers=self.max_workers)
+            try:
+                while True:
+                    # chỉ submit trong cửa sổ max_in_flight, không đưa cả backlog vào hàng đợi của executor
+                    for key, doc in pending:
+                        in_flight[executor.submit(self._invoke_with_retry, doc["content"])] = (key, doc)
+                        if len(in_flight) >= self.max_in_flight:
+                            break
+                    if not in_flight:
+                        break
+                    finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        finish(checkpoint, future)
+            finally:
+                self._stop.set()
+                executor.shutdown(wait=True, cancel_futures=True)
+                # các lời gọi đã chạy xong trước khi dừng vẫn được ghi vào checkpoint
+                for future in [f for f in in_flight if f.done() and not f.cancelled()]:
+                    if future.exception() is None:
+                        finish(checkpoint, future)
+
+        elapsed = time.perf_counter() - start
+        return {
+            "total": len(docs),
+            "enriched": enriched,
+            "resumed_from_checkpoint": resumed,
+            "skipped": skipped,
+            "failed": len(failures),
+            "failures": failures,
+            "retries": self.retries,
+            "elapsed_seconds": round(elapsed, 3),
+            "docs_per_second": round(enriched / elapsed, 3) if elapsed > 0 else 0.0,
+        }
+
+
+def enrich_corpus(chain, corpus_path, output_path=None, checkpoint_path=None, **runner_kwargs):
+    """
+    Đọc corpus, làm giàu metadata, rồi ghi atomic (file tạm + os.replace) ra `output_path`
+    (mặc định ghi đè `corpus_path`). Các document lỗi giữ nguyên metadata cũ và được thử lại ở lần chạy sau.
+    """
+    output_path = output_path or corpus_path
+    checkpoint_path = checkpoint_path or f"{output_path}.checkpoint.jsonl"
+    with open(corpus_path, "r", encoding="utf-8") as f:
+        docs = json.load(f)
+    report = MetadataEnrichmentRunner(chain, checkpoint_path, **runner_kwargs).run(docs)
+    atomic_write_json(output_path, docs)
+    return report
+
+
+def print_report(report):
+    print(f'Enriched {report["enriched"]}/{report["total"]} documents in {report["elapsed_seconds"]}s '
+          f'({report["docs_per_second"]} docs/s), resumed {report["resumed_from_checkpoint"]}, '
+          f'skipped {report["skipped"]}, retries {report["retries"]}, failed {report["failed"]}')
+    for failure in report["failures"][:10]:
+        print(f'  FAILED {failure["key"]}: {failure["error"]}')
+
+
+if __name__ == "__main__":
+    # ví dụ chạy với LLM giả (không cần API key): lỗi ngẫu nhiên để kiểm tra retry và checkpoint
+    import tempfile
+    from langchain_core.runnables import RunnableLambda
+
+    def fake_extractor(inputs):
+        if random.random() < 0.2:
+            raise RuntimeError("429 rate limit")
+        return {"category": "労働法", "keywords": inputs["document"].split()[:3],
+                "applicable_entities": [], "reference_articles": []}
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        corpus_path = os.path.join(tmp_dir, "corpus.json")
+        atomic_write_json(corpus_path, [
+            {"id": f"law_{i}", "content": f"第{i}条 使用者 労働者 賃金", "metadata": {"law_name": "労働基準法"}}
+            for i in range(50)
+        ])
+        for _ in range(2):
+            report = enrich_corpus(RunnableLambda(fake_extractor), corpus_path, max_workers=8,
+                                   requests_per_minute=6000, max_retries=0, backoff_base=0.01)
+            print_report(report)
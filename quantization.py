@@ -0,0 +1,316 @@
+import json
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+
+from embedding_store import load_embedding_store, store_hash
+
+QUANTIZATION_MODES = ("int8", "binary")
+META_NAME = "meta.json"
+ARRAYS_NAME = "codes.npz"
+
+_M1 = np.uint64(0x5555555555555555)
+_M2 = np.uint64(0x3333333333333333)
+_M4 = np.uint64(0x0F0F0F0F0F0F0F0F)
+_H01 = np.uint64(0x0101010101010101)
+
+# số dòng int8 được đổi sang float32 mỗi lần (1024 x 384 float32 = 1.5 MB, vừa cache L2):
+# buffer nhỏ được dùng lại cho mọi block nên lượt đầu chỉ đọc codes int8 từ bộ nhớ, nhanh hơn quét float32.
+# Matmul int16 / int32 và float16 của NumPy không dùng BLAS, đo được chậm hơn cả quét float32 chính xác.
+# Với corpus nhỏ (vài nghìn dòng) chi phí cố định mỗi lời gọi lớn hơn phần tiết kiệm, quét float32 vẫn nhanh hơn
+# (xem first_pass_qps / exact_qps của recall_report).
+INT8_BLOCK_ROWS = 1024
+
+
+def _popcount64(x):
+    """Số bit 1 của từng phần tử uint64 (np.bitwise_count từ NumPy 2.0, SWAR cho bản cũ hơn)."""
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(x)
+    x = x - ((x >> np.uint64(1)) & _M1)
+    x = (x & _M2) + ((x >> np.uint64(2)) & _M2)
+    x = (x + (x >> np.uint64(4))) & _M4
+    return (x * _H01) >> np.uint64(56)
+
+
+def _normalized(emb, norms, rows):
+    return np.asarray(emb[rows], dtype=np.float32) / np.maximum(np.asarray(norms[rows])[:, None], 1e-12)
+
+
+def _normalized_queries(question_emb):
+    queries = np.atleast_2d(np.asarray(question_emb, dtype=np.float32))
+    return queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+
+
+def _pack_signs(vectors, offset):
+    """Bit dấu của (vector - offset), pack 8 bit / byte và pad đến bội số của 8 byte để XOR theo uint64."""
+    bits = np.packbits(vectors - offset > 0, axis=1)
+    pad = -bits.shape[1] % 8
+    if pad:
+        bits = np.pad(bits, ((0, 0), (0, pad)))
+    return bits
+
+
+class QuantizedIndex:
+    """
+    Bản lượng tử hóa của embedding store (embedding_store.py) cho lượt tìm kiếm đầu tiên:
+    - "int8": mỗi chiều của vector đã chuẩn hóa được chia cho scale riêng của chiều đó (max |x| / 127),
+      nhỏ hơn float32 4 lần; điểm xấp xỉ = codes @ (query * scale), codes được đổi sang float32 theo
+      từng block INT8_BLOCK_ROWS dòng vào một buffer dùng lại.
+    - "binary": bit dấu của (vector - trung bình theo chiều), nhỏ hơn 32 lần; điểm xấp xỉ
+      = cos(pi * hamming / dim).
+    Lượt đầu chấm điểm xấp xỉ có trọng số của ensemble trên toàn corpus (hoặc các dòng của category)
+    và chọn `rescore_k` ứng viên; RetrievalData chấm lại chính xác bằng float chỉ trên các ứng viên đó,
+    nên ma trận float (mmap) chỉ bị đọc ở các dòng ứng viên.
+    """
+
+    def __init__(self, mode, codes, scales=None, offsets=None, dims=None, meta=None):
+        if mode not in QUANTIZATION_MODES:
+            raise ValueError(f"Unknown quantization mode '{mode}', expected one of {QUANTIZATION_MODES}")
+        self.mode = mode
+        self.codes = codes
+        self.scales = scales
+        self.offsets = offsets
+        self.dims = dims or [int(c.shape[1]) for c in codes]
+        self.meta = meta or {}
+
+    @property
+    def num_docs(self):
+        return self.codes[0].shape[0]
+
+    @property
+    def nbytes(self):
+        return int(sum(c.nbytes for c in self.codes))
+
+    @classmethod
+    def build(cls, emb_legal_data, emb_legal_norms, mode="int8", chunk_size=65536):
+        if mode not in QUANTIZATION_MODES:
+            raise ValueError(f"Unknown quantization mode '{mode}', expected one of {QUANTIZATION_MODES}")
+        num_docs = emb_legal_data[0].shape[0]
+        chunks = [np.arange(start, min(start + chunk_size, num_docs)) for start in range(0, num_docs, chunk_size)]
+        codes, scales, offsets = [], [], []
+        for emb, norms in zip(emb_legal_data, emb_legal_norms):
+            dim = emb.shape[1]
+            # lượt 1: thống kê theo chiều (max |x| cho int8, trung bình cho binary), theo từng chunk
+            stat = np.zeros(dim, dtype=np.float64)
+            for rows in chunks:
+                vectors = _normalized(emb, norms, rows)
+                if mode == "int8":
+                    np.maximum(stat, np.abs(vectors).max(axis=0), out=stat)
+                else:
+                    stat += vectors.sum(axis=0)
+            # lượt 2: mã hóa
+            if mode == "int8":
+                scale = (np.where(stat > 0, stat, 1.0) / 127).astype(np.float32)
+                model_codes = np.empty((num_docs, dim), dtype=np.int8)
+                for rows in chunks:
+                    model_codes[rows] = np.clip(np.rint(_normalized(emb, norms, rows) / scale), -127, 127)
+                scales.append(scale)
+            else:
+                offset = (stat / max(num_docs, 1)).astype(np.float32)
+                model_codes = np.empty((num_docs, (dim + 63) // 64 * 8), dtype=np.uint8)
+                for rows in chunks:
+                    model_codes[rows] = _pack_signs(_normalized(emb, norms, rows), offset)
+                offsets.append(offset)
+            codes.append(model_codes)
+        return cls(mode, codes, scales or None, offsets or None, dims=[int(e.shape[1]) for e in emb_legal_data],
+                   meta={"num_docs": int(num_docs)})
+
+    def save(self, index_dir, corpus_hash=None):
+        index_dir = Path(index_dir)
+        index_dir.mkdir(parents=True, exist_ok=True)
+        arrays = {f"codes_{i}": c for i, c in enumerate(self.codes)}
+        arrays.update({f"scales_{i}": s for i, s in enumerate(self.scales or [])})
+        arrays.update({f"offsets_{i}": o for i, o in enumerate(self.offsets or [])})
+        np.savez(index_dir / ARRAYS_NAME, **arrays)
+        meta = {**self.meta, "mode": self.mode, "dims": self.dims, "num_models": len(self.codes)}
+        if corpus_hash is not None:
+            meta["corpus_hash"] = corpus_hash
+        tmp_path = index_dir / (META_NAME + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=2)
+        os.replace(tmp_path, index_dir / META_NAME)
+
+    @classmethod
+    def load(cls, index_dir, corpus_hash=None):
+        index_dir = Path(index_dir)
+        with open(index_dir / META_NAME, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if corpus_hash is not None and meta.get("corpus_hash") != corpus_hash:
+            raise ValueError(f"Quantized index at '{index_dir}' was built from a different corpus, rebuild it")
+        arrays = np.load(index_dir / ARRAYS_NAME)
+        num_models = meta["num_models"]
+        codes = [arrays[f"codes_{i}"] for i in range(num_models)]
+        scales = [arrays[f"scales_{i}"] for i in range(num_models)] if meta["mode"] == "int8" else None
+        offsets = [arrays[f"offsets_{i}"] for i in range(num_models)] if meta["mode"] == "binary" else None
+        return cls(meta["mode"], codes, scales, offsets, dims=meta["dims"], meta=meta)
+
+    def approx_scores(self, question_embs, weighted, rows=None, chunk_size=4096):
+        """
+        Tổng có trọng số của cosine xấp xỉ giữa các câu hỏi và corpus (hoặc các dòng `rows`).
+
+        :param question_embs: mỗi model một vector (một câu hỏi) hoặc một ma trận (num_queries, dim).
+        :return: ma trận (num_queries, num_rows).
+        """
+        num_rows = self.num_docs if rows is None else len(rows)
+        scores = None
+        for idx, (weight, question_emb) in enumerate(zip(weighted, question_embs)):
+            queries = _normalized_queries(question_emb)
+            if scores is None:
+                scores = np.zeros((len(queries), num_rows), dtype=np.float32)
+            codes = self.codes[idx] if rows is None else self.codes[idx][rows]
+            if self.mode == "int8":
+                # scale của từng chiều và trọng số của model được nhân vào câu hỏi một lần
+                scaled = np.ascontiguousarray((queries * (self.scales[idx] * weight)).T, dtype=np.float32)
+                block = np.empty((min(INT8_BLOCK_ROWS, num_rows), codes.shape[1]), dtype=np.float32)
+                block_scores = np.empty((len(block), len(queries)), dtype=np.float32)
+                for start in range(0, num_rows, INT8_BLOCK_ROWS):
+                    end = min(start + INT8_BLOCK_ROWS, num_rows)
+                    np.copyto(block[:end - start], codes[start:end], casting="unsafe")
+                    np.matmul(block[:end - start], scaled, out=block_scores[:end - start])
+                    scores[:, start:end] += block_scores[:end - start].T
+            else:
+                words = codes.view(np.uint64)
+                query_words = _pack_signs(queries, self.offsets[idx]).view(np.uint64)
+                for start in range(0, num_rows, chunk_size):
+                    end = min(start + chunk_size, num_rows)
+                    for q, query in enumerate(query_words):
+                        hamming = _popcount64(words[start:end] ^ query).sum(axis=1)
+                        scores[q, start:end] += weight * np.cos(np.pi * hamming / self.dims[idx])
+        return scores
+
+    def candidates(self, question_embs, weighted, rescore_k=200, rows=None):
+        """
+        Các dòng cần chấm lại chính xác: top `rescore_k` theo điểm xấp xỉ của từng câu hỏi (hợp của các
+        câu hỏi khi có nhiều câu), trong `rows` nếu có. Kết quả được sắp xếp tăng dần.
+        """
+        if rows is not None:
+            rows = np.asarray(rows, dtype=np.int64)
+            if len(rows) == 0:
+                return rows
+        scores = self.approx_scores(question_embs, weighted, rows)
+        k = min(rescore_k, scores.shape[1])
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top = np.unique(top)
+        return top if rows is None else rows[top]
+
+
+def build_quantized_index(store_dir, mode="int8", index_dir=None, **kwargs):
+    """
+    Build QuantizedIndex offline từ embedding store và lưu cạnh store (mặc định `<store_dir>/<mode>`).
+    Không cần load model.
+    """
+    emb_legal_data, emb_legal_norms, manifest = load_embedding_store(store_dir)
+    index_dir = index_dir or Path(store_dir) / mode
+    index = QuantizedIndex.build(emb_legal_data, emb_legal_norms, mode=mode, **kwargs)
+    index.save(index_dir, corpus_hash=store_hash(manifest))
+    return index
+
+
+def exact_scores(retrieval, question_embs, rows=None):
+    """Tổng cosine float có trọng số (như RetrievalData.calculate_cosine_similarity[_rows]) trên corpus hoặc `rows`."""
+    scores = None
+    for weight, emb, norms, question_emb in zip(retrieval.weighted, retrieval.emb_legal_data,
+                                                 retrieval.emb_legal_norms, question_embs):
+        query = _normalized_queries(question_emb)[0]
+        if rows is not None:
+            emb, norms = emb[rows], norms[rows]
+        model_scores = weight * (emb @ query) / np.maximum(np.asarray(norms), 1e-12)
+        scores = model_scores if scores is None else scores + model_scores
+    return np.asarray(scores, dtype=np.float32)
+
+
+def recall_report(retrieval, question_embs_list, index, k=10, rescore_k=200):
+    """
+    Độ mất recall so với tìm kiếm float chính xác (brute force) trên các câu hỏi mẫu.
+
+    :param retrieval: RetrievalData (hoặc object có emb_legal_data, emb_legal_norms, weighted).
+    :param question_embs_list: danh sách question_embs (kết quả encode_question của từng câu hỏi).
+    :return: dict gồm recall@k của lượt đầu (chỉ dùng điểm xấp xỉ) và sau khi chấm lại chính xác,
+        recall_loss = 1 - recall sau khi chấm lại, bộ nhớ, thời gian trung bình mỗi câu hỏi và QPS của
+        quét float chính xác, của riêng lượt đầu và của lượt đầu + chấm lại.
+    """
+    first_pass, rescored = [], []
+    exact_seconds = first_pass_seconds = quantized_seconds = 0.0
+    for question_embs in question_embs_list:
+        start = time.perf_counter()
+        exact = exact_scores(retrieval, question_embs)
+        k_eff = min(k, len(exact))
+        # document có điểm bằng điểm thứ k (trùng nội dung) cũng được tính là đúng
+        kth_score = np.partition(exact, len(exact) - k_eff)[len(exact) - k_eff] - 1e-6
+        exact_seconds += time.perf_counter() - start
+
+        start = time.perf_counter()
+        rows = index.candidates(question_embs, retrieval.weighted, rescore_k)
+        approx = exact_scores(retrieval, question_embs, rows)
+        k_approx = min(k_eff, len(rows))
+        rescored_top = rows[np.argpartition(-approx, k_approx - 1)[:k_approx]]
+        quantized_seconds += time.perf_counter() - start
+
+        start = time.perf_counter()
+        approx_scores = index.approx_scores(question_embs, retrieval.weighted)[0]
+        first_pass_seconds += time.perf_counter() - start
+        first_top = np.argpartition(-approx_scores, k_eff - 1)[:k_eff]
+        first_pass.append(np.count_nonzero(exact[first_top] >= kth_score) / k_eff)
+        rescored.append(np.count_nonzero(exact[rescored_top] >= kth_score) / k_eff)
+
+    n = max(len(question_embs_list), 1)
+
+    def qps(seconds):
+        return round(len(question_embs_list) / seconds, 1) if seconds > 0 else None
+
+    float_bytes = int(sum(np.asarray(emb).nbytes for emb in retrieval.emb_legal_data))
+    recall = float(np.mean(rescored)) if rescored else 0.0
+    return {
+        "mode": index.mode,
+        "k": k,
+        "rescore_k": rescore_k,
+        "queries": len(question_embs_list),
+        "first_pass_recall": round(float(np.mean(first_pass)) if first_pass else 0.0, 4),
+        "first_pass_qps": qps(first_pass_seconds),
+        "recall": round(recall, 4),
+        "recall_loss": round(1 - recall, 4),
+        "float_mb": round(float_bytes / (1 << 20), 2),
+        "quantized_mb": round(index.nbytes / (1 << 20), 2),
+        "exact_ms": round(exact_seconds / n * 1000, 3),
+        "first_pass_ms": round(first_pass_seconds / n * 1000, 3),
+        "quantized_ms": round(quantized_seconds / n * 1000, 3),
+        "exact_qps": qps(exact_seconds),
+        "quantized_qps": qps(quantized_seconds),
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+    from types import SimpleNamespace
+
+    parser = argparse.ArgumentParser(description="Build int8 / binary quantized indexes next to an embedding store")
+    parser.add_argument("store_dir")
+    parser.add_argument("--mode", choices=QUANTIZATION_MODES, nargs="+", default=list(QUANTIZATION_MODES))
+    parser.add_argument("--weighted", type=float, nargs="*", default=None, help="trọng số ensemble (mặc định bằng nhau)")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--rescore-k", type=int, default=200)
+    parser.add_argument("--recall-queries", type=int, default=100,
+                        help="số dòng ngẫu nhiên của corpus (có nhiễu) dùng làm câu hỏi để đo recall, không cần model")
+    args = parser.parse_args()
+
+    emb_legal_data, emb_legal_norms, manifest = load_embedding_store(args.store_dir)
+    weighted = args.weighted or [1.0 / len(emb_legal_data)] * len(emb_legal_data)
+    store = SimpleNamespace(emb_legal_data=emb_legal_data, emb_legal_norms=emb_legal_norms, weighted=weighted)
+
+    rng = np.random.default_rng(0)
+    sample = rng.choice(manifest["num_docs"], size=min(args.recall_queries, manifest["num_docs"]), replace=False)
+    questions = []
+    for row in sample:
+        question_embs = []
+        for emb, norms in zip(emb_legal_data, emb_legal_norms):
+            vector = _normalized(emb, norms, [row])[0]
+            question_embs.append(vector + rng.normal(scale=0.5 / np.sqrt(len(vector)), size=len(vector)))
+        questions.append(question_embs)
+
+    for mode in args.mode:
+        start = time.perf_counter()
+        index = build_quantized_index(args.store_dir, mode)
+        print(f"{mode}: built in {time.perf_counter() - start:.1f}s")
+        print(json.dumps(recall_report(store, questions, index, k=args.k, rescore_k=args.rescore_k)))
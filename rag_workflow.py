@@ -0,0 +1,381 @@
+"""
+Graph LangGraph của Healthcare Agentic RAG (08_Healthcare_Agentic_RAG):
+
+    router (+ speculative retrieval) -> VectorStore / SearchEngine / fallback -> filter_docs -> rag
+    -> grade_generation -> END, hoặc vòng lặp hallucination / SearchEngine, hoặc degrade khi hết budget
+
+app.py dựng graph với ChatGroq, Chroma retriever và Tavily; benchmark.py dựng đúng graph này với các
+thành phần giả, nên số liệu benchmark luôn là của graph đang chạy thật.
+"""
+from operator import itemgetter
+from typing import Literal, TypedDict
+
+from langchain_core.documents import Document
+from langchain_core.messages import BaseMessage, HumanMessage
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.pydantic_v1 import BaseModel, Field, validator
+from langchain_core.runnables import RunnableParallel
+from langgraph.graph import END, StateGraph
+
+from chat_history import render_turn
+from grading import filter_relevant_documents, grade_generation
+
+
+# ======================= router ======================= #
+class VectorStore(BaseModel):
+    (
+        "A vectorstore contains information about symptoms, treatment"
+        ", risk factors and other information about malaria, type 1 and"
+        "type 2 diabetes and migraines"
+    )
+
+    query: str
+
+
+class SearchEngine(BaseModel):
+    """A search engine for searching other medical information on the web"""
+
+    query: str
+
+
+router_prompt_template = (
+    "You are an expert in routing user queries to either a VectorStore, SearchEngine\n"
+    "Use SearchEngine for all other medical queries that are not related to malaria, diabetes, or migraines.\n"
+    "The VectorStore contains information on malaria, diabetes, and migraines.\n"
+    'Note that if a query is not medically-related, you must output "not medically-related", don\'t try to use any tool.\n\n'
+    "query: {query}"
+)
+
+
+# ======================= graders ======================= #
+class Grader(BaseModel):
+    "Use this format to give a binary score for relevance check on retrived documents."
+
+    grade: Literal["relevant", "irrelevant"] = Field(
+        ...,
+        description="The relevance score for the document.\n"
+        "Set this to 'relevant' if the given context is relevant to the user's query, or 'irrlevant' if the document is not relevant.",
+    )
+
+    @validator("grade", pre=True)
+    def validate_grade(cls, value):
+        if value == "not relevant":
+            return "irrelevant"
+        return value
+
+
+grader_system_prompt_template = """"You are a grader tasked with assessing the relevance of a given context to a query. 
+    If the context is relevant to the query, score it as "relevant". Otherwise, give "irrelevant".
+    Do not answer the actual answer, just provide the grade in JSON format with "grade" as the key, without any additional explanation."
+    """
+
+grader_prompt = ChatPromptTemplate.from_messages(
+    [
+        ("system", grader_system_prompt_template),
+        ("human", "context: {context}\n\nquery: {query}"),
+    ]
+)
+
+
+class HallucinationGrader(BaseModel):
+    "Binary score for hallucination check in llm's response"
+
+    grade: Literal["yes", "no"] = Field(
+        ..., description="'yes' if the llm's reponse is hallucinated otherwise 'no'"
+    )
+
+
+hallucination_grader_system_prompt_template = (
+    "You are a grader assessing whether a response from an llm is based on a given context.\n"
+    "If the llm's response is not based on the given context give a score of 'yes' meaning it's a hallucination"
+    "otherwise give 'no'\n"
+    "Just give the grade in json with 'grade' as a key and a binary value of 'yes' or 'no' without additional explanation"
+)
+
+hallucination_grader_prompt = ChatPromptTemplate.from_messages(
+    [
+        ("system", hallucination_grader_system_prompt_template),
+        ("human", "context: {context}\n\nllm's response: {response}"),
+    ]
+)
+
+
+class AnswerGrader(BaseModel):
+    "Binary score for an answer check based on a query."
+
+    grade: Literal["yes", "no"] = Field(
+        ...,
+        description="'yes' if the provided answer is an actual answer to the query otherwise 'no'",
+    )
+
+
+answer_grader_system_prompt_template = (
+    "You are a grader assessing whether a provided answer is in fact an answer to the given query.\n"
+    "If the provided answer does not answer the query give a score of 'no' otherwise give 'yes'\n"
+    "Just give the grade in json with 'grade' as a key and a binary value of 'yes' or 'no' without additional explanation"
+)
+
+answer_grader_prompt = ChatPromptTemplate.from_messages(
+    [
+        ("system", answer_grader_system_prompt_template),
+        ("human", "query: {query}\n\nanswer: {response}"),
+    ]
+)
+
+
+# ======================= rag / fallback ======================= #
+rag_template_str = (
+    "You are a helpful assistant. Answer the query below based only on the provided context.\n\n"
+    "context: {context}\n\n"
+    "query: {query}"
+)
+
+rag_prompt = ChatPromptTemplate.from_template(rag_template_str)
+
+fallback_prompt = ChatPromptTemplate.from_template(
+    (
+        "You are a friendly medical assistant created by NHVAI.\n"
+        "Do not respond to queries that are not related to health.\n"
+        "If a query is not related to health, acknowledge your limitations.\n"
+        "Provide concise responses to only medically-related queries.\n\n"
+        "Current conversations:\n\n{chat_history}\n\n"
+        "human: {query}"
+    )
+)
+
+
+def format_chat_history(chat_history):
+    """chat_history cho prompt: các lượt {"human", "ai"} của HistoryManager hoặc các message của LangChain."""
+    lines = []
+    for turn in chat_history:
+        if isinstance(turn, dict):
+            lines.append(render_turn(turn))
+        elif isinstance(turn, HumanMessage):
+            lines.append(f"human: {turn.content}")
+        else:
+            lines.append(f"AI: {turn.content}")
+    return "\n".join(lines)
+
+
+class AgentState(TypedDict):
+    """The dictionary keeps track of the data required by the various nodes in the graph"""
+
+    query: str
+    chat_history: list[BaseMessage]
+    generation: str
+    documents: list[Document]
+    verdict: str
+    route: str
+    prefetched_documents: list[Document] | None
+    num_hallucination: int
+    num_searchengine: int
+    degraded: dict
+
+
+def build_workflow(llm, retriever, search, budget, grader_llm=None, speculative_retrieval=None,
+                   grader_max_concurrency=5):
+    """
+    Dựng và compile graph.
+
+    :param llm: chat model của rag và fallback (không nên cache: rag chạy lại sau hallucination phải sinh câu mới).
+    :param retriever: Runnable query -> list[Document], ví dụ Chroma `as_retriever()`.
+    :param search: tool web search, `invoke(query)` trả về danh sách {"url", "content"} (TavilySearchResults).
+    :param budget: RequestBudget của các vòng lặp; nếu chưa có `fallback` thì dùng fallback_node của graph.
+    :param grader_llm: chat model của router và các grader (mặc định là `llm`; app.py dùng bản có cache).
+    :param speculative_retrieval: SpeculativeRetrieval(retriever) để retrieval chạy song song với router,
+        None thì chỉ retrieve sau khi router chọn VectorStore.
+    :param grader_max_concurrency: số lời gọi grader_chain tối đa chạy đồng thời trong filter_docs.
+    :return: compiled graph đã bọc bằng budget.bind.
+    """
+    grader_llm = grader_llm or llm
+    question_router = ChatPromptTemplate.from_template(router_prompt_template) | grader_llm.bind_tools(
+        tools=[VectorStore, SearchEngine]
+    )
+    grader_chain = grader_prompt | grader_llm.with_structured_output(Grader, method="json_mode")
+    hallucination_grader_chain = (
+        RunnableParallel(
+            {
+                "response": itemgetter("response"),
+                "context": lambda x: "\n\n".join([c.page_content for c in x["context"]]),
+            }
+        )
+        | hallucination_grader_prompt
+        | grader_llm.with_structured_output(HallucinationGrader, method="json_mode")
+    )
+    answer_grader_chain = answer_grader_prompt | grader_llm.with_structured_output(AnswerGrader, method="json_mode")
+    rag_chain = rag_prompt | llm | StrOutputParser()
+    fallback_chain = (
+        {
+            "chat_history": lambda x: format_chat_history(x["chat_history"]),
+            "query": itemgetter("query"),
+        }
+        | fallback_prompt
+        | llm
+        | StrOutputParser()
+    )
+
+    def retrieve_node(state: dict) -> dict[str, list[Document] | str]:
+        """
+        Retrieve relevent documents from the vectorstore
+
+        query: str
+
+        return list[Document]
+        """
+        query = state["query"]
+        documents = state.get("prefetched_documents")
+        if documents is None:
+            documents = retriever.invoke(input=query)
+        return {"documents": documents, "prefetched_documents": None}
+
+    def fallback_node(state: dict):
+        """
+        Fallback to this node when there is no tool call
+        """
+        query = state["query"]
+        chat_history = state.get("chat_history") or []
+        generation = fallback_chain.invoke({"query": query, "chat_history": chat_history})
+        return {"generation": generation}
+
+    if budget.fallback is None:
+        # hết budget trước khi có câu trả lời nào: trả lời bằng fallback_chain
+        budget.fallback = fallback_node
+
+    def filter_documents_node(state: dict):
+        query = state["query"]
+        documents = state["documents"]
+
+        # loại bỏ documents trùng lặp và chấm điểm song song các documents còn lại
+        filtered_docs = filter_relevant_documents(
+            grader_chain, query, documents, max_concurrency=grader_max_concurrency
+        )
+        return {"documents": filtered_docs}
+
+    def rag_node(state: dict):
+        query = state["query"]
+        documents = state["documents"]
+
+        generation = rag_chain.invoke({"query": query, "context": documents})
+        return {"generation": generation}
+
+    def web_search_node(state: dict):
+        query = state["query"]
+        results = search.invoke(query)
+        documents = [
+            Document(page_content=doc["content"], metadata={"source": doc["url"]})
+            for doc in results
+        ]
+        return {"documents": documents, **budget.increment(state, "num_searchengine")}
+
+    def hallucination_node(state: dict):
+        return budget.increment(state, "num_hallucination")
+
+    def question_router_node(state: dict):
+        query = state["query"]
+        try:
+            response = question_router.invoke({"query": query})
+        except Exception:
+            return "llm_fallback"
+
+        if "tool_calls" not in response.additional_kwargs:
+            print("---No tool called---")
+            return "llm_fallback"
+
+        if len(response.additional_kwargs["tool_calls"]) == 0:
+            raise ValueError("Router could not decide route!")
+
+        route = response.additional_kwargs["tool_calls"][0]["function"]["name"]
+        if route == "VectorStore":
+            print("---Routing to VectorStore---")
+            return "VectorStore"
+        elif route == "SearchEngine":
+            print("---Routing to SearchEngine---")
+            return "SearchEngine"
+
+    def router_node(state: dict):
+        if speculative_retrieval is None:
+            return {"route": question_router_node(state)}
+
+        speculation = speculative_retrieval.start(state["query"])
+        route = None
+        try:
+            route = question_router_node(state)
+        finally:
+            # router lỗi (route vẫn là None): retrieval đang chạy bị hủy / bỏ, lỗi đi tiếp như khi không speculative
+            documents = speculative_retrieval.finish(speculation, use=route == "VectorStore")
+        return {"route": route, "prefetched_documents": documents}
+
+    def should_generate(state: dict, config):
+        filtered_docs = state["documents"]
+
+        if not filtered_docs:
+            print("---All retrived documents not relevant---")
+            if budget.exhausted(state, config, "num_searchengine"):
+                return "degrade"
+            return "SearchEngine"
+        else:
+            print("---Some retrived documents are relevant---")
+            return "generate"
+
+    def grade_generation_node(state: dict, config):
+        # hai grader chạy song song; verdict được ghi vào state để client đang stream nhận được
+        verdict = grade_generation(
+            hallucination_grader_chain,
+            answer_grader_chain,
+            state["query"],
+            state["generation"],
+            state["documents"],
+        )
+        budget.offer(config, state["generation"], verdict)
+        return {"verdict": verdict}
+
+    def hallucination_and_answer_relevance_check(state: dict, config):
+        verdict = state["verdict"]
+        if verdict == "useful":
+            return verdict
+        # vòng lặp sắp đi vào: sinh lại câu trả lời hoặc tìm thêm bằng SearchEngine
+        loop = "num_hallucination" if verdict == "generate" else "num_searchengine"
+        if budget.exhausted(state, config, loop):
+            return "degrade"
+        return verdict
+
+    workflow = StateGraph(AgentState)
+    workflow.add_node("router", router_node)
+    workflow.add_node("VectorStore", retrieve_node)
+    workflow.add_node("SearchEngine", web_search_node)
+    workflow.add_node("filter_docs", filter_documents_node)
+    workflow.add_node("fallback", fallback_node)
+    workflow.add_node("rag", rag_node)
+    workflow.add_node("grade_generation", grade_generation_node)
+    workflow.add_node("hallucination", hallucination_node)
+    workflow.add_node("degrade", budget.degrade_node)
+
+    workflow.set_entry_point("router")
+    workflow.add_conditional_edges(
+        "router",
+        lambda state: state["route"],
+        {
+            "llm_fallback": "fallback",
+            "VectorStore": "VectorStore",
+            "SearchEngine": "SearchEngine",
+        },
+    )
+
+    workflow.add_edge("VectorStore", "filter_docs")
+    workflow.add_edge("SearchEngine", "filter_docs")
+    workflow.add_conditional_edges(
+        "filter_docs", should_generate, {"SearchEngine": "SearchEngine", "generate": "rag", "degrade": "degrade"}
+    )
+    workflow.add_edge("rag", "grade_generation")
+    workflow.add_conditional_edges(
+        "grade_generation",
+        hallucination_and_answer_relevance_check,
+        {"useful": END, "not useful": "SearchEngine", "generate": "hallucination", "degrade": "degrade"},
+    )
+    workflow.add_edge("hallucination", "rag")
+    workflow.add_edge("degrade", END)
+
+    workflow.add_edge("fallback", END)
+
+    return budget.bind(workflow.compile(debug=False))
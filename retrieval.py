@@ -0,0 +1,469 @@
+import json
+from pathlib import Path
+
+import numpy as np
+
+from ann_index import IVFIndex, ensemble_query_vector
+from category_index import CategoryIndex, reorder_store_by_category
+from document_store import load_document_store
+from embedding_cache import CachedEmbeddings
+from embedding_store import load_embedding_store, load_row_ids, save_embedding_store, store_hash
+from quantization import QuantizedIndex
+from sparse_index import SparseIndex
+
+
+class RetrievalData:
+    """
+    Dense retrieval trên corpus luật với ensemble có trọng số của nhiều SentenceTransformer.
+
+    `legal_data_path` là thư mục embedding store (xem embedding_store.py): mỗi model một ma trận
+    .npy được mở bằng memory mapping, kèm manifest chứa corpus hash để báo lỗi ngay khi
+    embeddings được tạo từ một file corpus khác.
+
+    Store có thể được sắp xếp theo category (category_index.reorder_store_by_category, tự động khi encode lại
+    với laws_grouping_json): mọi phép chấm điểm dùng vị trí dòng trong store, `row_ids` đổi kết quả về
+    dòng corpus trước khi trả về. Khi đó tìm kiếm theo category chỉ chấm điểm các slice emb[start:end]
+    (view trên mmap) thay vì copy emb[rows] ở mỗi query.
+    """
+
+    def __init__(self, legal_dict_json, model_paths, legal_data_path, weighted, top_n=20, range_score=0.2, encode_legal_data_flag=False,
+                 embedding_cache_path=None, ann_index_path=None, nprobe=8, laws_grouping_json=None,
+                 quantized_index_path=None, rescore_k=200):
+        self.legal_dict_json = legal_dict_json
+        # laws_grouping_110225.json: cho phép giới hạn tìm kiếm theo category mà router chọn
+        self.laws_grouping_json = laws_grouping_json
+        self._category_index = None
+        # nếu có embedding_cache_path thì encode_legal_data chỉ encode các điều luật chưa có trong cache
+        self.embedding_cache_path = embedding_cache_path
+        self.legal_data_path = legal_data_path
+        self.model_paths = model_paths
+        self.weighted = weighted
+        self.top_n = top_n
+        self.range_score = range_score
+        self.models = self.load_models(model_paths)
+
+        if encode_legal_data_flag:
+            save_embedding_store(self.legal_data_path, model_paths, self.encode_legal_data(), self.legal_dict_json)
+            if laws_grouping_json is not None:
+                reorder_store_by_category(self.legal_data_path, self.legal_dict_json, laws_grouping_json)
+        self.emb_legal_data, self.emb_legal_norms, self.manifest = load_embedding_store(
+            self.legal_data_path, corpus_path=self.legal_dict_json, model_names=model_paths
+        )
+        # dòng corpus của từng dòng store (None: store theo thứ tự corpus)
+        self.row_ids = load_row_ids(self.legal_data_path, self.manifest)
+        self._store_positions = None
+        # chỉ mục ANN (IVF) tùy chọn, build offline bằng ann_index.build_ann_index
+        self.nprobe = nprobe
+        self.ann_index = None
+        if ann_index_path is not None:
+            self.ann_index = IVFIndex.load(ann_index_path, corpus_hash=store_hash(self.manifest))
+        # embeddings lượng tử hóa (int8 / binary) tùy chọn, build offline bằng quantization.build_quantized_index:
+        # lượt đầu trên vector lượng tử hóa, chỉ `rescore_k` ứng viên được chấm lại bằng float
+        self.rescore_k = rescore_k
+        self.quantized_index = None
+        if quantized_index_path is not None:
+            self.quantized_index = QuantizedIndex.load(quantized_index_path, corpus_hash=store_hash(self.manifest))
+
+    def load_models(self, model_paths):
+        # import tại đây: lớp con dùng model khác (benchmark.OfflineRetrievalData) không cần sentence_transformers
+        from sentence_transformers import SentenceTransformer
+
+        return [SentenceTransformer(model_path) for model_path in model_paths]
+
+    def encode_legal_data(self):
+        with open(self.legal_dict_json, encoding='utf-8') as f:
+            doc_data = json.load(f)
+        contents = [doc["content"] for doc in doc_data]
+        encoders = self.models
+        if self.embedding_cache_path is not None:
+            encoders = [
+                CachedEmbeddings(model, model_name=str(model_path), cache_path=self.embedding_cache_path)
+                for model, model_path in zip(self.models, self.model_paths)
+            ]
+        list_emb_models = [np.asarray(encoder.encode(contents), dtype=np.float32) for encoder in encoders]
+        if self.embedding_cache_path is not None:
+            for model_path, encoder in zip(self.model_paths, encoders):
+                print(f"Embedding cache {model_path}: {encoder.stats()}")
+        return list_emb_models
+
+    def encode_question(self, question_data):
+        return [model.encode(question_data) for model in self.models]
+
+    @staticmethod
+    def cosine_scores(question_emb, emb_legal, emb_norms=None):
+        """Cosine similarity giữa một vector câu hỏi và toàn bộ ma trận corpus (không copy ma trận)."""
+        question_emb = np.asarray(question_emb, dtype=np.float32).reshape(-1)
+        if emb_norms is None:
+            emb_norms = np.linalg.norm(emb_legal, axis=1)
+        denom = np.maximum(np.asarray(emb_norms) * np.linalg.norm(question_emb), 1e-12)
+        return (emb_legal @ question_emb) / denom
+
+    def calculate_cosine_similarity(self, question_embs, list_embed=None):
+        if list_embed is not None:
+            pairs = [(emb_legal, None) for emb_legal in list_embed]
+        else:
+            pairs = list(zip(self.emb_legal_data, self.emb_legal_norms))
+        cos_sim = None
+        for idx, (emb_legal, emb_norms) in enumerate(pairs):
+            scores = self.weighted[idx] * self.cosine_scores(question_embs[idx], emb_legal, emb_norms)
+            cos_sim = scores if cos_sim is None else cos_sim + scores
+        return np.asarray(cos_sim).flatten()
+
+    def calculate_cosine_similarity_rows(self, question_embs, rows):
+        """Giống calculate_cosine_similarity nhưng chỉ chấm điểm các dòng `rows` của corpus."""
+        rows = np.asarray(rows, dtype=np.int64)
+        cos_sim = None
+        for idx, (emb_legal, emb_norms) in enumerate(zip(self.emb_legal_data, self.emb_legal_norms)):
+            scores = self.weighted[idx] * self.cosine_scores(question_embs[idx], emb_legal[rows], emb_norms[rows])
+            cos_sim = scores if cos_sim is None else cos_sim + scores
+        return np.asarray(cos_sim).flatten()
+
+    def calculate_cosine_similarity_slices(self, question_embs, slices):
+        """Giống calculate_cosine_similarity_rows với các dòng là các đoạn [start, end): mỗi đoạn là một view, không copy."""
+        cos_sim = None
+        for idx, (emb_legal, emb_norms) in enumerate(zip(self.emb_legal_data, self.emb_legal_norms)):
+            scores = np.concatenate([
+                self.cosine_scores(question_embs[idx], emb_legal[start:end], emb_norms[start:end])
+                for start, end in slices
+            ])
+            scores = self.weighted[idx] * scores
+            cos_sim = scores if cos_sim is None else cos_sim + scores
+        return np.asarray(cos_sim).flatten()
+
+    def process_predictions(self, cos_sim):
+        # Đảm bảo cos_sim có dạng ít nhất là 1-d array
+        cos_sim = np.atleast_1d(cos_sim)
+        max_score = np.max(cos_sim)
+        # Sử dụng số lượng phần tử tối đa là min(top_n, len(cos_sim))
+        k = min(self.top_n, len(cos_sim))
+        predictions = np.argpartition(cos_sim, len(cos_sim) - k)[-k:]
+        new_scores = cos_sim[predictions]
+        new_predictions = np.where(new_scores >= (max_score - self.range_score))[0]
+        map_ids = predictions[new_predictions]
+        new_scores = new_scores[new_scores >= (max_score - self.range_score)]
+        if new_scores.shape[0] > k:
+            predictions_2 = np.argpartition(new_scores, len(new_scores) - k)[-k:]
+            map_ids = map_ids[predictions_2]
+        return map_ids, new_scores
+
+    @property
+    def document_store(self):
+        # corpus JSON chỉ được parse một lần cho mỗi process, không load lại ở mỗi query
+        return load_document_store(self.legal_dict_json)
+
+    @property
+    def category_index(self):
+        """CategoryIndex theo vị trí dòng trong store."""
+        if self._category_index is None and self.laws_grouping_json is not None:
+            category_index = CategoryIndex.from_grouping(self.laws_grouping_json, self.document_store)
+            if self.row_ids is not None:
+                category_index = category_index.reordered(self.row_ids)
+            self._category_index = category_index
+        return self._category_index
+
+    def category_rows(self, categories):
+        """Các dòng store thuộc `categories` (tên tool router hoặc tên category), None = toàn corpus."""
+        if not categories or self.category_index is None:
+            return None
+        return self.category_index.rows_for(categories)
+
+    def category_slices(self, categories):
+        """Các dòng của category_rows dưới dạng đoạn liên tiếp, None nếu store chưa được sắp xếp theo category."""
+        if not categories or self.category_index is None:
+            return None
+        return self.category_index.slices_for(categories)
+
+    def corpus_rows(self, positions):
+        """Vị trí dòng trong store -> dòng corpus (document store, return_documents)."""
+        return positions if self.row_ids is None else self.row_ids[positions]
+
+    def store_positions(self, rows):
+        """Dòng corpus -> vị trí dòng trong store."""
+        if self.row_ids is None:
+            return rows
+        if self._store_positions is None:
+            positions = np.empty(len(self.row_ids), dtype=np.int64)
+            positions[self.row_ids] = np.arange(len(self.row_ids))
+            self._store_positions = positions
+        return self._store_positions[rows]
+
+    def display_results(self, map_ids):
+        store = self.document_store
+        dup_ans = set()
+        for idx_pred in map_ids:
+            law_id_article = store.law_id(idx_pred)
+            if law_id_article not in dup_ans:
+                dup_ans.add(law_id_article)
+                print(f'Law and Article ID: {law_id_article}')
+                print(f'Text: {store.content(idx_pred)}')
+                print("=" * 80)
+
+    def return_documents(self, map_ids, new_scores=None):
+        """
+        Chuyển kết quả của inference thành danh sách Document (mỗi luật/điều một lần).
+        Điểm của mỗi document được giữ trong metadata["retrieval_score"] để grader dùng lại.
+        """
+        return self.document_store.get_documents(map_ids, scores=new_scores)
+
+    def inference(self, question, list_embed=None, categories=None):
+        question_embs = self.encode_question(question)
+        if list_embed is not None:
+            cos_sim = self.calculate_cosine_similarity(question_embs, list_embed)
+            map_ids, new_scores = self.process_predictions(cos_sim)
+            return map_ids[:5], new_scores[:5]
+        rows = self.category_rows(categories)
+        slices = None
+        candidates = None
+        if self.ann_index is not None:
+            candidates = self.ann_candidates([question_embs], rows)
+        elif self.quantized_index is not None:
+            candidates = self.quantized_index.candidates(question_embs, self.weighted, self.rescore_k, rows)
+        if candidates is not None:
+            rows = candidates
+        elif rows is not None:
+            slices = self.category_slices(categories)
+        if slices is not None:
+            cos_sim = self.calculate_cosine_similarity_slices(question_embs, slices)
+        elif rows is not None:
+            cos_sim = self.calculate_cosine_similarity_rows(question_embs, rows)
+        else:
+            cos_sim = self.calculate_cosine_similarity(question_embs)
+        map_ids, new_scores = self.process_predictions(cos_sim)
+        if rows is not None:
+            # rows tăng dần nên cũng là thứ tự của các slice nối lại
+            map_ids = rows[map_ids]
+        return self.corpus_rows(map_ids[:5]), new_scores[:5]
+
+    def ann_candidates(self, question_embs_list, rows=None):
+        """
+        Hợp các dòng thuộc `nprobe` cụm IVF gần nhất của từng câu hỏi (trong `rows` nếu có), sắp xếp tăng dần.
+        Trả về None khi không có ứng viên nào (các cụm được probe rỗng hoặc không giao với category):
+        khi đó chấm điểm chính xác trên toàn corpus / category thay vì trả về kết quả rỗng.
+        """
+        candidates = np.unique(np.concatenate([
+            self.ann_index.candidates(ensemble_query_vector(question_embs, self.weighted), self.nprobe)
+            for question_embs in question_embs_list
+        ]))
+        if rows is not None:
+            candidates = np.intersect1d(candidates, rows, assume_unique=True)
+        return candidates if len(candidates) else None
+
+    def calculate_cosine_similarity_batch(self, question_embs, rows=None, slices=None):
+        """
+        Cosine similarity của nhiều câu hỏi với corpus bằng một phép nhân ma trận cho mỗi model.
+
+        :param question_embs: danh sách ma trận (num_queries, dim), mỗi model một ma trận.
+        :param rows: nếu có, chỉ chấm điểm các dòng này của store (ví dụ các ứng viên của quantized_index).
+        :param slices: nếu có, chỉ chấm điểm các đoạn [start, end) này (các dòng của category), không copy.
+        :return: ma trận điểm (num_queries, num_docs) đã cộng có trọng số giữa các model.
+        """
+        cos_sim = None
+        for idx, (emb_legal, emb_norms) in enumerate(zip(self.emb_legal_data, self.emb_legal_norms)):
+            queries = np.atleast_2d(np.asarray(question_embs[idx], dtype=np.float32))
+            query_norms = np.linalg.norm(queries, axis=1)
+            if slices is not None:
+                parts = [(emb_legal[start:end], emb_norms[start:end]) for start, end in slices]
+            elif rows is not None:
+                parts = [(emb_legal[rows], emb_norms[rows])]
+            else:
+                parts = [(emb_legal, emb_norms)]
+            scores = np.concatenate([
+                (queries @ part.T) / np.maximum(np.outer(query_norms, part_norms), 1e-12)
+                for part, part_norms in parts
+            ], axis=1)
+            scores = self.weighted[idx] * scores
+            cos_sim = scores if cos_sim is None else cos_sim + scores
+        return cos_sim
+
+    def process_predictions_batch(self, cos_sim, per_query_k=5):
+        """
+        Áp dụng logic top_n / range_score của process_predictions cho từng câu hỏi, vector hóa bằng
+        argpartition theo trục 1. Kết quả của mỗi câu hỏi được sắp xếp theo điểm giảm dần.
+
+        :return: danh sách (map_ids, new_scores) cho từng câu hỏi.
+        """
+        cos_sim = np.atleast_2d(cos_sim)
+        num_docs = cos_sim.shape[1]
+        k = min(self.top_n, num_docs)
+        predictions = np.argpartition(cos_sim, num_docs - k, axis=1)[:, -k:]
+        new_scores = np.take_along_axis(cos_sim, predictions, axis=1)
+        # sắp xếp top-k của mỗi câu hỏi theo điểm giảm dần
+        order = np.argsort(-new_scores, axis=1)
+        predictions = np.take_along_axis(predictions, order, axis=1)
+        new_scores = np.take_along_axis(new_scores, order, axis=1)
+        max_scores = new_scores[:, :1]
+        keep = new_scores >= (max_scores - self.range_score)
+
+        results = []
+        for row in range(cos_sim.shape[0]):
+            mask = keep[row]
+            results.append((predictions[row][mask][:per_query_k], new_scores[row][mask][:per_query_k]))
+        return results
+
+    @staticmethod
+    def reciprocal_rank_fusion(results, rrf_k=60):
+        """
+        Gộp kết quả của nhiều câu hỏi thành một danh sách duy nhất (không trùng lặp) bằng
+        reciprocal rank fusion: score(d) = sum(1 / (rrf_k + rank_q(d))).
+
+        :return: (map_ids, new_scores) theo thứ tự RRF giảm dần, new_scores là cosine cao nhất của document.
+        """
+        fused = {}
+        best_scores = {}
+        for map_ids, new_scores in results:
+            for rank, (doc_id, score) in enumerate(zip(map_ids, new_scores), start=1):
+                doc_id = int(doc_id)
+                fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (rrf_k + rank)
+                best_scores[doc_id] = max(best_scores.get(doc_id, -np.inf), float(score))
+        ranked = sorted(fused, key=lambda doc_id: (-fused[doc_id], -best_scores[doc_id]))
+        return (np.array(ranked, dtype=np.int64),
+                np.array([best_scores[doc_id] for doc_id in ranked], dtype=np.float32))
+
+    def encode_questions(self, questions):
+        return [np.asarray(model.encode(list(questions)), dtype=np.float32) for model in self.models]
+
+    def inference_batch(self, questions, per_query_k=5, rrf_k=60, categories=None):
+        """
+        Truy vấn nhiều câu hỏi cùng lúc (ví dụ các query_transformers): mỗi model encode tất cả câu hỏi
+        trong một batch, chấm điểm bằng một phép nhân ma trận, rồi gộp kết quả bằng reciprocal rank fusion.
+        `categories` (các route của router) giới hạn việc chấm điểm vào các dòng thuộc các category đó.
+        """
+        if not questions:
+            return np.array([], dtype=np.int64), np.array([], dtype=np.float32)
+        question_embs = self.encode_questions(questions)
+        rows = self.category_rows(categories)
+        slices = None
+        candidates = None
+        # hợp các ứng viên của từng câu hỏi, tổng có trọng số chính xác chỉ tính trên các dòng này
+        if self.ann_index is not None:
+            candidates = self.ann_candidates(
+                [[embs[i] for embs in question_embs] for i in range(len(questions))], rows
+            )
+        elif self.quantized_index is not None:
+            candidates = self.quantized_index.candidates(question_embs, self.weighted, self.rescore_k, rows)
+        if candidates is not None:
+            rows = candidates
+        elif rows is not None:
+            slices = self.category_slices(categories)
+        cos_sim = self.calculate_cosine_similarity_batch(question_embs, rows, slices)
+        results = self.process_predictions_batch(cos_sim, per_query_k=per_query_k)
+        if rows is not None:
+            results = [(rows[map_ids], new_scores) for map_ids, new_scores in results]
+        results = [(self.corpus_rows(map_ids), new_scores) for map_ids, new_scores in results]
+        return self.reciprocal_rank_fusion(results, rrf_k=rrf_k)
+
+
+class HybridRetrievalData(RetrievalData):
+    """
+    RetrievalData kết hợp dense với chỉ mục sparse BM25 n-gram ký tự (sparse_index.py), giữ nguyên
+    interface `inference(question) -> (map_ids, new_scores)`.
+
+    sparse_mode:
+    - "hybrid": xếp hạng theo dense + sparse_weight * (BM25 / BM25 lớn nhất), trên toàn corpus.
+    - "prefilter": BM25 chọn trước `prefilter_k` ứng viên, chỉ chấm điểm dense trên các ứng viên đó.
+    - "dense": chỉ dùng dense như RetrievalData.
+
+    Ở cả hai chế độ sparse, cửa sổ range_score và new_scores trả về luôn là cosine dense (cùng thang điểm với
+    RetrievalData, nên ScoreGate / metadata["retrieval_score"] không bị lệch), điểm fused chỉ dùng để xếp hạng.
+    "hybrid" và "prefilter" chấm điểm trên toàn corpus (hoặc các dòng của category) và không dùng
+    ann_index / quantized_index; ứng viên của hai chỉ mục đó chỉ áp dụng cho sparse_mode="dense".
+    """
+
+    def __init__(self, legal_dict_json, model_paths, legal_data_path, weighted, sparse_index_path,
+                 sparse_mode="hybrid", sparse_weight=0.3, prefilter_k=1000, **kwargs):
+        super().__init__(legal_dict_json, model_paths, legal_data_path, weighted, **kwargs)
+        self.sparse_mode = sparse_mode
+        self.sparse_weight = sparse_weight
+        self.prefilter_k = prefilter_k
+        if Path(sparse_index_path).exists():
+            self.sparse_index = SparseIndex.load(sparse_index_path, corpus_path=legal_dict_json)
+        else:
+            self.sparse_index = SparseIndex.build_from_json(legal_dict_json)
+            self.sparse_index.save(sparse_index_path, corpus_path=legal_dict_json)
+
+    def hybrid_scores(self, question, question_embs):
+        """(điểm fused để xếp hạng, cosine dense) trên toàn corpus."""
+        dense = self.calculate_cosine_similarity(question_embs)
+        # điểm BM25 theo dòng corpus -> theo vị trí dòng trong store
+        sparse = self.sparse_index.score(question)
+        if self.row_ids is not None:
+            sparse = sparse[self.row_ids]
+        max_sparse = sparse.max() if len(sparse) else 0.0
+        if max_sparse > 0:
+            return dense + self.sparse_weight * (sparse / max_sparse), dense
+        return dense, dense
+
+    def process_hybrid_predictions(self, fused, dense):
+        """top_n theo điểm fused (giảm dần); cửa sổ range_score và điểm trả về theo cosine dense."""
+        fused = np.atleast_1d(fused)
+        k = min(self.top_n, len(fused))
+        predictions = np.argpartition(fused, len(fused) - k)[-k:]
+        predictions = predictions[np.argsort(-fused[predictions], kind="stable")]
+        new_scores = np.atleast_1d(dense)[predictions]
+        keep = new_scores >= (new_scores.max() - self.range_score)
+        return predictions[keep], new_scores[keep]
+
+    def hybrid_predictions(self, question, question_embs, rows=None):
+        """
+        (map_ids theo vị trí dòng trong store, cosine dense) của một câu hỏi ở chế độ "hybrid" / "prefilter",
+        giới hạn trong `rows` (các dòng của category) nếu có.
+        """
+        if self.sparse_mode == "prefilter":
+            candidates, _ = self.sparse_index.top_k(question, self.prefilter_k)
+            candidates = self.store_positions(candidates)
+            if rows is not None:
+                candidates = candidates[np.isin(candidates, rows)]
+            if len(candidates) == 0:
+                # không có n-gram nào khớp: quay về dense trên toàn corpus (hoặc category)
+                candidates = rows
+            if candidates is None:
+                cos_sim = self.calculate_cosine_similarity(question_embs)
+                return self.process_predictions(cos_sim)
+            cos_sim = self.calculate_cosine_similarity_rows(question_embs, candidates)
+            map_ids, new_scores = self.process_predictions(cos_sim)
+            return candidates[map_ids], new_scores
+        fused, dense = self.hybrid_scores(question, question_embs)
+        if rows is not None:
+            map_ids, new_scores = self.process_hybrid_predictions(fused[rows], dense[rows])
+            return rows[map_ids], new_scores
+        return self.process_hybrid_predictions(fused, dense)
+
+    def inference(self, question, list_embed=None, categories=None):
+        if list_embed is not None or self.sparse_mode == "dense":
+            return super().inference(question, list_embed, categories)
+        question_embs = self.encode_question(question)
+        map_ids, new_scores = self.hybrid_predictions(question, question_embs, self.category_rows(categories))
+        return self.corpus_rows(map_ids[:5]), new_scores[:5]
+
+    def inference_batch(self, questions, per_query_k=5, rrf_k=60, categories=None):
+        """
+        Như RetrievalData.inference_batch: các câu hỏi được encode trong một batch, nhưng điểm BM25 phụ thuộc
+        từng câu hỏi nên "hybrid" / "prefilter" xếp hạng từng câu hỏi một rồi gộp bằng reciprocal rank fusion.
+        """
+        if self.sparse_mode == "dense" or not questions:
+            return super().inference_batch(questions, per_query_k, rrf_k, categories)
+        question_embs = self.encode_questions(questions)
+        rows = self.category_rows(categories)
+        results = []
+        for i, question in enumerate(questions):
+            map_ids, new_scores = self.hybrid_predictions(question, [embs[i] for embs in question_embs], rows)
+            if self.sparse_mode == "prefilter":
+                # process_predictions không sắp xếp kết quả, RRF cần thứ hạng theo điểm giảm dần
+                # ("hybrid" đã xếp theo điểm fused)
+                order = np.argsort(-new_scores, kind="stable")
+                map_ids, new_scores = map_ids[order], new_scores[order]
+            results.append((self.corpus_rows(map_ids[:per_query_k]), new_scores[:per_query_k]))
+        return self.reciprocal_rank_fusion(results, rrf_k=rrf_k)
+
+if __name__ == "__main__":
+    model_paths = ["/home/hoangphuc/Nhap/RAG_Pb/saved_model_finetune_mlm_lms_round2"]
+    legal_dict_json = "/home/hoangphuc/Nhap/RAG_Pb/generated_data/full_corpus_110225_with_metadata_new.json"
+    legal_data_path = "/home/hoangphuc/Nhap/RAG_Pb/generated_data/vectorDB_full_corpus_110225"
+    # weighted = [0.3, 0.2, 0.5]
+    weighted = [1.0]
+
+    laws_grouping_json = "/home/hoangphuc/Nhap/RAG_Pb/laws_grouping_110225.json"
+
+    retrieval = RetrievalData(legal_dict_json, model_paths, legal_data_path, weighted, encode_legal_data_flag=True,
+                              laws_grouping_json=laws_grouping_json)
+    print(retrieval.category_index.counts())
@@ -0,0 +1,72 @@
+from functools import lru_cache
+
+import numpy as np
+
+
+@lru_cache(maxsize=None)
+def get_embedding_model(model_name="intfloat/multilingual-e5-large"):
+    """Load HuggingFaceEmbeddings một lần cho mỗi process."""
+    from langchain_community.embeddings import HuggingFaceEmbeddings
+
+    return HuggingFaceEmbeddings(model_name=model_name)
+
+
+def _normalize_rows(matrix):
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+def group_top_k_neighbours(embeddings, group_keys, k=5):
+    """
+    Tìm k láng giềng gần nhất (cosine) của từng câu trong cùng một nhóm (cùng một điều).
+
+    :param embeddings: ma trận (num_sentences, dim).
+    :param group_keys: khóa nhóm của từng câu, cùng độ dài với embeddings.
+    :param k: số láng giềng tối đa của mỗi câu (không tính chính nó).
+    :return: danh sách, mỗi phần tử là list các (index, score) sắp xếp theo score giảm dần.
+    """
+    normalized = _normalize_rows(embeddings)
+    groups = {}
+    for idx, key in enumerate(group_keys):
+        groups.setdefault(key, []).append(idx)
+
+    neighbours = [[] for _ in range(len(group_keys))]
+    for members in groups.values():
+        if len(members) < 2:
+            continue
+        members = np.asarray(members)
+        group_emb = normalized[members]
+        sim = group_emb @ group_emb.T
+        # loại chính câu đó ra khỏi kết quả theo index, không so sánh chuỗi
+        np.fill_diagonal(sim, -np.inf)
+        top = min(k, len(members) - 1)
+        candidates = np.argpartition(-sim, top - 1, axis=1)[:, :top]
+        candidate_scores = np.take_along_axis(sim, candidates, axis=1)
+        order = np.argsort(-candidate_scores, axis=1)
+        candidates = np.take_along_axis(candidates, order, axis=1)
+        candidate_scores = np.take_along_axis(candidate_scores, order, axis=1)
+        for row, member in enumerate(members):
+            neighbours[member] = [
+                (int(members[col]), float(score)) for col, score in zip(candidates[row], candidate_scores[row])
+            ]
+    return neighbours
+
+
+class SemanticNeighbourEngine:
+    """
+    Tìm các câu gần nghĩa trong cùng một điều: encode tất cả các câu một lần (một batch),
+    rồi tính top-k cosine trong từng nhóm bằng phép nhân ma trận, không cần tạo Chroma collection.
+    """
+
+    def __init__(self, embed_model=None, k=5):
+        self.embed_model = embed_model if embed_model is not None else get_embedding_model()
+        self.k = k
+
+    def encode(self, texts):
+        return np.asarray(self.embed_model.embed_documents(list(texts)), dtype=np.float32)
+
+    def neighbours(self, texts, group_keys):
+        if not texts:
+            return []
+        return group_top_k_neighbours(self.encode(texts), group_keys, k=self.k)
@@ -0,0 +1,555 @@
+"""
+Serving bất đồng bộ nhiều session cho LangGraph app (app.py).
+
+    python server.py --http 8000                 # POST /chat {"session_id", "query"}, GET /stats
+                                                 # POST /chat/stream: NDJSON event token / retraction / verdict
+                                                 # GET /metrics: thời gian node, lời gọi LLM, token (Prometheus)
+    python server.py --stdin                     # mỗi dòng stdin một request JSON, kết quả JSONL ra stdout
+    python server.py --stub --load-test 200      # load test local với LLM / search giả
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from uuid import uuid4
+
+from answer_stream import astream_answer
+from chat_history import HistoryManager
+from instrumentation import WorkflowInstrumentation
+
+
+class SessionStore:
+    """
+    Lịch sử hội thoại theo session, trong bộ nhớ:
+    - tối đa `max_sessions` session, bỏ session dùng lâu nhất (LRU) khi vượt quá,
+    - session không hoạt động quá `ttl` giây bị xóa,
+    - mỗi session là một chat_history.ChatHistory (lưu gọn) do `history_manager` quản lý: chỉ giữ các lượt
+      gần nhất trong budget token, các lượt cũ hơn được gộp vào bản tóm tắt (hoặc bỏ nếu không có summarizer).
+    """
+
+    def __init__(self, max_sessions=1000, ttl=3600, history_manager=None):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.history_manager = history_manager or HistoryManager()
+        self._sessions = OrderedDict()
+        self.evictions = 0
+
+    def _expire(self, now):
+        while self._sessions:
+            session_id, (last_used, _) = next(iter(self._sessions.items()))
+            if now - last_used <= self.ttl:
+                break
+            del self._sessions[session_id]
+            self.evictions += 1
+
+    def get(self, session_id):
+        """ChatHistory của session (tạo mới nếu chưa có)."""
+        now = time.monotonic()
+        self._expire(now)
+        _, history = self._sessions.pop(session_id, (now, None))
+        if history is None:
+            history = self.history_manager.new_session()
+        self._sessions[session_id] = (now, history)
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+            self.evictions += 1
+        return history
+
+    def messages(self, session_id):
+        """chat_history cho workflow, dạng list {"human", "ai"} như app.py (lượt đầu là bản tóm tắt nếu có)."""
+        return self.history_manager.messages(self.get(session_id))
+
+    def append(self, session_id, query, response):
+        """
+        Ghi một lượt, chưa tóm tắt; trả về ChatHistory để gọi `compact` (lời gọi LLM) ngoài event loop.
+        Lượt không có câu trả lời (response None) không được ghi, trả về None.
+        """
+        if response is None:
+            return None
+        return self.history_manager.append(self.get(session_id), {"human": query, "ai": response}, compact=False)
+
+    async def compact(self, history):
+        """
+        Tóm tắt `history` trong thread riêng. Bị cancel thì vẫn chờ thread chạy xong rồi mới ném
+        CancelledError, để lock của session chỉ được trả khi không còn ai sửa history.
+        """
+        if history is None or not self.history_manager.needs_compaction(history):
+            return False
+        worker = asyncio.ensure_future(asyncio.to_thread(self.history_manager.compact, history))
+        try:
+            return await asyncio.shield(worker)
+        except asyncio.CancelledError:
+            await asyncio.wait({worker})
+            raise
+
+    def __len__(self):
+        return len(self._sessions)
+
+
+class Overloaded(Exception):
+    pass
+
+
+class GraphServer:
+    """
+    Chạy compiled workflow bằng `ainvoke` cho nhiều client cùng lúc:
+    - tối đa `max_concurrency` request chạy đồng thời, các request khác chờ trong hàng đợi,
+    - hàng đợi dài quá `max_queue` thì từ chối ngay (Overloaded) thay vì để client chờ mãi,
+    - request bị hủy (client ngắt kết nối) được cancel ngay cả khi còn đang chờ trong hàng đợi.
+      Node đồng bộ đang chạy trong thread pool của LangGraph sẽ chạy nốt nhưng kết quả bị bỏ.
+    - các request cùng session chạy tuần tự để lịch sử không bị ghi xen kẽ.
+    - lịch sử được tóm tắt (lời gọi LLM) trong task nền sau khi trả kết quả, ngoài request_timeout;
+      task giữ lock của session đến khi tóm tắt xong, lỗi tóm tắt chỉ được ghi log (history giữ nguyên).
+    """
+
+    def __init__(self, app, sessions=None, max_concurrency=8, max_queue=100, request_timeout=None,
+                 instrumentation=None):
+        self.app = app
+        # instrumentation.WorkflowInstrumentation đã gắn vào app, dùng cho GET /metrics
+        self.instrumentation = instrumentation
+        self.sessions = sessions if sessions is not None else SessionStore()
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.request_timeout = request_timeout
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._session_locks = {}
+        self.stats = {"active": 0, "queued": 0, "completed": 0, "failed": 0, "cancelled": 0, "rejected": 0,
+                      "compaction_errors": 0}
+        self._compactions = set()
+        self.latencies = []
+        self.first_token_latencies = []
+
+    def _acquire_session_lock(self, session_id):
+        # lock theo session kèm số request đang dùng, xóa khi không còn request nào để dict không phình ra
+        lock, users = self._session_locks.get(session_id, (None, 0))
+        if lock is None:
+            lock = asyncio.Lock()
+        self._session_locks[session_id] = (lock, users + 1)
+        return lock
+
+    def _release_session_lock(self, session_id):
+        lock, users = self._session_locks[session_id]
+        if users <= 1:
+            del self._session_locks[session_id]
+        else:
+            self._session_locks[session_id] = (lock, users - 1)
+
+    @asynccontextmanager
+    async def _slot(self, session_id):
+        """Chờ lượt chạy (lock của session rồi semaphore chung), yield lịch sử hội thoại của session."""
+        if self.stats["queued"] >= self.max_queue:
+            self.stats["rejected"] += 1
+            raise Overloaded(f"queue is full ({self.max_queue} waiting requests)")
+
+        lock = self._acquire_session_lock(session_id)
+        self.stats["queued"] += 1
+        acquired = False
+        try:
+            async with lock, self._semaphore:
+                acquired = True
+                self.stats["queued"] -= 1
+                self.stats["active"] += 1
+                try:
+                    # request tiếp theo của cùng session chỉ chạy khi lượt này đã được ghi vào lịch sử
+                    yield self.sessions.messages(session_id)
+                finally:
+                    self.stats["active"] -= 1
+        except asyncio.CancelledError:
+            self.stats["cancelled"] += 1
+            raise
+        except Exception:
+            self.stats["failed"] += 1
+            raise
+        finally:
+            if not acquired:
+                self.stats["queued"] -= 1
+            self._release_session_lock(session_id)
+
+    async def _compact_session(self, session_id, lock, history):
+        try:
+            async with lock:
+                await self.sessions.compact(history)
+        except Exception as e:
+            self.stats["compaction_errors"] += 1
+            print(f"history compaction failed for session {session_id}: {e!r}", file=sys.stderr)
+        finally:
+            self._release_session_lock(session_id)
+
+    def _schedule_compaction(self, session_id, history):
+        """Tóm tắt lịch sử trong task nền, task chờ lock của session như một request của session đó."""
+        if history is None or not self.sessions.history_manager.needs_compaction(history):
+            return
+        lock = self._acquire_session_lock(session_id)
+        task = asyncio.create_task(self._compact_session(session_id, lock, history))
+        self._compactions.add(task)
+        task.add_done_callback(self._compactions.discard)
+
+    async def drain(self):
+        """Chờ các task tóm tắt lịch sử đang chạy (trước khi dừng server)."""
+        while self._compactions:
+            await asyncio.gather(*self._compactions, return_exceptions=True)
+
+    def _finish(self, request, session_id, start, generation, documents, degraded=None):
+        elapsed = time.perf_counter() - start
+        self.stats["completed"] += 1
+        self.latencies.append(elapsed)
+        return {
+            "id": request.get("id"),
+            "session_id": session_id,
+            "generation": generation if generation is None or isinstance(generation, str) else str(generation),
+            "documents": [
+                {"content": doc.page_content, "source": doc.metadata.get("source")}
+                for doc in documents or []
+            ],
+            "elapsed": round(elapsed, 4),
+            # khác None khi workflow hết budget và trả về câu trả lời tốt nhất đã có (budget.RequestBudget)
+            "degraded": degraded,
+        }
+
+    async def handle(self, request):
+        """
+        request: {"query": str, "session_id": str (tùy chọn), "id": (tùy chọn)}
+        :return: {"id", "session_id", "generation", "documents", "elapsed", "degraded"}
+        """
+        session_id = request.get("session_id") or str(uuid4())
+        query = request["query"]
+        start = time.perf_counter()
+        async with self._slot(session_id) as history:
+            result = await asyncio.wait_for(
+                self.app.ainvoke({"query": query, "chat_history": history}),
+                timeout=self.request_timeout,
+            )
+            self._schedule_compaction(session_id, self.sessions.append(session_id, query, result.get("generation")))
+        return self._finish(request, session_id, start, result.get("generation"), result.get("documents"),
+                            result.get("degraded"))
+
+    async def stream(self, request):
+        """
+        Như `handle` nhưng yield các event của answer_stream.astream_answer (token, retraction)
+        ngay khi có; event cuối là verdict kèm các field của `handle`.
+        """
+        session_id = request.get("session_id") or str(uuid4())
+        query = request["query"]
+        start = time.perf_counter()
+        first_token = True
+        async with self._slot(session_id) as history:
+            # request_timeout tính cho cả luồng event (asyncio.timeout chỉ có từ Python 3.11): mỗi event
+            # được đợi bằng wait_for với thời gian còn lại tới deadline
+            loop = asyncio.get_running_loop()
+            deadline = None if self.request_timeout is None else loop.time() + self.request_timeout
+            events = astream_answer(self.app, {"query": query, "chat_history": history})
+            try:
+                while True:
+                    remaining = None if deadline is None else max(deadline - loop.time(), 0)
+                    try:
+                        event = await asyncio.wait_for(events.__anext__(), timeout=remaining)
+                    except StopAsyncIteration:
+                        break
+                    if event["event"] == "token" and first_token:
+                        first_token = False
+                        self.first_token_latencies.append(time.perf_counter() - start)
+                    if event["event"] == "verdict":
+                        self._schedule_compaction(session_id,
+                                                  self.sessions.append(session_id, query, event["generation"]))
+                        yield {**self._finish(request, session_id, start, event["generation"], event["documents"],
+                                              event["degraded"]),
+                               "event": "verdict", "verdict": event["verdict"]}
+                    else:
+                        yield {"id": request.get("id"), **event}
+            finally:
+                await events.aclose()
+
+    def snapshot(self):
+        def percentile(values, p):
+            values = sorted(values)
+            return round(values[min(len(values) - 1, int(p * len(values)))], 4) if values else None
+        return {**self.stats, "sessions": len(self.sessions), "session_evictions": self.sessions.evictions,
+                "p50": percentile(self.latencies, 0.5), "p95": percentile(self.latencies, 0.95),
+                "first_token_p50": percentile(self.first_token_latencies, 0.5)}
+
+
+# ======================= HTTP ======================= #
+_HTTP_STATUS = {200: "OK", 400: "Bad Request", 404: "Not Found", 499: "Client Closed Request",
+                500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+async def _write_json(writer, status, payload):
+    body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    writer.write(
+        f"HTTP/1.1 {status} {_HTTP_STATUS[status]}\r\nContent-Type: application/json; charset=utf-8\r\n"
+        f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode("ascii") + body
+    )
+    await writer.drain()
+
+
+async def _run_cancellable(coro, reader):
+    """Chạy `coro`, hủy nếu client đóng kết nối (EOF hoặc lỗi đọc như ConnectionResetError) trước khi có kết quả."""
+    task = asyncio.create_task(coro)
+    disconnect = asyncio.create_task(reader.read(1))
+    try:
+        await asyncio.wait({task, disconnect}, return_when=asyncio.FIRST_COMPLETED)
+        if task.done():
+            return task.result()
+        if disconnect.exception() is None and disconnect.result() != b"":
+            # client gửi thêm dữ liệu chứ không đóng kết nối
+            return await task
+        return None
+    finally:
+        # cả khi lần đọc lỗi hoặc chính handler bị hủy: không để graph tiếp tục chạy cho một client đã đi
+        disconnect.cancel()
+        if not task.done():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+
+async def _write_event_stream(server, request, writer):
+    """Trả các event của server.stream dạng NDJSON, mỗi event được gửi ngay khi có."""
+    headers_sent = False
+    try:
+        async for event in server.stream(request):
+            if not headers_sent:
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/x-ndjson; charset=utf-8\r\n"
+                             b"Connection: close\r\n\r\n")
+                headers_sent = True
+            writer.write(json.dumps(event, ensure_ascii=False).encode("utf-8") + b"\n")
+            await writer.drain()
+    except Overloaded as e:
+        await _write_json(writer, 503, {"error": str(e)})
+    except Exception as e:
+        if not headers_sent:
+            await _write_json(writer, 500, {"error": repr(e)})
+        else:
+            writer.write(json.dumps({"event": "error", "error": repr(e)}).encode("utf-8") + b"\n")
+            await writer.drain()
+
+
+async def _http_client(server, reader, writer):
+    try:
+        request_line = await reader.readline()
+        if not request_line:
+            return
+        method, path, _ = request_line.decode("latin-1").split(" ", 2)
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        if method == "GET" and path == "/stats":
+            await _write_json(writer, 200, server.snapshot())
+            return
+        if method == "GET" and path == "/metrics" and server.instrumentation is not None:
+            body = server.instrumentation.render_metrics().encode("utf-8")
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                         + f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode("ascii") + body)
+            await writer.drain()
+            return
+        if method != "POST" or path not in ("/chat", "/chat/stream"):
+            await _write_json(writer, 404, {"error": "not found"})
+            return
+        try:
+            body = await reader.readexactly(int(headers.get("content-length", 0)))
+            request = json.loads(body or b"{}")
+            request["query"]
+        except (ValueError, KeyError, asyncio.IncompleteReadError):
+            await _write_json(writer, 400, {"error": "expected JSON body with 'query'"})
+            return
+        if path == "/chat/stream":
+            await _run_cancellable(_write_event_stream(server, request, writer), reader)
+            return
+        try:
+            result = await _run_cancellable(server.handle(request), reader)
+        except Overloaded as e:
+            await _write_json(writer, 503, {"error": str(e)})
+            return
+        except Exception as e:
+            await _write_json(writer, 500, {"error": repr(e)})
+            return
+        if result is not None:
+            await _write_json(writer, 200, result)
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve_http(server, host="127.0.0.1", port=8000):
+    http_server = await asyncio.start_server(lambda r, w: _http_client(server, r, w), host, port)
+    print(f"Serving on http://{host}:{port} (POST /chat, POST /chat/stream, GET /stats)", file=sys.stderr)
+    async with http_server:
+        await http_server.serve_forever()
+
+
+# ======================= stdin JSONL ======================= #
+async def serve_stdin(server):
+    """
+    Mỗi dòng stdin: {"id", "session_id", "query", "stream" (tùy chọn)} hoặc {"cancel": id}. Mỗi kết quả
+    là một dòng JSON trên stdout (theo thứ tự hoàn thành); với "stream": true thì mỗi event token /
+    retraction / verdict là một dòng. Kết thúc khi stdin đóng và mọi request đã xong.
+    """
+    loop = asyncio.get_running_loop()
+    tasks = {}
+
+    async def run(request):
+        try:
+            if request.get("stream"):
+                async for event in server.stream(request):
+                    print(json.dumps(event, ensure_ascii=False), flush=True)
+                return
+            output = await server.handle(request)
+        except asyncio.CancelledError:
+            output = {"id": request.get("id"), "error": "cancelled"}
+        except Exception as e:
+            output = {"id": request.get("id"), "error": repr(e)}
+        finally:
+            tasks.pop(request.get("id"), None)
+        print(json.dumps(output, ensure_ascii=False), flush=True)
+
+    while True:
+        line = await loop.run_in_executor(None, sys.stdin.readline)
+        if not line:
+            break
+        if not line.strip():
+            continue
+        try:
+            request = json.loads(line)
+        except ValueError:
+            print(json.dumps({"error": "invalid JSON"}), flush=True)
+            continue
+        if "cancel" in request:
+            task = tasks.get(request["cancel"])
+            if task is not None:
+                task.cancel()
+            continue
+        request.setdefault("id", str(uuid4()))
+        tasks[request["id"]] = asyncio.create_task(run(request))
+    if tasks:
+        await asyncio.gather(*tasks.values(), return_exceptions=True)
+    await server.drain()
+
+
+# ======================= stub + load test ======================= #
+def build_stub_app(llm_latency=0.05, search_latency=0.02, retract_first=False):
+    """
+    Graph giả cùng hình dạng với app.py (router -> retrieve -> rag -> grade_generation), search chỉ là
+    asyncio.sleep, rag dùng chat model giả có streaming. `retract_first=True`: câu trả lời đầu tiên bị
+    grader loại để thử event retraction.
+    """
+    from typing import TypedDict
+
+    from langchain_core.documents import Document
+    from langchain_core.language_models.fake_chat_models import FakeListChatModel
+    from langgraph.graph import END, StateGraph
+
+    class StubState(TypedDict):
+        query: str
+        chat_history: list
+        generation: str
+        documents: list
+        verdict: str
+
+    async def retrieve_node(state):
+        await asyncio.sleep(search_latency)
+        return {"documents": [Document(page_content=f"doc for {state['query']}", metadata={"source": "stub"})]}
+
+    async def rag_node(state):
+        answer = f"answer #{len(state['chat_history']) + 1} to: {state['query']}"
+        llm = FakeListChatModel(responses=[answer], sleep=llm_latency / len(answer))
+        # astream để token được phát dần như LLM thật (ainvoke của model giả không có độ trễ)
+        return {"generation": "".join([chunk.content async for chunk in llm.astream(state["query"])])}
+
+    async def grade_generation_node(state):
+        # hai grader chạy song song nên chỉ tốn thời gian của một lời gọi
+        await asyncio.sleep(llm_latency)
+        return {"verdict": "generate" if retract_first and not state.get("verdict") else "useful"}
+
+    async def route(state):
+        await asyncio.sleep(llm_latency)
+        return "VectorStore"
+
+    workflow = StateGraph(StubState)
+    workflow.add_node("VectorStore", retrieve_node)
+    workflow.add_node("rag", rag_node)
+    workflow.add_node("grade_generation", grade_generation_node)
+    workflow.set_conditional_entry_point(route, {"VectorStore": "VectorStore"})
+    workflow.add_edge("VectorStore", "rag")
+    workflow.add_edge("rag", "grade_generation")
+    workflow.add_conditional_edges("grade_generation", lambda state: state["verdict"],
+                                   {"useful": END, "generate": "rag"})
+    return workflow.compile()
+
+
+async def load_test(server, num_requests=200, num_sessions=20, cancel_ratio=0.0):
+    async def one(i):
+        request = {"id": i, "session_id": f"session-{i % num_sessions}", "query": f"question {i}"}
+        task = asyncio.create_task(server.handle(request))
+        if cancel_ratio and i % int(1 / cancel_ratio) == 0:
+            await asyncio.sleep(0)
+            task.cancel()
+        try:
+            await task
+        except (asyncio.CancelledError, Overloaded):
+            pass
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(num_requests)))
+    await server.drain()
+    elapsed = time.perf_counter() - start
+    print(json.dumps({**server.snapshot(), "elapsed": round(elapsed, 3),
+                      "qps": round(server.stats["completed"] / elapsed, 1)}))
+
+
+def load_app(spec):
+    module_name, _, attr = spec.partition(":")
+    module = __import__(module_name)
+    return getattr(module, attr or "app")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Async multi-session server for the LangGraph app")
+    parser.add_argument("--app", default="app:app", help="module:attribute của compiled workflow")
+    parser.add_argument("--stub", action="store_true", help="dùng graph giả (không cần LLM / search)")
+    parser.add_argument("--http", type=int, default=None, metavar="PORT")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--stdin", action="store_true")
+    parser.add_argument("--load-test", type=int, default=None, metavar="N")
+    parser.add_argument("--max-concurrency", type=int, default=8)
+    parser.add_argument("--max-queue", type=int, default=100)
+    parser.add_argument("--max-sessions", type=int, default=1000)
+    parser.add_argument("--session-ttl", type=float, default=3600)
+    parser.add_argument("--history-tokens", type=int, default=2000, help="budget token của chat_history mỗi session")
+    parser.add_argument("--request-timeout", type=float, default=None)
+    parser.add_argument("--trace", default="./logs/workflow_trace.jsonl", help="file JSONL ghi trace của từng request")
+    args = parser.parse_args()
+
+    async def main():
+        graph = build_stub_app() if args.stub else load_app(args.app)
+        # summarizer của app (app.history_manager) nếu có, không thì chỉ giữ cửa sổ các lượt gần nhất
+        app_history = None if args.stub else getattr(sys.modules[args.app.partition(":")[0]], "history_manager", None)
+        summarizer = app_history.summarizer if app_history is not None else None
+        instrumentation = WorkflowInstrumentation(trace_path=args.trace)
+        server = GraphServer(
+            instrumentation.instrument(graph),
+            SessionStore(max_sessions=args.max_sessions, ttl=args.session_ttl,
+                         history_manager=HistoryManager(summarizer, max_tokens=args.history_tokens)),
+            max_concurrency=args.max_concurrency,
+            max_queue=args.max_queue,
+            request_timeout=args.request_timeout,
+            instrumentation=instrumentation,
+        )
+        if args.load_test:
+            await load_test(server, args.load_test)
+        elif args.stdin:
+            await serve_stdin(server)
+        else:
+            await serve_http(server, args.host, args.http or 8000)
+
+    asyncio.run(main())
@@ -0,0 +1,149 @@
+import json
+import os
+import unicodedata
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+
+from embedding_store import corpus_hash, verify_corpus
+
+META_NAME = "meta.json"
+POSTINGS_NAME = "postings.npz"
+
+
+def char_ngrams(text, ngram_range=(2, 2)):
+    """
+    Tách văn bản tiếng Nhật thành các n-gram ký tự (không cần tokenizer bên ngoài).
+    Văn bản được chuẩn hóa NFKC (full-width -> half-width) và bỏ khoảng trắng trước khi tách.
+    """
+    text = "".join(unicodedata.normalize("NFKC", text).split())
+    min_n, max_n = ngram_range
+    grams = []
+    for n in range(min_n, max_n + 1):
+        grams.extend(text[i:i + n] for i in range(len(text) - n + 1))
+    if not grams and text:
+        # câu query quá ngắn so với n-gram nhỏ nhất
+        grams = [text]
+    return grams
+
+
+class SparseIndex:
+    """
+    Inverted index BM25 trên n-gram ký tự của corpus luật.
+
+    Postings được lưu dạng CSR gọn: `ptr[t]:ptr[t+1]` là đoạn của term t trong hai mảng
+    `doc_ids` (int32) và `tfs` (uint16), kèm `doc_lens` để chuẩn hóa độ dài.
+    """
+
+    def __init__(self, vocab, ptr, doc_ids, tfs, doc_lens, ngram_range=(2, 2), k1=1.2, b=0.75, meta=None):
+        self.vocab = vocab
+        self.term_to_id = {term: idx for idx, term in enumerate(vocab)}
+        self.ptr = ptr
+        self.doc_ids = doc_ids
+        self.tfs = tfs
+        self.doc_lens = doc_lens
+        self.ngram_range = tuple(ngram_range)
+        self.k1 = k1
+        self.b = b
+        self.meta = meta or {}
+        self.num_docs = len(doc_lens)
+        self.avgdl = float(doc_lens.mean()) if self.num_docs else 0.0
+        df = np.diff(ptr).astype(np.float32)
+        self.idf = np.log(1.0 + (self.num_docs - df + 0.5) / (df + 0.5)).astype(np.float32)
+        # phần chuẩn hóa độ dài của BM25, tính sẵn cho từng document
+        self._len_norm = (k1 * (1.0 - b + b * doc_lens / max(self.avgdl, 1e-9))).astype(np.float32)
+
+    @classmethod
+    def build(cls, texts, ngram_range=(2, 2), k1=1.2, b=0.75):
+        term_to_id = {}
+        term_ids, doc_ids, tfs = [], [], []
+        doc_lens = np.zeros(len(texts), dtype=np.int32)
+        for doc_id, text in enumerate(texts):
+            grams = char_ngrams(text, ngram_range)
+            doc_lens[doc_id] = len(grams)
+            for term, tf in Counter(grams).items():
+                term_ids.append(term_to_id.setdefault(term, len(term_to_id)))
+                doc_ids.append(doc_id)
+                tfs.append(min(tf, np.iinfo(np.uint16).max))
+
+        term_ids = np.asarray(term_ids, dtype=np.int64)
+        order = np.argsort(term_ids, kind="stable")
+        counts = np.bincount(term_ids, minlength=len(term_to_id))
+        ptr = np.zeros(len(term_to_id) + 1, dtype=np.int64)
+        np.cumsum(counts, out=ptr[1:])
+        vocab = [None] * len(term_to_id)
+        for term, idx in term_to_id.items():
+            vocab[idx] = term
+        return cls(
+            vocab, ptr,
+            np.asarray(doc_ids, dtype=np.int32)[order],
+            np.asarray(tfs, dtype=np.uint16)[order],
+            doc_lens, ngram_range=ngram_range, k1=k1, b=b,
+        )
+
+    @classmethod
+    def build_from_json(cls, corpus_path, **kwargs):
+        with open(corpus_path, "r", encoding="utf-8") as f:
+            texts = [doc["content"] for doc in json.load(f)]
+        index = cls.build(texts, **kwargs)
+        index.meta = {"corpus_hash": corpus_hash(corpus_path)}
+        return index
+
+    def save(self, index_dir, corpus_path=None):
+        index_dir = Path(index_dir)
+        index_dir.mkdir(parents=True, exist_ok=True)
+        np.savez(index_dir / POSTINGS_NAME, ptr=self.ptr, doc_ids=self.doc_ids, tfs=self.tfs, doc_lens=self.doc_lens)
+        meta = {
+            **self.meta,
+            "vocab": self.vocab,
+            "ngram_range": list(self.ngram_range),
+            "k1": self.k1,
+            "b": self.b,
+        }
+        if corpus_path is not None:
+            stat = os.stat(corpus_path)
+            meta.update(corpus_hash=corpus_hash(corpus_path), corpus_size=stat.st_size, corpus_mtime=stat.st_mtime)
+        tmp_path = index_dir / (META_NAME + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(tmp_path, index_dir / META_NAME)
+
+    @classmethod
+    def load(cls, index_dir, corpus_path=None):
+        index_dir = Path(index_dir)
+        with open(index_dir / META_NAME, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if corpus_path is not None:
+            verify_corpus(meta, corpus_path)
+        arrays = np.load(index_dir / POSTINGS_NAME)
+        vocab = meta.pop("vocab")
+        return cls(
+            vocab, arrays["ptr"], arrays["doc_ids"], arrays["tfs"], arrays["doc_lens"],
+            ngram_range=meta.pop("ngram_range"), k1=meta.pop("k1"), b=meta.pop("b"), meta=meta,
+        )
+
+    def score(self, query, rows=None):
+        """
+        Điểm BM25 của query với toàn bộ corpus (hoặc chỉ các dòng `rows`).
+        """
+        scores = np.zeros(self.num_docs, dtype=np.float32)
+        for term, qtf in Counter(char_ngrams(query, self.ngram_range)).items():
+            term_id = self.term_to_id.get(term)
+            if term_id is None:
+                continue
+            start, end = self.ptr[term_id], self.ptr[term_id + 1]
+            docs = self.doc_ids[start:end]
+            tf = self.tfs[start:end].astype(np.float32)
+            # doc_ids của một term là duy nhất nên có thể cộng trực tiếp theo index
+            scores[docs] += qtf * self.idf[term_id] * tf * (self.k1 + 1.0) / (tf + self._len_norm[docs])
+        return scores if rows is None else scores[rows]
+
+    def top_k(self, query, k=1000):
+        """Trả về (doc_ids, scores) của k document có điểm BM25 cao nhất (score > 0), sắp xếp giảm dần."""
+        scores = self.score(query)
+        candidates = np.flatnonzero(scores > 0)
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(scores[candidates], len(candidates) - k)[-k:]]
+        candidates = candidates[np.argsort(-scores[candidates])]
+        return candidates, scores[candidates]
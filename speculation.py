@@ -0,0 +1,99 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class SpeculativeRetrieval:
+    """
+    Chạy retrieval (encode query + tìm vector) song song với lời gọi LLM router.
+
+    Hầu hết câu hỏi đều được route về VectorStore nên kết quả thường dùng được ngay khi router trả lời;
+    khi route khác thì kết quả bị bỏ (wasted). `metrics` ghi lại tỉ lệ bỏ phí và thời gian tiết kiệm được
+    để quyết định có nên bật chế độ này hay không.
+    """
+
+    def __init__(self, retriever, max_workers=4):
+        self.retriever = retriever
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="speculative-retrieval")
+        self._lock = threading.Lock()
+        self.metrics = {
+            "speculations": 0,
+            "used": 0,
+            "wasted": 0,
+            "failed": 0,
+            # thời gian retrieval nằm trong khoảng chờ router (không còn nằm trên critical path)
+            "saved_seconds": 0.0,
+            # thời gian retrieval của các lần bị bỏ
+            "wasted_seconds": 0.0,
+        }
+
+    def _retrieve(self, query):
+        start = time.perf_counter()
+        documents = self.retriever.invoke(input=query)
+        return documents, time.perf_counter() - start
+
+    def start(self, query):
+        """Bắt đầu retrieval cho `query`, trả về future để truyền vào `finish`."""
+        with self._lock:
+            self.metrics["speculations"] += 1
+        return self._executor.submit(self._retrieve, query), time.perf_counter()
+
+    def finish(self, speculation, use):
+        """
+        Gọi khi router đã quyết định route.
+
+        :param use: True nếu route là VectorStore.
+        :return: documents đã prefetch, hoặc None (route khác hoặc retrieval lỗi: retrieve_node tự gọi lại).
+        """
+        future, started = speculation
+        if not use:
+            # chưa chạy thì hủy, đang chạy thì để chạy xong rồi bỏ kết quả
+            if not future.cancel():
+                future.add_done_callback(self._record_wasted)
+            else:
+                self._add("wasted", 0.0)
+            return None
+
+        router_seconds = time.perf_counter() - started
+        try:
+            documents, retrieval_seconds = future.result()
+        except Exception as e:
+            print(f"---Speculative retrieval failed: {e}---")
+            self._add("failed", 0.0)
+            return None
+        self._add("used", min(router_seconds, retrieval_seconds), "saved_seconds")
+        return documents
+
+    def _record_wasted(self, future):
+        seconds = 0.0
+        if not future.cancelled() and future.exception() is None:
+            seconds = future.result()[1]
+        self._add("wasted", seconds, "wasted_seconds")
+
+    def _add(self, counter, seconds, seconds_key=None):
+        with self._lock:
+            self.metrics[counter] += 1
+            if seconds_key:
+                self.metrics[seconds_key] += seconds
+
+    def report(self):
+        with self._lock:
+            metrics = dict(self.metrics)
+        finished = metrics["used"] + metrics["wasted"] + metrics["failed"]
+        metrics["waste_rate"] = round(metrics["wasted"] / finished, 4) if finished else 0.0
+        metrics["saved_seconds"] = round(metrics["saved_seconds"], 3)
+        metrics["wasted_seconds"] = round(metrics["wasted_seconds"], 3)
+        return metrics
+
+
+if __name__ == "__main__":
+    from langchain_core.runnables import RunnableLambda
+
+    fake_retriever = RunnableLambda(lambda query: (time.sleep(0.2), [f"doc for {query}"])[1])
+    speculation = SpeculativeRetrieval(fake_retriever)
+    for i, route in enumerate(["VectorStore", "VectorStore", "SearchEngine", "VectorStore"]):
+        pending = speculation.start(f"clause {i}")
+        time.sleep(0.3)  # lời gọi router
+        print(route, speculation.finish(pending, use=route == "VectorStore"))
+    time.sleep(0.3)
+    print(speculation.report())
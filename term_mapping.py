@@ -0,0 +1,197 @@
+import re
+
+TO_JAPANESE = "to_japanese"
+TO_LATIN = "to_latin"
+BOTH = "both"
+
+# Bảng ánh xạ thuật ngữ duy nhất giữa output tiếng Nhật của LLM và nhãn/khóa Latin dùng trong code:
+# (tiếng Nhật, Latin, chiều áp dụng, word boundary ở phía Latin). `{n}` là số thứ tự (\d+).
+# Thêm nhãn mới chỉ cần thêm một dòng ở đây.
+TERM_TABLE = [
+    ("抽出部分の法律名", "sub_law_name", TO_LATIN, False),
+    ("抽出された法律の配列", "sub_laws", TO_LATIN, False),
+    ("抽出された法律の内容", "sub_law_content", TO_LATIN, False),
+    ("抽出された契約の名前", "sub_chunk_name", TO_LATIN, False),
+    ("抽出された契約の内容", "sub_chunk_content", TO_LATIN, False),
+    ("抽出部分の説明", "sub_explanation", TO_LATIN, False),
+    ("抽出部分のラベル", "sub_label", TO_LATIN, False),
+    ("抽出された契約の名前", "Sub Chunk Name", TO_JAPANESE, False),
+    ("抽出された契約の内容", "Sub Chunk Content", TO_JAPANESE, False),
+    ("抽出部分の説明", "Sub Explanation", TO_JAPANESE, False),
+    ("抽出部分のラベル", "Sub Label", TO_JAPANESE, False),
+    ("結論", "Conclusion", BOTH, False),
+    ("分析", "Response", TO_LATIN, False),
+    ("正しいラベル", "TRUE", BOTH, False),
+    ("間違ったラベル", "FALSE", BOTH, False),
+    ("情報不足のラベル", "NEI", BOTH, False),
+    ("抽出部分の法律名{n}", "Sub Law {n} Name", TO_JAPANESE, True),
+    ("法律{n}の内容", "Sub Law {n} Content", TO_JAPANESE, True),
+    ("#抽出部分の法律名", "Law's name", TO_JAPANESE, False),
+    ("法律{n}の内容", "Law's content {n}", BOTH, False),
+]
+
+_DIGITS = object()
+
+
+def _tokenize(template):
+    tokens = []
+    for idx, part in enumerate(template.split("{n}")):
+        if idx > 0:
+            tokens.append(_DIGITS)
+        if part:
+            tokens.append(part)
+    return tokens
+
+
+def _is_partial(tokens, text, boundary):
+    """
+    True nếu `text` (phần cuối của buffer) có thể còn là đầu của một match khi có thêm dữ liệu:
+    là prefix của pattern, hoặc đã khớp nhưng còn phụ thuộc vào ký tự tiếp theo (chữ số, word boundary).
+    """
+    i, n = 0, len(text)
+    for k, token in enumerate(tokens):
+        if token is _DIGITS:
+            j = i
+            while j < n and text[j].isdecimal():
+                j += 1
+            if j == n:
+                return True
+            if j == i:
+                return False
+            i = j
+        else:
+            if n - i < len(token):
+                return token.startswith(text[i:])
+            if not text.startswith(token, i):
+                return False
+            i += len(token)
+            if i == n:
+                return k < len(tokens) - 1 or boundary
+    return False
+
+
+class TermMapper:
+    """
+    Thay thế tất cả thuật ngữ của một chiều trong một lần quét: các rule được gộp thành một regex
+    alternation (rule dài hơn đứng trước để ưu tiên match dài nhất), mỗi rule một named group.
+    """
+
+    def __init__(self, rules):
+        # rules: danh sách (source_template, target_template, word_boundary)
+        rules = sorted(rules, key=lambda rule: -len(rule[0].replace("{n}", "")))
+        self.rules = rules
+        self._targets = {}
+        self._partials = []
+        alternatives = []
+        for idx, (source, target, boundary) in enumerate(rules):
+            pattern = rf"(?P<n{idx}>\d+)".join(re.escape(part) for part in source.split("{n}"))
+            if boundary:
+                pattern = rf"\b{pattern}\b"
+            alternatives.append(f"(?P<t{idx}>{pattern})")
+            self._targets[f"t{idx}"] = (target, f"n{idx}" if "{n}" in source else None)
+            self._partials.append((_tokenize(source), boundary))
+        self._regex = re.compile("|".join(alternatives))
+        self.max_fixed_len = max(len(source.replace("{n}", "")) for source, _, _ in rules)
+
+    @classmethod
+    def from_table(cls, table, direction):
+        if direction == TO_JAPANESE:
+            rules = [(latin, japanese, boundary) for japanese, latin, d, boundary in table if d in (TO_JAPANESE, BOTH)]
+        else:
+            rules = [(japanese, latin, boundary) for japanese, latin, d, boundary in table if d in (TO_LATIN, BOTH)]
+        return cls(rules)
+
+    def _replace(self, match):
+        target, number_group = self._targets[match.lastgroup]
+        if number_group is None:
+            return target
+        return target.replace("{n}", match.group(number_group))
+
+    def translate(self, text):
+        return self._regex.sub(self._replace, text)
+
+    def stream(self):
+        return TermStreamTranslator(self)
+
+    def _hold_position(self, text):
+        # chỉ cần xét phần cuối buffer chứa tối đa max_fixed_len ký tự không phải chữ số
+        start, non_digits = len(text), 0
+        while start > 0 and non_digits < self.max_fixed_len:
+            start -= 1
+            if not text[start].isdecimal():
+                non_digits += 1
+        for pos in range(start, len(text)):
+            tail = text[pos:]
+            if any(_is_partial(tokens, tail, boundary) for tokens, boundary in self._partials):
+                return pos
+        return len(text)
+
+
+class TermStreamTranslator:
+    """
+    Dịch một luồng token (ví dụ output streaming của LLM) theo từng phần: phần cuối có thể còn là
+    đầu của một thuật ngữ được giữ lại cho đến khi có thêm dữ liệu hoặc `flush()`.
+    Ghép tất cả output của `feed` và `flush` bằng đúng `mapper.translate(toàn bộ văn bản)`.
+    """
+
+    def __init__(self, mapper):
+        self.mapper = mapper
+        self._buffer = ""
+        # ký tự cuối đã phát ra, để \b ở đầu pattern được xét đúng ngữ cảnh
+        self._context = ""
+
+    def _emit(self, hold):
+        full = self._context + self._buffer
+        offset = len(self._context)
+        hold_at = offset + hold
+        out, prev = [], offset
+        for match in self.mapper._regex.finditer(full, offset):
+            if match.start() >= hold_at:
+                break
+            if match.end() > hold_at:
+                hold_at = match.start()
+                break
+            out.append(full[prev:match.start()])
+            out.append(self.mapper._replace(match))
+            prev = match.end()
+        out.append(full[prev:hold_at])
+        if hold_at > offset:
+            self._context = full[hold_at - 1]
+        self._buffer = full[hold_at:]
+        return "".join(out)
+
+    def feed(self, chunk):
+        self._buffer += chunk
+        return self._emit(self.mapper._hold_position(self._buffer))
+
+    def flush(self):
+        return self._emit(len(self._buffer))
+
+    def translate_iter(self, chunks):
+        for chunk in chunks:
+            out = self.feed(chunk)
+            if out:
+                yield out
+        out = self.flush()
+        if out:
+            yield out
+
+
+LATIN_TO_JAPANESE = TermMapper.from_table(TERM_TABLE, TO_JAPANESE)
+JAPANESE_TO_LATIN = TermMapper.from_table(TERM_TABLE, TO_LATIN)
+
+
+def convert_japanese(response):
+    return LATIN_TO_JAPANESE.translate(response)
+
+
+def convert_back_to_latin(response):
+    return JAPANESE_TO_LATIN.translate(response)
+
+
+if __name__ == "__main__":
+    text = "Sub Law 1 Name: 労働基準法\nSub Law 1 Content: ...\nSub Label: TRUE\nConclusion: Law's content 12"
+    print(convert_japanese(text))
+    translator = LATIN_TO_JAPANESE.stream()
+    print("".join(translator.translate_iter(text[i:i + 3] for i in range(0, len(text), 3))))
+    print(convert_back_to_latin(convert_japanese(text)))
@@ -6,13 +6,17 @@ from typing import List
 from langchain.docstore.document import Document
 from langchain.embeddings import HuggingFaceEmbeddings
 from langchain.vectorstores import Chroma
+from indexing import sync_documents
+from embedding_cache import CachedEmbeddings
 
 def create_or_update_index(collection_name: str, embedding_model, persist_directory: str, 
                            all_docs: List[Document], clear_persist_folder: bool = False):
     """
     Tạo hoặc cập nhật index vector.
     - Nếu `clear_persist_folder=True`, sẽ xóa thư mục lưu trữ trước khi tạo lại từ đầu.
-    - Nếu `clear_persist_folder=False`, sẽ giữ dữ liệu cũ và chỉ cập nhật tài liệu mới.
+    - Nếu `clear_persist_folder=False`, sẽ giữ dữ liệu cũ và chỉ embed các tài liệu mới hoặc đã thay đổi,
+      tài liệu không còn trong `all_docs` sẽ bị xóa khỏi index.
+    Trả về số lượng tài liệu added / updated / removed / skipped.
     """
     pf = Path(persist_directory)
     if clear_persist_folder:
@@ -25,18 +29,18 @@ def create_or_update_index(collection_name: str, embedding_model, persist_direct
     print("\nGenerating and persisting the embeddings..")
     print("Persist Directory:", persist_directory)
     
-    vectordb = Chroma.from_documents(
+    vectordb = Chroma(
         collection_name=collection_name,
-        documents=all_docs, 
-        embedding=embedding_model, 
+        embedding_function=embedding_model,
         persist_directory=persist_directory
     )
-    vectordb.persist()
+    stats = sync_documents(vectordb, all_docs)
+    print(f"Index stats: {stats}")
     
     # Đóng connection để tránh lỗi "readonly database"
     del vectordb
     gc.collect()
-    return
+    return stats
 
 def get_document_count(persist_directory: str, collection_name: str, embedding_model):
     """
@@ -65,7 +69,12 @@ if __name__ == "__main__":
     ]
 
     # 🔹 Khởi tạo embedding model
-    embed_model = HuggingFaceEmbeddings(model_name="intfloat/multilingual-e5-large")
+    # cache embeddings trên đĩa để các lần rebuild index không phải embed lại cùng nội dung
+    embed_model = CachedEmbeddings(
+        HuggingFaceEmbeddings(model_name="intfloat/multilingual-e5-large"),
+        model_name="intfloat/multilingual-e5-large",
+        cache_path="./cache/embeddings.db",
+    )
 
     print("🛠 Creating the index for the first time...")
     create_or_update_index(
@@ -94,12 +103,13 @@ if __name__ == "__main__":
         collection_name=collection_name,
         embedding_model=embed_model,
         persist_directory=persist_directory,
-        all_docs=new_docs,
-        clear_persist_folder=True  # Không xóa dữ liệu cũ, chỉ cập nhật thêm
+        all_docs=docs[:2] + new_docs,
+        clear_persist_folder=False  # Không xóa dữ liệu cũ, chỉ embed tài liệu mới, xóa doc3
     )
 
     # 🔹 Kiểm tra số lượng tài liệu sau khi cập nhật
     updated_count = get_document_count(persist_directory, collection_name, embed_model)
     print(f"\n📊 Total documents after update: {updated_count}")
 
+    print(f"\n📊 Embedding cache: {embed_model.stats()}")
     print("\n✅ Index has been created and updated successfully!")
@@ -0,0 +1,32 @@
+import numpy as np
+
+from ann_index import IVFIndex
+from benchmark import build_retrieval, synthetic_corpus
+
+
+def test_empty_ivf_probe_falls_back_to_the_exact_scan(tmp_path):
+    retrieval = build_retrieval(tmp_path, synthetic_corpus(200), num_models=2, dim=32)
+    questions = ["法律0/第3条", "法律0/第7条"]
+    exact = retrieval.inference(questions[0])
+    exact_batch = retrieval.inference_batch(questions)
+
+    # các cụm được probe đều rỗng (k-means có thể để lại cụm rỗng): không có ứng viên nào
+    retrieval.ann_index = IVFIndex(np.zeros((2, 64), dtype=np.float32), np.array([0, 200, 200]), np.arange(200))
+    retrieval.ann_index.candidates = lambda query_vector, nprobe: np.array([], dtype=np.int64)
+
+    map_ids, new_scores = retrieval.inference(questions[0])
+    np.testing.assert_array_equal(map_ids, exact[0])
+    np.testing.assert_allclose(new_scores, exact[1])
+    batch_ids, _ = retrieval.inference_batch(questions)
+    np.testing.assert_array_equal(batch_ids, exact_batch[0])
+
+
+def test_inference_batch_scores_only_the_ivf_candidates(tmp_path):
+    retrieval = build_retrieval(tmp_path, synthetic_corpus(200), num_models=2, dim=32)
+    probed = {0: np.arange(0, 50), 1: np.arange(100, 150)}
+    calls = iter([probed[0], probed[1]])
+    retrieval.ann_index = IVFIndex(np.zeros((2, 64), dtype=np.float32), np.array([0, 100, 200]), np.arange(200))
+    retrieval.ann_index.candidates = lambda query_vector, nprobe: next(calls)
+
+    map_ids, _ = retrieval.inference_batch(["法律0/第3条", "法律0/第7条"])
+    assert len(map_ids) and set(map_ids) <= set(probed[0]) | set(probed[1])
@@ -0,0 +1,57 @@
+from typing import TypedDict
+
+from langgraph.graph import END, StateGraph
+
+from budget import INSUFFICIENT_INFORMATION, RequestBudget
+
+
+class State(TypedDict):
+    query: str
+    documents: list
+    generation: str
+    degraded: dict
+    num_searchengine: int
+
+
+def build_app(budget):
+    """Graph giống nhánh SearchEngine của app.py: search không bao giờ tìm được document liên quan."""
+    def search_node(state):
+        return {"documents": [], **budget.increment(state, "num_searchengine")}
+
+    def should_generate(state, config):
+        return "degrade" if budget.exhausted(state, config, "num_searchengine") else "SearchEngine"
+
+    workflow = StateGraph(State)
+    workflow.add_node("SearchEngine", search_node)
+    workflow.add_node("degrade", budget.degrade_node)
+    workflow.set_entry_point("SearchEngine")
+    workflow.add_conditional_edges("SearchEngine", should_generate, {"SearchEngine": "SearchEngine", "degrade": "degrade"})
+    workflow.add_edge("degrade", END)
+    return budget.bind(workflow.compile())
+
+
+def test_exhausted_before_any_generation_uses_the_fallback():
+    budget = RequestBudget(max_iterations={"num_searchengine": 2},
+                           fallback=lambda state: {"generation": f"fallback: {state['query']}"})
+    result = build_app(budget).invoke({"query": "q"})
+    assert result["generation"] == "fallback: q"
+    assert result["degraded"]["reason"] == "num_searchengine"
+    assert result["degraded"]["answer"] == "fallback"
+
+
+def test_failing_or_missing_fallback_returns_the_no_answer_message():
+    def failing_fallback(state):
+        raise RuntimeError("groq down")
+
+    for budget in (RequestBudget(max_iterations={"num_searchengine": 2}),
+                   RequestBudget(max_iterations={"num_searchengine": 2}, fallback=failing_fallback)):
+        result = build_app(budget).invoke({"query": "q"})
+        assert result["generation"] == INSUFFICIENT_INFORMATION
+        assert result["degraded"]["answer"] == "no_answer"
+
+
+def test_fallback_is_not_called_when_the_llm_budget_is_spent():
+    calls = []
+    budget = RequestBudget(max_llm_calls=0, fallback=lambda state: calls.append(state) or {"generation": "x"})
+    assert budget._fallback_answer({"query": "q"}, "llm_calls") == (INSUFFICIENT_INFORMATION, "no_answer")
+    assert calls == []
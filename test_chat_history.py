@@ -0,0 +1,46 @@
+import pytest
+from langchain_core.runnables import RunnableLambda
+
+from chat_history import HistoryManager
+
+
+def turn(i):
+    return {"human": f"câu hỏi {i} " + "労働基準法" * 10, "ai": f"trả lời {i} " + "x" * 200}
+
+
+def test_failed_summary_keeps_the_turns_and_is_retried():
+    fail = [True]
+
+    def summarize(inputs):
+        if fail[0]:
+            raise RuntimeError("429 rate limit")
+        return "tóm tắt: " + inputs["turns"][-50:]
+
+    manager = HistoryManager(RunnableLambda(summarize), max_tokens=300)
+    history = manager.new_session()
+    for i in range(4):
+        manager.append(history, turn(i), compact=False)
+    before = manager.messages(history)
+    window_tokens = history.window_tokens
+
+    with pytest.raises(RuntimeError):
+        manager.compact(history)
+    assert manager.messages(history) == before
+    assert history.window_tokens == window_tokens and history.summarized_turns == 0
+
+    fail[0] = False
+    assert manager.compact(history)
+    assert len(history) == 4 and history.summarized_turns > 0
+    assert history.summary_tokens + history.window_tokens <= manager.max_tokens
+    assert manager.messages(history)[-1] == turn(3)
+
+
+def test_without_summarizer_old_turns_are_dropped():
+    manager = HistoryManager(max_tokens=300)
+    history = manager.new_session()
+    for i in range(10):
+        manager.append(history, turn(i))
+    assert len(history) == 10
+    assert history.window_tokens <= manager.max_tokens
+    assert manager.messages(history)[-1] == turn(9)
+    assert manager.stats["turns_dropped"] == history.summarized_turns
@@ -0,0 +1,21 @@
+import json
+
+import numpy as np
+
+from embedding_store import load_embedding_store, load_row_ids, reorder_embedding_store, save_embedding_store
+
+
+def test_re_encoding_a_reordered_store_removes_the_old_order(tmp_path):
+    corpus = tmp_path / "corpus.json"
+    corpus.write_text(json.dumps([{"id": str(i), "content": str(i)} for i in range(10)]), encoding="utf-8")
+    store = tmp_path / "store"
+    emb = np.arange(40, dtype=np.float32).reshape(10, 4)
+    save_embedding_store(store, ["m"], [emb], corpus)
+    reorder_embedding_store(store, np.arange(10)[::-1])
+    assert any(path.name.startswith("row_ids.") for path in store.iterdir())
+
+    save_embedding_store(store, ["m"], [emb], corpus)
+    assert sorted(path.name for path in store.iterdir()) == ["manifest.json", "model_0.norms.npy", "model_0.npy"]
+    matrices, _, manifest = load_embedding_store(store, corpus_path=corpus)
+    assert load_row_ids(store, manifest) is None
+    np.testing.assert_array_equal(matrices[0], emb)
@@ -0,0 +1,52 @@
+from langchain_core.documents import Document
+
+from indexing import CONTENT_HASH_KEY, assign_stable_ids, sync_documents
+
+
+class FakeVectorDB:
+    """Thay cho Chroma: chỉ giữ id -> metadata và đếm số document được embed."""
+
+    def __init__(self):
+        self.metadatas = {}
+        self.embedded = 0
+
+    def get(self, include):
+        ids = list(self.metadatas)
+        return {"ids": ids, "metadatas": [self.metadatas[doc_id] for doc_id in ids]}
+
+    def add_documents(self, documents, ids):
+        self.embedded += len(documents)
+        for doc_id, doc in zip(ids, documents):
+            self.metadatas[doc_id] = doc.metadata
+
+    def delete(self, ids):
+        for doc_id in ids:
+            del self.metadatas[doc_id]
+
+
+def chunks(*texts):
+    return [Document(page_content=text, metadata={"law_id": "01/2024/QH15", "article": "Điều 5"}) for text in texts]
+
+
+def test_inserting_a_chunk_only_embeds_that_chunk():
+    vectordb = FakeVectorDB()
+    assert sync_documents(vectordb, chunks("a", "b", "c", "d", "e"))["added"] == 5
+
+    stats = sync_documents(vectordb, chunks("a", "mới", "b", "c", "d", "e"))
+    assert stats == {"added": 1, "updated": 0, "removed": 0, "skipped": 5}
+    assert vectordb.embedded == 6
+
+
+def test_edited_chunk_replaces_only_its_own_id():
+    vectordb = FakeVectorDB()
+    sync_documents(vectordb, chunks("a", "b", "c"))
+    stats = sync_documents(vectordb, chunks("a", "b sửa", "c"))
+    assert stats == {"added": 1, "updated": 0, "removed": 1, "skipped": 2}
+    assert all(CONTENT_HASH_KEY in metadata for metadata in vectordb.metadatas.values())
+
+
+def test_only_exact_duplicates_get_a_suffix():
+    ids = [doc_id for doc_id, _, _ in assign_stable_ids(chunks("a", "b", "a", "a"))]
+    assert len(set(ids)) == 4
+    assert ids[2] == ids[0] + "-1" and ids[3] == ids[0] + "-2"
+    assert "-" not in ids[1]
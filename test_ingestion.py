@@ -0,0 +1,66 @@
+import json
+import threading
+
+import pytest
+
+from ingestion import ChromaSink, IngestionPipeline, iter_json_records
+
+
+def write_corpus(path, n):
+    # nội dung có dấu phẩy, ngoặc và ký tự nhiều byte để ranh giới chunk rơi vào giữa chuỗi / ký tự
+    records = [{"id": f"law_{i}", "content": f"第{i}条 [使用者], {{労働者}} " + "賃金" * (i % 7),
+                "metadata": {"law_name": "労働基準法"}} for i in range(n)]
+    path.write_text(json.dumps(records, ensure_ascii=False, indent=1), encoding="utf-8")
+    return records
+
+
+@pytest.mark.parametrize("read_size", [1, 2, 3, 7, 64, 1 << 20])
+def test_json_array_records_survive_every_chunk_boundary(tmp_path, read_size):
+    records = write_corpus(tmp_path / "corpus.json", 30)
+    assert list(iter_json_records(tmp_path / "corpus.json", read_size=read_size)) == records
+
+
+def test_truncated_json_array_is_an_error(tmp_path):
+    path = tmp_path / "corpus.json"
+    path.write_text('[{"content": "a"}, {"content": "b', encoding="utf-8")
+    with pytest.raises(json.JSONDecodeError):
+        list(iter_json_records(path, read_size=4))
+
+
+class FakeEmbeddings:
+    def embed_documents(self, texts):
+        return [[float(len(text))] for text in texts]
+
+
+class FakeVectorDB:
+    def __init__(self):
+        self.documents = {}
+
+    def add_documents(self, documents, ids):
+        self.documents.update(zip(ids, documents))
+
+
+def test_chroma_sink_upserts_through_add_documents(tmp_path):
+    write_corpus(tmp_path / "corpus.json", 20)
+    vectordb = FakeVectorDB()
+    metrics = IngestionPipeline(None, ChromaSink(vectordb), batch_size=4, progress_every=0).run(tmp_path / "corpus.json")
+    assert metrics["chunks"] == len(vectordb.documents) == 20
+    assert all("content_hash" in doc.metadata for doc in vectordb.documents.values())
+
+
+def test_failing_sink_stops_the_stages_blocked_on_full_queues(tmp_path):
+    write_corpus(tmp_path / "corpus.json", 500)
+    calls = []
+
+    def sink(ids, chunks, embeddings, hashes):
+        calls.append(len(ids))
+        if len(calls) == 2:
+            raise RuntimeError("index down")
+
+    before = threading.active_count()
+    pipeline = IngestionPipeline(FakeEmbeddings(), sink, batch_size=2, queue_size=1, progress_every=0)
+    with pytest.raises(RuntimeError, match="index down"):
+        pipeline.run(tmp_path / "corpus.json")
+    # producer / embedder đang bị chặn ở queue đầy phải dừng, không đọc tiếp phần còn lại của corpus
+    assert len(calls) == 2
+    assert threading.active_count() == before
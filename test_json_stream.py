@@ -0,0 +1,24 @@
+import pytest
+
+from json_stream import StreamingJSONExtractor, compile_validator, extract_json
+
+
+@pytest.mark.parametrize("text", ['{"a": 1 ,\n ]', '{"a": [1}', '{"a": {"b": 2]}', '{"a": [1, 2}]'])
+def test_mismatched_closing_bracket_is_rejected(text):
+    assert extract_json(text) is None
+
+
+def test_trailing_commas_and_brackets_inside_strings():
+    text = 'Kết quả: {"a": [1, {"b": 2},], "c": "}]",} ...'
+    assert extract_json(text) == {"a": [1, {"b": 2}], "c": "}]"}
+
+
+def test_fields_are_emitted_while_streaming():
+    generation = '{"Conclusion": "TRUE", "sub_laws": [{"sub_law_name": "労働基準法"},], "Response": "..."}'
+    validator = compile_validator({"Conclusion": str, "sub_laws": [{"sub_law_name": str}], "Response": str})
+    extractor = StreamingJSONExtractor(validator=validator)
+    fields = []
+    for i in range(0, len(generation), 5):
+        fields.extend(key for key, _ in extractor.feed(generation[i:i + 5]))
+    assert fields == ["Conclusion", "sub_laws", "Response"]
+    assert extractor.done and extractor.result["Response"] == "..."
@@ -0,0 +1,82 @@
+import pytest
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.outputs import Generation
+from langchain_core.prompts import ChatPromptTemplate
+
+import llm_cache
+from llm_cache import SQLiteLRUCache
+
+MODEL_A = "{'model_name': 'llama3-70b-8192', 'temperature': 0.0}"
+MODEL_B = "{'model_name': 'llama3-8b-8192', 'temperature': 0.0}"
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = SQLiteLRUCache(tmp_path / "llm_cache.db", max_entries=3, ttl=60)
+    yield cache
+    cache.close()
+
+
+def test_fake_chat_model_hits_and_misses(cache):
+    fake_llm = FakeListChatModel(responses=["relevant", "irrelevant"], cache=cache)
+    chain = ChatPromptTemplate.from_template("Clause: {query}") | fake_llm
+    assert chain.invoke({"query": "a"}).content == "relevant"
+    # cùng prompt: trả về kết quả đã cache, không lấy response tiếp theo của model giả
+    assert chain.invoke({"query": "a"}).content == "relevant"
+    assert chain.invoke({"query": "b"}).content == "irrelevant"
+    assert (cache.hits, cache.misses) == (1, 2)
+    assert cache.stats()["entries"] == 2 and cache.hit_rate == pytest.approx(1 / 3)
+
+
+def test_keys_differ_by_model_and_prompt(cache):
+    cache.update("prompt 1", MODEL_A, [Generation(text="a1")])
+    assert cache.lookup("prompt 1", MODEL_B) is None
+    assert cache.lookup("prompt 2", MODEL_A) is None
+    assert cache.lookup("prompt 1", MODEL_A)[0].text == "a1"
+    assert SQLiteLRUCache.make_key("prompt 1", MODEL_A) != SQLiteLRUCache.make_key("prompt 1", MODEL_B)
+    cache.update("prompt 1", MODEL_B, [Generation(text="b1")])
+    cache.clear(model="llama3-8b-8192")
+    assert cache.count() == 1 and cache.lookup("prompt 1", MODEL_A)[0].text == "a1"
+
+
+def test_lru_eviction_at_max_entries(cache, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(llm_cache.time, "time", lambda: now[0])
+    for i in range(3):
+        now[0] += 1
+        cache.update(f"p{i}", MODEL_A, [Generation(text=str(i))])
+    now[0] += 1
+    assert cache.lookup("p0", MODEL_A) is not None  # p0 được dùng lại, p1 thành bản ghi lâu không dùng nhất
+    # ghi đè một key đã có không làm tăng số bản ghi
+    now[0] += 1
+    cache.update("p2", MODEL_A, [Generation(text="2b")])
+    assert cache.count() == 3 and cache.evictions == 0
+    now[0] += 1
+    cache.update("p3", MODEL_A, [Generation(text="3")])
+    assert cache.count() == 3 and cache.evictions == 1
+    assert cache.lookup("p1", MODEL_A) is None
+    assert [cache.lookup(p, MODEL_A)[0].text for p in ("p0", "p2", "p3")] == ["0", "2b", "3"]
+
+
+def test_ttl_expiry(cache, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(llm_cache.time, "time", lambda: now[0])
+    cache.update("p", MODEL_A, [Generation(text="x")])
+    now[0] += 59
+    assert cache.lookup("p", MODEL_A) is not None
+    now[0] += 2
+    assert cache.lookup("p", MODEL_A) is None
+    assert cache.count() == 0 and cache.misses == 1
+
+
+def test_row_count_survives_reopen(tmp_path):
+    path = tmp_path / "llm_cache.db"
+    cache = SQLiteLRUCache(path, max_entries=2)
+    for i in range(3):
+        cache.update(f"p{i}", MODEL_A, [Generation(text=str(i))])
+    cache.close()
+    cache = SQLiteLRUCache(path, max_entries=2)
+    assert cache.count() == 2
+    cache.update("p3", MODEL_A, [Generation(text="3")])
+    assert cache.count() == 2 and cache.evictions == 1
+    cache.close()
@@ -0,0 +1,130 @@
+import json
+import threading
+import time
+
+import pytest
+
+import metadata_enrichment
+from metadata_enrichment import MetadataEnrichmentRunner, document_key, enrich_corpus, load_checkpoint
+
+
+class FakeExtractor:
+    """LLM giả cho metadata_extractor_chain: đếm số lời gọi, chậm `latency` giây, lỗi ở `fail_first` lần gọi đầu."""
+
+    def __init__(self, latency=0.0, fail_first=0):
+        self.latency = latency
+        self.fail_first = fail_first
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def invoke(self, inputs):
+        with self._lock:
+            self.calls += 1
+            call = self.calls
+        time.sleep(self.latency)
+        if call <= self.fail_first:
+            raise RuntimeError("429 rate limit")
+        return {"category": "労働法", "keywords": inputs["document"].split()[:2],
+                "applicable_entities": [], "reference_articles": []}
+
+
+def make_docs(n):
+    return [{"id": f"law_{i}", "content": f"第{i}条 使用者 労働者", "metadata": {"law_name": "労働基準法"}}
+            for i in range(n)]
+
+
+def make_runner(chain, checkpoint_path, **kwargs):
+    kwargs.setdefault("max_workers", 4)
+    return MetadataEnrichmentRunner(chain, str(checkpoint_path), requests_per_minute=600_000,
+                                    backoff_base=0.001, **kwargs)
+
+
+def test_enriches_every_document_and_resumes_from_checkpoint(tmp_path):
+    corpus_path = tmp_path / "corpus.json"
+    corpus_path.write_text(json.dumps(make_docs(30), ensure_ascii=False), encoding="utf-8")
+    chain = FakeExtractor()
+
+    report = enrich_corpus(chain, str(corpus_path), max_workers=4, requests_per_minute=600_000)
+    assert report["enriched"] == 30 and report["failed"] == 0
+    assert chain.calls == 30
+    docs = json.loads(corpus_path.read_text(encoding="utf-8"))
+    assert all(doc["metadata"]["category"] == "労働法" for doc in docs)
+
+    report = enrich_corpus(chain, str(corpus_path), max_workers=4, requests_per_minute=600_000)
+    assert report["resumed_from_checkpoint"] == 30 and report["enriched"] == 0
+    assert chain.calls == 30
+
+
+def test_retries_transient_failures(tmp_path):
+    chain = FakeExtractor(fail_first=3)
+    runner = make_runner(chain, tmp_path / "ckpt.jsonl", max_workers=1, max_retries=3)
+    report = runner.run(make_docs(5))
+    assert report["enriched"] == 5 and report["failed"] == 0
+    assert report["retries"] == 3
+    assert chain.calls == 8
+
+
+def test_failed_documents_are_reported_and_not_checkpointed(tmp_path):
+    chain = FakeExtractor(fail_first=2)
+    runner = make_runner(chain, tmp_path / "ckpt.jsonl", max_workers=1, max_retries=0)
+    docs = make_docs(4)
+    report = runner.run(docs)
+    assert report["failed"] == 2 and report["enriched"] == 2
+    assert len(load_checkpoint(tmp_path / "ckpt.jsonl")) == 2
+
+
+def test_interrupt_cancels_the_backlog_and_checkpoints_finished_calls(tmp_path, monkeypatch):
+    chain = FakeExtractor(latency=0.02)
+    checkpoint_path = tmp_path / "ckpt.jsonl"
+    runner = make_runner(chain, checkpoint_path, max_workers=4)
+    docs = make_docs(200)
+
+    applied = []
+    original_apply = metadata_enrichment.apply_metadata
+
+    def interrupting_apply(doc, metadata):
+        original_apply(doc, metadata)
+        applied.append(doc["id"])
+        if len(applied) == 10:
+            raise KeyboardInterrupt
+
+    monkeypatch.setattr(metadata_enrichment, "apply_metadata", interrupting_apply)
+    with pytest.raises(KeyboardInterrupt):
+        runner.run(docs)
+    monkeypatch.setattr(metadata_enrichment, "apply_metadata", original_apply)
+
+    # chỉ các document trong cửa sổ 2 * max_workers được gọi, không phải cả backlog
+    assert chain.calls <= 10 + runner.max_in_flight
+    # mọi lời gọi đã chạy đều có trong checkpoint (kể cả các lời gọi xong sau khi bị dừng)
+    done = load_checkpoint(checkpoint_path)
+    assert len(done) == chain.calls
+
+    calls_before = chain.calls
+    report = make_runner(chain, checkpoint_path, max_workers=4).run(make_docs(200))
+    assert report["resumed_from_checkpoint"] == calls_before
+    assert report["enriched"] == 200 - calls_before
+    assert chain.calls == 200
+    assert set(load_checkpoint(checkpoint_path)) == {document_key(doc) for doc in docs}
+
+
+def test_in_flight_window_is_bounded(tmp_path, monkeypatch):
+    chain = FakeExtractor(latency=0.005)
+    runner = make_runner(chain, tmp_path / "ckpt.jsonl", max_workers=2)
+    peak = 0
+    original_submit = metadata_enrichment.ThreadPoolExecutor.submit
+
+    def counting_submit(executor, fn, *args, **kwargs):
+        nonlocal peak
+        peak = max(peak, executor._work_queue.qsize() + 1)
+        return original_submit(executor, fn, *args, **kwargs)
+
+    monkeypatch.setattr(metadata_enrichment.ThreadPoolExecutor, "submit", counting_submit)
+    report = runner.run(make_docs(50))
+    assert report["enriched"] == 50
+    assert peak <= runner.max_in_flight
+
+
+def test_document_key_uses_the_corpus_record_id():
+    same_content = [{"id": "law_1", "content": "第1条"}, {"id": "law_2", "content": "第1条"}]
+    keys = [document_key(doc) for doc in same_content]
+    assert keys[0].startswith("law_1:") and keys[0] != keys[1]
@@ -0,0 +1,42 @@
+import numpy as np
+
+import quantization
+from quantization import QuantizedIndex
+
+
+def make_index(num_docs=3000, dim=48, seed=0):
+    rng = np.random.default_rng(seed)
+    emb = rng.standard_normal((num_docs, dim)).astype(np.float32)
+    norms = np.linalg.norm(emb, axis=1)
+    return emb, norms, QuantizedIndex.build([emb, emb[:, ::-1].copy()], [norms, norms], mode="int8")
+
+
+def dequantized_scores(index, question_embs, weighted, rows=None):
+    scores = 0
+    for idx, (weight, question_emb) in enumerate(zip(weighted, question_embs)):
+        queries = np.atleast_2d(question_emb)
+        queries = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+        codes = index.codes[idx] if rows is None else index.codes[idx][rows]
+        scores = scores + weight * queries @ (codes * index.scales[idx]).T
+    return scores
+
+
+def test_int8_blocks_match_the_dequantized_scan(monkeypatch):
+    # số dòng không chia hết cho block để có block cuối ngắn hơn
+    monkeypatch.setattr(quantization, "INT8_BLOCK_ROWS", 256)
+    emb, _, index = make_index()
+    rng = np.random.default_rng(1)
+    single = [rng.standard_normal(48), rng.standard_normal(48)]
+    batch = [rng.standard_normal((5, 48)), rng.standard_normal((5, 48))]
+    rows = np.sort(rng.choice(len(emb), size=700, replace=False))
+    for question_embs, subset in ((single, None), (batch, None), (batch, rows)):
+        expected = dequantized_scores(index, question_embs, [0.7, 0.3], subset)
+        np.testing.assert_allclose(index.approx_scores(question_embs, [0.7, 0.3], subset), expected, atol=1e-4)
+
+
+def test_int8_first_pass_finds_the_exact_top_k():
+    emb, norms, index = make_index()
+    exact = (emb / norms[:, None]) @ (emb[42] / norms[42])
+    candidates = index.candidates([emb[42], emb[42, ::-1]], [0.5, 0.5], rescore_k=20)
+    assert set(np.argsort(-exact)[:5]) <= set(candidates)
+    assert len(index.candidates([emb[42], emb[42, ::-1]], [0.5, 0.5], rows=np.array([], dtype=np.int64))) == 0
@@ -0,0 +1,29 @@
+from langchain_core.documents import Document
+from langchain_core.runnables import RunnableLambda
+
+from benchmark import OfflineChatModel, OfflineSearch, build_offline_workflow, build_retrieval, synthetic_corpus
+from budget import RequestBudget
+from rag_workflow import build_workflow
+
+
+def test_offline_benchmark_runs_the_app_graph(tmp_path):
+    retrieval = build_retrieval(tmp_path, synthetic_corpus(100), dim=32)
+    budget = RequestBudget(max_iterations={"num_hallucination": 2, "num_searchengine": 1})
+    app = build_offline_workflow(retrieval, OfflineChatModel(), OfflineSearch(), budget)
+    assert set(app.bound.get_graph().nodes) == {
+        "__start__", "__end__", "router", "VectorStore", "SearchEngine", "filter_docs", "fallback", "rag",
+        "grade_generation", "hallucination", "degrade",
+    }
+    result = app.invoke({"query": "法律0/第3条", "chat_history": []})
+    assert result["generation"]
+
+
+def test_router_without_tool_call_uses_the_fallback_chain():
+    class NoToolModel(OfflineChatModel):
+        def _respond(self, prompt, tools=None, structured_schema=None):
+            return super()._respond(prompt, None, structured_schema)
+
+    retriever = RunnableLambda(lambda query: [Document(page_content=query)])
+    app = build_workflow(NoToolModel(), retriever, OfflineSearch(), RequestBudget())
+    result = app.invoke({"query": "hello", "chat_history": [{"human": "hi", "ai": "hi"}]})
+    assert result["route"] == "llm_fallback" and "結論" in result["generation"]
@@ -0,0 +1,179 @@
+import asyncio
+import threading
+
+from langchain_core.runnables import RunnableLambda
+
+from chat_history import HistoryManager
+from server import GraphServer, SessionStore, _run_cancellable, build_stub_app
+
+
+class SlowSummarizer:
+    """Summarizer giả chạy trong thread của asyncio.to_thread: chậm `latency` giây, lỗi khi `fail` được set."""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.fail = False
+        self.running = threading.Event()
+        self.calls = 0
+
+    def invoke(self, inputs):
+        self.calls += 1
+        self.running.set()
+        threading.Event().wait(self.latency)
+        self.running.clear()
+        if self.fail:
+            raise RuntimeError("summarizer down")
+        return "tóm tắt"
+
+
+def make_server(summarizer, **kwargs):
+    # mỗi lượt của stub app khoảng 10 token: max_tokens=15 buộc tóm tắt từ lượt thứ hai
+    sessions = SessionStore(history_manager=HistoryManager(summarizer, max_tokens=15))
+    return GraphServer(build_stub_app(llm_latency=0.001, search_latency=0.0), sessions, **kwargs)
+
+
+def test_compaction_runs_after_the_response_and_outside_the_timeout():
+    summarizer = SlowSummarizer(latency=0.3)
+
+    async def main():
+        server = make_server(summarizer, request_timeout=0.2)
+        await server.handle({"session_id": "s", "query": "q1"})
+        result = await server.handle({"session_id": "s", "query": "q2"})
+        # trả về trước khi tóm tắt xong, và thời gian tóm tắt không tính vào request_timeout
+        assert result["generation"] == "answer #2 to: q2"
+        assert summarizer.calls <= 1 and server._compactions
+        await server.drain()
+        assert server.stats["completed"] == 2 and server.stats["compaction_errors"] == 0
+        return server
+
+    server = asyncio.run(main())
+    history = server.sessions.get("s")
+    assert history.summary == "tóm tắt" and len(history) == 2
+
+
+def test_requests_of_the_session_wait_for_a_running_compaction():
+    summarizer = SlowSummarizer(latency=0.1)
+    seen = []
+
+    async def main():
+        server = make_server(summarizer)
+        await server.handle({"session_id": "s", "query": "q1"})
+        await server.handle({"session_id": "s", "query": "q2"})
+        while not summarizer.running.is_set():
+            await asyncio.sleep(0.001)
+        original_messages = server.sessions.messages
+
+        def messages(session_id):
+            seen.append((session_id, summarizer.running.is_set()))
+            return original_messages(session_id)
+
+        server.sessions.messages = messages
+        # q3 bắt đầu khi thread tóm tắt đang chạy: chỉ đọc lịch sử sau khi nó xong; q4 chạy song song với q3
+        await asyncio.gather(server.handle({"session_id": "s", "query": "q3"}),
+                             server.handle({"session_id": "s", "query": "q4"}),
+                             server.handle({"session_id": "other", "query": "q"}))
+        await server.drain()
+        return server
+
+    server = asyncio.run(main())
+    # session khác không bị chặn, các request của session "s" chỉ chạy sau khi thread tóm tắt xong
+    assert ("other", True) in seen
+    assert [running for session_id, running in seen if session_id == "s"] == [False, False]
+    history = server.sessions.get("s")
+    assert len(history) == 4 and history.summary == "tóm tắt"
+    assert history.summary_tokens + history.window_tokens <= server.sessions.history_manager.max_tokens
+    assert not server._session_locks
+
+
+def test_compaction_errors_are_logged_and_keep_the_history(capsys):
+    summarizer = SlowSummarizer()
+    summarizer.fail = True
+
+    async def main():
+        server = make_server(summarizer)
+        for i in range(3):
+            result = await server.handle({"session_id": "s", "query": f"q{i}"})
+            assert result["generation"] == f"answer #{i + 1} to: q{i}"
+        await server.drain()
+        return server
+
+    server = asyncio.run(main())
+    assert server.stats["compaction_errors"] >= 2
+    assert "history compaction failed for session s" in capsys.readouterr().err
+    history = server.sessions.get("s")
+    assert history.summarized_turns == 0 and len(history.turns) == 3
+
+
+def test_cancelled_compaction_keeps_the_lock_until_the_thread_finishes():
+    summarizer = SlowSummarizer(latency=0.1)
+
+    async def main():
+        server = make_server(summarizer)
+        sessions = server.sessions
+        history = sessions.append("s", "q1", "a" * 40)
+        sessions.append("s", "q2", "a" * 40)
+        task = asyncio.create_task(sessions.compact(history))
+        while not summarizer.running.is_set():
+            await asyncio.sleep(0.001)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        # CancelledError chỉ đến sau khi thread tóm tắt đã chạy xong
+        assert not summarizer.running.is_set()
+        return history
+
+    history = asyncio.run(main())
+    assert history.summary == "tóm tắt"
+
+
+def test_none_generation_is_not_stored():
+    sessions = SessionStore(history_manager=HistoryManager(RunnableLambda(lambda x: "s")))
+    assert sessions.append("s", "q", None) is None
+    assert len(sessions.get("s")) == 0
+
+
+def test_failed_disconnect_read_cancels_the_request():
+    class ResetReader:
+        async def read(self, n):
+            raise ConnectionResetError
+
+    cancelled = []
+
+    async def slow_request():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    async def main():
+        return await asyncio.wait_for(_run_cancellable(slow_request(), ResetReader()), timeout=1)
+
+    assert asyncio.run(main()) is None
+    assert cancelled == [True]
+
+
+def test_stream_streams_tokens_and_enforces_the_request_timeout():
+    async def collect(server, query):
+        return [event async for event in server.stream({"session_id": "s", "query": query})]
+
+    async def main():
+        fast = GraphServer(build_stub_app(llm_latency=0.01, search_latency=0.0), request_timeout=5)
+        events = await collect(fast, "q")
+        slow = GraphServer(build_stub_app(llm_latency=1.0, search_latency=0.0), request_timeout=0.2)
+        start = asyncio.get_running_loop().time()
+        try:
+            await collect(slow, "q")
+        except asyncio.TimeoutError:
+            elapsed = asyncio.get_running_loop().time() - start
+        else:
+            elapsed = None
+        return events, elapsed, slow
+
+    events, elapsed, slow = asyncio.run(main())
+    assert "".join(e["text"] for e in events if e["event"] == "token") == "answer #1 to: q"
+    assert events[-1]["event"] == "verdict" and events[-1]["generation"] == "answer #1 to: q"
+    assert elapsed is not None and elapsed < 0.6
+    assert not slow._session_locks
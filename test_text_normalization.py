@@ -0,0 +1,36 @@
+from bench_normalize import (SPECIAL_CASES, law_like_texts, legacy_normalize_dict, legacy_normalize_text,
+                             random_texts)
+import text_normalization
+from text_normalization import normalize_batch, normalize_dict, normalize_text
+
+
+def test_normalize_text_matches_legacy_on_special_cases():
+    for text in SPECIAL_CASES:
+        assert normalize_text(text) == legacy_normalize_text(text), repr(text)
+
+
+def test_normalize_text_matches_legacy_on_random_texts():
+    for text in random_texts(5000) + law_like_texts(500):
+        assert normalize_text(text) == legacy_normalize_text(text), repr(text)
+
+
+def test_normalize_dict_matches_legacy():
+    records = [{"content": text, "metadata": {"keywords": [text, text[::-1]]}} for text in random_texts(200, seed=1)]
+    assert normalize_dict(records) == legacy_normalize_dict(records)
+
+
+def test_normalize_dict_keeps_non_string_values():
+    assert normalize_dict({"year": 1951, "name": "ＡＢＣ", "extra": None}) == {"year": 1951, "name": "ABC", "extra": None}
+
+
+def test_normalize_batch_sequential_matches_normalize_dict():
+    records = [{"content": text} for text in law_like_texts(50)]
+    assert normalize_batch(records) == [normalize_dict(record) for record in records]
+
+
+def test_normalize_batch_process_pool_keeps_order(monkeypatch):
+    # ép dùng pool kể cả trên máy 1 CPU
+    monkeypatch.setattr(text_normalization, "available_cpus", lambda: 2)
+    records = [{"id": i, "content": text} for i, text in enumerate(law_like_texts(103, seed=2))]
+    result = normalize_batch(records, processes=2, min_parallel_items=10)
+    assert result == [normalize_dict(record) for record in records]